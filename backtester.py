@@ -1,4 +1,8 @@
+# built in
+import logging
+
 # 3rd party
+import numpy as np
 import pandas as pd
 
 # custom
@@ -31,17 +35,21 @@ class Backtester():
         self.stop_loss = stop_loss
         self.auto_stop_loss = auto_stop_loss
         self.volatility_lb = volatility_lb
-        self.log = setup_logging(logger=logger, debug=debug)
-        self.signals = self._prepare_signal(signals)
         self.high_label = high_label
         self.low_label = low_label
+        self.log = setup_logging(logger=logger, debug=debug)
+        # debug messages are built only if they are going to be logged. building them every day is noticeable
+        # overhead in backtests with many symbols
+        self._debug = self.log.isEnabledFor(logging.DEBUG)
+        self.signals = self._prepare_signal(signals)
 
     def run(self, test_days=None):
         self._reset_backtest_state()
 
-        self.log.debug('Starting backtest. Initial capital:{}, Available symbols: {}'.format(
-            self._available_money, list(self.signals.keys())
-        ))
+        if self._debug:
+            self.log.debug('Starting backtest. Initial capital:{}, Available symbols: {}'.format(
+                self._available_money, list(self.signals.keys())
+            ))
 
         symbols_in_day = {}
         symbols_next_days = {} # {sym: {day1: day2, day2:day3, ...}, ...}
@@ -60,25 +68,28 @@ class Backtester():
             days = days
 
         for idx, ds in enumerate(days):
-            self.log.debug('['+15*'-'+str(ds)[0:10]+15*'-'+']')
-            self.log.debug('\tSymbols available in given session: ' + str(symbols_in_day[ds]))
+            if self._debug:
+                self.log.debug('['+15*'-'+str(ds)[0:10]+15*'-'+']')
+                self.log.debug('\tSymbols available in given session: ' + str(symbols_in_day[ds]))
 
             owned_shares = list(self._owned_shares.keys())
-            self.log.debug('\t[-- SELL START --]')
-            if len(owned_shares) == 0:
-                self.log.debug('\t\tNo shares owned. Nothing to sell.')
-            else:
-                self.log.debug(
-                    '\tOwned shares: ' + ', '.join('{}={}'.format(s, int(self._owned_shares[s]['cnt'])) 
-                        for s in sorted(owned_shares))
-                )
+            if self._debug:
+                self.log.debug('\t[-- SELL START --]')
+                if len(owned_shares) == 0:
+                    self.log.debug('\t\tNo shares owned. Nothing to sell.')
+                else:
+                    self.log.debug(
+                        '\tOwned shares: ' + ', '.join('{}={}'.format(s, int(self._owned_shares[s]['cnt'])) 
+                            for s in sorted(owned_shares))
+                    )
             available_owned_shares = []
             for symbol in owned_shares:
                 # safe check if missing ds for given owned symbol
                 if not symbol in symbols_in_day[ds]:
                     continue
                 current_sym_price = self._get_price(symbol, ds)
-                self.log.debug('\t+ Checking exit signal for: ' + symbol)
+                if self._debug:
+                    self.log.debug('\t+ Checking exit signal for: ' + symbol)
                 _sold = 0
                 # 0) check if stop loss
                 if (self.stop_loss == True) or (self.auto_stop_loss != False):
@@ -90,27 +101,32 @@ class Backtester():
                     price_short_sl = self._get_price(symbol, ds, label=self.high_label)
                     # During session market price got below SL at least for some time 
                     if (trade_type == 'long') and (price_long_sl <= stop_loss_price):
-                        self.log.debug(f'\t\t LONG STOP LOSS TRIGGERED - EXITING (low: {price_long_sl})')
+                        if self._debug:
+                            self.log.debug(f'\t\t LONG STOP LOSS TRIGGERED - EXITING (low: {price_long_sl})')
                         self._sell(symbol, stop_loss_price, ds, 'long')
                         _sold = 1
                     # During session market price got above SL at least for some time
                     elif (trade_type == 'short') and (price_short_sl >= stop_loss_price):
-                        self.log.debug(f'\t\t SHORT STOP LOSS TRIGGERED - EXITING (high : {price_short_sl})')
+                        if self._debug:
+                            self.log.debug(f'\t\t SHORT STOP LOSS TRIGGERED - EXITING (high : {price_short_sl})')
                         self._sell(symbol, stop_loss_price, ds, 'short')
                         _sold = 1
                 # 1) if stop loss does not exists: check usual exit signal
                 # 2) in case stop loss exists but it was not triggered: check usual exit signal
                 if (self.signals[symbol]['exit_long'][ds] == 1) and (_sold == 0):
-                    self.log.debug('\t\t EXIT LONG')
+                    if self._debug:
+                        self.log.debug('\t\t EXIT LONG')
                     self._sell(symbol, current_sym_price, ds, 'long')
                     _sold = 1
                 elif (self.signals[symbol]['exit_short'][ds] == 1) and (_sold == 0):
-                    self.log.debug('\t\t EXIT SHORT')
+                    if self._debug:
+                        self.log.debug('\t\t EXIT SHORT')
                     self._sell(symbol, current_sym_price, ds, 'short')
                     _sold = 1
                 if _sold == 0:
                     available_owned_shares.append(symbol)
-                    self.log.debug('\t+ Not exiting from: ' + symbol)
+                    if self._debug:
+                        self.log.debug('\t+ Not exiting from: ' + symbol)
                 elif (_sold == 1) and (self.auto_stop_loss != False):
                     self._auto_stop_loss_tracker.pop(symbol, None)
 
@@ -120,8 +136,9 @@ class Backtester():
                         self._available_money
                     ))
 
-            self.log.debug('\t[-- SELL END --]')
-            self.log.debug('\t[-- BUY START --]')
+            if self._debug:
+                self.log.debug('\t[-- SELL END --]')
+                self.log.debug('\t[-- BUY START --]')
             purchease_candidates = []
             for sym in symbols_in_day[ds]:
                 cur_price = self._get_price(sym, ds)
@@ -131,10 +148,11 @@ class Backtester():
                     purchease_candidates.append(self._define_candidate(cur_price, sym, ds, 'long'))
                 elif self.signals[sym]['entry_short'][ds] == 1:
                     purchease_candidates.append(self._define_candidate(cur_price, sym, ds, 'short'))
-            if purchease_candidates == []:
-                self.log.debug('\t\tNo candidates to buy.')
-            else:
-                self.log.debug('\tCandidates to buy: {}'.format([c['symbol'] for c in purchease_candidates]))
+            if self._debug:
+                if purchease_candidates == []:
+                    self.log.debug('\t\tNo candidates to buy.')
+                else:
+                    self.log.debug('\tCandidates to buy: {}'.format([c['symbol'] for c in purchease_candidates]))
 
             capital_at_time = self._available_money + self._calculate_account_value(ds) + self._get_money_from_short()
             symbols_to_buy = self.position_sizer.decide_what_to_buy(
@@ -149,7 +167,8 @@ class Backtester():
             for trx_details in symbols_to_buy:
                 self._buy(trx_details, ds)
                 available_owned_shares.append(trx_details['symbol'])
-            self.log.debug('\t[--  BUY END --]')
+            if self._debug:
+                self.log.debug('\t[--  BUY END --]')
 
             # update auto_stop_loss for available owned shares. it will be applied to existing next day 
             # based on data from current day
@@ -161,7 +180,8 @@ class Backtester():
                         asl = self._update_auto_stop_loss(
                             sym, self._get_price(sym, ds), ds, symbols_next_days[sym][ds]
                         )
-                        self.log.debug(f'\t Updated SL [{sym}]: {symbols_next_days[sym][ds]}: {asl}')
+                        if self._debug:
+                            self.log.debug(f'\t Updated SL [{sym}]: {symbols_next_days[sym][ds]}: {asl}')
                     except IndexError:
                         # this will be the case only once (at the last processed day)
                         pass
@@ -177,17 +197,21 @@ class Backtester():
             # ignore if empty dataframe
             if df.shape[0] == 0:
                 continue
-            # initialize stop_loss column if needed
-            if 'stop_loss' not in df.columns:
-                df.loc[:, 'stop_loss'] = None
-            # calculate volatility column with appropriate lag
-            if 'volatility' not in df.columns:
-                df.loc[:, 'volatility'] = df[self.price_label].shift().rolling(self.volatility_lb).std()
-                df['volatility'].fillna(0, inplace=True)
+            self._add_helper_columns(df)
             _signals[k] = df.to_dict()
         self.log.debug('Signals ready.')
         return _signals
 
+    def _add_helper_columns(self, df):
+        """Adds stop_loss and volatility columns (in place) if they are missing."""
+        # initialize stop_loss column if needed
+        if 'stop_loss' not in df.columns:
+            df.loc[:, 'stop_loss'] = None
+        # calculate volatility column with appropriate lag
+        if 'volatility' not in df.columns:
+            df.loc[:, 'volatility'] = df[self.price_label].shift().rolling(self.volatility_lb).std()
+            df['volatility'].fillna(0, inplace=True)
+
     def _reset_backtest_state(self):
         """
         Resets/Initializes all attributes used during backtest run.
@@ -210,12 +234,13 @@ class Backtester():
         
         trx_id = self._owned_shares[symbol]['trx_id']
 
-        self.log.debug('\t\tSelling {} (Transaction id: {})'.format(symbol, trx_id))
-        self.log.debug('\t\t\tNo. of sold shares: ' + str(int(shares_count)))
-        self.log.debug('\t\t\tSell price: ' + str(price))
-        self.log.debug('\t\t\tFee: ' + str(fee))
-        self.log.debug('\t\t\tTransaction value (no fee): ' + str(trx_value))
-        self.log.debug('\t\t\tTransaction value (gross): ' + str(trx_value - fee))
+        if self._debug:
+            self.log.debug('\t\tSelling {} (Transaction id: {})'.format(symbol, trx_id))
+            self.log.debug('\t\t\tNo. of sold shares: ' + str(int(shares_count)))
+            self.log.debug('\t\t\tSell price: ' + str(price))
+            self.log.debug('\t\t\tFee: ' + str(fee))
+            self.log.debug('\t\t\tTransaction value (no fee): ' + str(trx_value))
+            self.log.debug('\t\t\tTransaction value (gross): ' + str(trx_value - fee))
 
         buy_trx_value_with_fee = self._trades[trx_id]['trx_value_with_fee']
         
@@ -230,7 +255,8 @@ class Backtester():
             self._money_from_short.pop(trx_id)
             self._available_money -= sell_trx_value_with_fee
   
-        self.log.debug('\t\tAvailable money after selling: ' + str(self._available_money))
+        if self._debug:
+            self.log.debug('\t\tAvailable money after selling: ' + str(self._available_money))
         
         self._trades[trx_id].update({
             'sell_ds': ds,
@@ -255,7 +281,8 @@ class Backtester():
             )
 
         trx_id = '_'.join((str(ds)[:10], trx['symbol'], trx['entry_type']))
-        self.log.debug('\t\tBuying {} (Transaction id: {})'.format(trx['symbol'], trx_id))
+        if self._debug:
+            self.log.debug('\t\tBuying {} (Transaction id: {})'.format(trx['symbol'], trx_id))
         
         if trx['entry_type'] == 'long':
             trx_value_with_fee = trx['trx_value'] + trx['fee'] # i need to spend
@@ -278,14 +305,15 @@ class Backtester():
             'trx_value_with_fee': trx_value_with_fee,
         }
 
-        self.log.debug('\t\t\tNo. of bought shares: ' + str(int(trx['shares_count'])))
-        self.log.debug('\t\t\tBuy price: ' + str(trx['price']))
-        self.log.debug('\t\t\tFee: ' + str(trx['fee']))
-        self.log.debug('\t\t\tTransaction value (no fee): ' + str(trx['trx_value']))
-        self.log.debug('\t\t\tTransaction value (gross): ' + str(trx_value_with_fee))
-        self.log.debug('\t\tAvailable money after buying: ' + str(self._available_money))
-        if trx['entry_type'] == 'short':
-            self.log.debug('\t\tMoney from short sell: ' + str(self._money_from_short[trx_id]))
+        if self._debug:
+            self.log.debug('\t\t\tNo. of bought shares: ' + str(int(trx['shares_count'])))
+            self.log.debug('\t\t\tBuy price: ' + str(trx['price']))
+            self.log.debug('\t\t\tFee: ' + str(trx['fee']))
+            self.log.debug('\t\t\tTransaction value (no fee): ' + str(trx['trx_value']))
+            self.log.debug('\t\t\tTransaction value (gross): ' + str(trx_value_with_fee))
+            self.log.debug('\t\tAvailable money after buying: ' + str(self._available_money))
+            if trx['entry_type'] == 'short':
+                self.log.debug('\t\tMoney from short sell: ' + str(self._money_from_short[trx_id]))
 
     def _define_candidate(self, price, symbol, ds, entry_type):
         """
@@ -352,7 +380,8 @@ class Backtester():
 
     def _summarize_day(self, ds):
         """Sets up summaries after finished session day."""
-        self.log.debug('[ SUMMARIZE SESSION {} ]'.format(str(ds)[:10]))
+        if self._debug:
+            self.log.debug('[ SUMMARIZE SESSION {} ]'.format(str(ds)[:10]))
         _account_value = self._calculate_account_value(ds)
         # account value (can be negative) + avaiable money + any borrowed moneny
         nav = _account_value + self._available_money + self._get_money_from_short()
@@ -360,10 +389,11 @@ class Backtester():
         self._net_account_value[ds] = nav
         self._rate_of_return[ds] = ((nav-self.init_capital)/self.init_capital)*100
 
-        self.log.debug('Available money is: ' + str(self._available_money))
-        self.log.debug('Shares: ' + ', '.join(sorted(['{}: {}'.format(k, v['cnt']) for k,v in self._owned_shares.items()])))
-        self.log.debug('Net Account Value is: ' + str(nav))
-        self.log.debug('Rate of return: ' + str(self._rate_of_return[ds]))
+        if self._debug:
+            self.log.debug('Available money is: ' + str(self._available_money))
+            self.log.debug('Shares: ' + ', '.join(sorted(['{}: {}'.format(k, v['cnt']) for k,v in self._owned_shares.items()])))
+            self.log.debug('Net Account Value is: ' + str(nav))
+            self.log.debug('Rate of return: ' + str(self._rate_of_return[ds]))
 
     def _run_output(self):
         """
@@ -383,6 +413,245 @@ class Backtester():
         return df
 
 
+class ArrayBacktester(Backtester):
+    """
+    Same engine as Backtester (it takes the same arguments and produces the same output), but signals are
+    aligned on shared dates index once and kept as (symbols x days) numpy arrays. Daily loop indexes them by
+    integers instead of doing `signals[symbol][label][ds]` dictionary lookups, what makes a difference for
+    backtests with hundreds of symbols and thousands of sessions.
+
+    In this class `signals` attribute is a dictionary {label: 2D array}. Rows are in `symbols` order and
+    columns are in `days` order. `_available` marks if symbol has a session in given day.
+    """
+    def _prepare_signal(self, signals):
+        """Aligns all symbols on shared dates index and converts them to arrays."""
+        self.log.debug('Prepareing signals (arrays)')
+        dfs = {}
+        for k, df in signals.items():
+            # ignore if empty dataframe
+            if df.shape[0] == 0:
+                continue
+            self._add_helper_columns(df)
+            dfs[k] = df
+        self.symbols = list(dfs.keys())
+        self._symbols_idx = {sym: idx for idx, sym in enumerate(self.symbols)}
+        self.days = pd.DatetimeIndex(sorted(set().union(*[df.index for df in dfs.values()])))
+        labels = [
+            self.price_label, 'entry_long', 'exit_long', 'entry_short', 'exit_short', 'stop_loss', 'volatility',
+            self.high_label, self.low_label
+        ]
+        shape = (len(self.symbols), len(self.days))
+        self._available = np.zeros(shape, dtype=bool)
+        # index of the next session of the symbol (-1 if there is none). used for auto stop loss
+        self._next_day = np.full(shape, -1, dtype=np.int64)
+        _signals = {label: np.full(shape, np.nan) for label in labels}
+        for sym_idx, df in enumerate(dfs.values()):
+            days_idx = self.days.get_indexer(df.index)
+            self._available[sym_idx, days_idx] = True
+            _dss = np.sort(days_idx)
+            self._next_day[sym_idx, _dss[:-1]] = _dss[1:]
+            for label in labels:
+                if label in df.columns:
+                    _signals[label][sym_idx, days_idx] = pd.to_numeric(df[label]).to_numpy(dtype=float)
+        self.log.debug('Signals ready.')
+        return _signals
+
+    def _reset_backtest_state(self):
+        super()._reset_backtest_state()
+        self._backup_prices = np.full(len(self.symbols), np.nan)
+        self._day_idx = None
+
+    def run(self, test_days=None):
+        self._reset_backtest_state()
+
+        if self._debug:
+            self.log.debug('Starting backtest. Initial capital:{}, Available symbols: {}'.format(
+                self._available_money, self.symbols
+            ))
+
+        prices = self.signals[self.price_label]
+        entry_long = self.signals['entry_long'] == 1
+        exit_long = self.signals['exit_long'] == 1
+        entry_short = self.signals['entry_short'] == 1
+        exit_short = self.signals['exit_short'] == 1
+        stop_losses = self.signals['stop_loss']
+        volatility = self.signals['volatility']
+        lows = self.signals[self.low_label]
+        highs = self.signals[self.high_label]
+
+        days = list(self.days)
+        if test_days:
+            days = days[:test_days]
+
+        for day_idx, ds in enumerate(days):
+            self._day_idx = day_idx
+            available = self._available[:, day_idx]
+            symbols_in_day = np.flatnonzero(available)
+            if self._debug:
+                self.log.debug('['+15*'-'+str(ds)[0:10]+15*'-'+']')
+                self.log.debug('\tSymbols available in given session: ' + str([self.symbols[i] for i in symbols_in_day]))
+
+            owned_shares = list(self._owned_shares.keys())
+            if self._debug:
+                self.log.debug('\t[-- SELL START --]')
+                if len(owned_shares) == 0:
+                    self.log.debug('\t\tNo shares owned. Nothing to sell.')
+                else:
+                    self.log.debug(
+                        '\tOwned shares: ' + ', '.join('{}={}'.format(s, int(self._owned_shares[s]['cnt']))
+                            for s in sorted(owned_shares))
+                    )
+            available_owned_shares = []
+            for symbol in owned_shares:
+                sym_idx = self._symbols_idx[symbol]
+                # safe check if missing ds for given owned symbol
+                if not available[sym_idx]:
+                    continue
+                current_sym_price = prices[sym_idx, day_idx].item()
+                if self._debug:
+                    self.log.debug('\t+ Checking exit signal for: ' + symbol)
+                _sold = 0
+                # 0) check if stop loss
+                if (self.stop_loss == True) or (self.auto_stop_loss != False):
+                    stop_loss_price = stop_losses[sym_idx, day_idx].item()
+                    trade_type = self._trades[self._owned_shares[symbol]['trx_id']]['type']
+                    price_long_sl = lows[sym_idx, day_idx]
+                    price_short_sl = highs[sym_idx, day_idx]
+                    if (trade_type == 'long') and (price_long_sl <= stop_loss_price):
+                        if self._debug:
+                            self.log.debug(f'\t\t LONG STOP LOSS TRIGGERED - EXITING (low: {price_long_sl})')
+                        self._sell(symbol, stop_loss_price, ds, 'long')
+                        _sold = 1
+                    elif (trade_type == 'short') and (price_short_sl >= stop_loss_price):
+                        if self._debug:
+                            self.log.debug(f'\t\t SHORT STOP LOSS TRIGGERED - EXITING (high : {price_short_sl})')
+                        self._sell(symbol, stop_loss_price, ds, 'short')
+                        _sold = 1
+                if exit_long[sym_idx, day_idx] and (_sold == 0):
+                    if self._debug:
+                        self.log.debug('\t\t EXIT LONG')
+                    self._sell(symbol, current_sym_price, ds, 'long')
+                    _sold = 1
+                elif exit_short[sym_idx, day_idx] and (_sold == 0):
+                    if self._debug:
+                        self.log.debug('\t\t EXIT SHORT')
+                    self._sell(symbol, current_sym_price, ds, 'short')
+                    _sold = 1
+                if _sold == 0:
+                    available_owned_shares.append(symbol)
+                    if self._debug:
+                        self.log.debug('\t+ Not exiting from: ' + symbol)
+                elif (_sold == 1) and (self.auto_stop_loss != False):
+                    self._auto_stop_loss_tracker.pop(symbol, None)
+
+            if self._available_money < 0:
+                raise AccountBankruptError(
+                    "Account bankrupted! Money after sells is: {}. Backtester cannot run anymore!".format(
+                        self._available_money
+                    ))
+
+            if self._debug:
+                self.log.debug('\t[-- SELL END --]')
+                self.log.debug('\t[-- BUY START --]')
+            # set up back-up price for all available symbols in given day
+            self._backup_prices[symbols_in_day] = prices[symbols_in_day, day_idx]
+            purchease_candidates = []
+            for sym_idx in symbols_in_day:
+                if entry_long[sym_idx, day_idx]:
+                    entry_type = 'long'
+                elif entry_short[sym_idx, day_idx]:
+                    entry_type = 'short'
+                else:
+                    continue
+                purchease_candidates.append(self._define_candidate(
+                    prices[sym_idx, day_idx].item(), self.symbols[sym_idx], ds, entry_type
+                ))
+            if self._debug:
+                if purchease_candidates == []:
+                    self.log.debug('\t\tNo candidates to buy.')
+                else:
+                    self.log.debug('\tCandidates to buy: {}'.format([c['symbol'] for c in purchease_candidates]))
+
+            capital_at_time = self._available_money + self._calculate_account_value(ds) + self._get_money_from_short()
+            symbols_to_buy = self.position_sizer.decide_what_to_buy(
+                self._available_money*1.0,  # multplication is to create new object instead of using actual pointer
+                purchease_candidates,
+                capital = capital_at_time,
+                volatility = {
+                    c['symbol']: volatility[self._symbols_idx[c['symbol']], day_idx].item()
+                    for c in purchease_candidates
+                }
+            )
+            for trx_details in symbols_to_buy:
+                self._buy(trx_details, ds)
+                available_owned_shares.append(trx_details['symbol'])
+            if self._debug:
+                self.log.debug('\t[--  BUY END --]')
+
+            # update auto_stop_loss for available owned shares. it will be applied to existing next day
+            # based on data from current day
+            if self.auto_stop_loss != False:
+                for sym in available_owned_shares:
+                    sym_idx = self._symbols_idx[sym]
+                    next_day_idx = self._next_day[sym_idx, day_idx]
+                    if (not available[sym_idx]) or (next_day_idx == -1):
+                        continue
+                    asl = self._update_auto_stop_loss(sym, prices[sym_idx, day_idx].item(), day_idx, next_day_idx)
+                    if self._debug:
+                        self.log.debug(f'\t Updated SL [{sym}]: {self.days[next_day_idx]}: {asl}')
+
+            self._summarize_day(ds)
+        return self._run_output(), self._trades
+
+    def _define_candidate(self, price, symbol, ds, entry_type):
+        """
+        Reutrns dictionary with purchease candidates and necessery keys.
+        Handles setting up value for auto_stop_loss.
+        """
+        if self.auto_stop_loss != False:
+            stop_loss = self._calc_auto_sl(price, entry_type)
+        elif self.stop_loss:
+            stop_loss = self.signals['stop_loss'][self._symbols_idx[symbol], self._day_idx].item()
+        else:
+            stop_loss = None
+        return self.position_sizer.define_candidate(
+            symbol=symbol,
+            entry_type=entry_type,
+            price=price,
+            stop_loss=stop_loss,
+        )
+
+    def _get_price(self, symbol, ds, label=None):
+        """
+        Returns price from currently processed day (*ds* is ignored, it is kept for compatibility with
+        Backtester). If symbol has no session in that day it uses backup price.
+        """
+        if label == None:
+            label = self.price_label
+        sym_idx = self._symbols_idx[symbol]
+        if self._available[sym_idx, self._day_idx]:
+            return self.signals[label][sym_idx, self._day_idx].item()
+        return self._backup_prices[sym_idx].item()
+
+    def _update_auto_stop_loss(self, symbol, price, cur_day_idx, next_day_idx):
+        """
+        Same as in Backtester, but operates on days indexes instead of dates.
+        """
+        if self._owned_shares[symbol]['cnt'] > 0:
+            entry_type = 'long'
+        else:
+            entry_type = 'short'
+        sym_idx = self._symbols_idx[symbol]
+        curr_sl_ref_price = self._auto_stop_loss_tracker.get(symbol, 0)
+        if price > curr_sl_ref_price:
+            self._auto_stop_loss_tracker[symbol] = price
+            stop_loss = self._calc_auto_sl(price, entry_type)
+        else:
+            stop_loss = self.signals['stop_loss'][sym_idx, cur_day_idx].item()
+        self.signals['stop_loss'][sym_idx, next_day_idx] = stop_loss
+        return stop_loss
+
+
 class SimpleBacktest():
     def __init__(self, df=None, position_label='position', price_label='close', init_capital=10000):
         """
@@ -409,6 +678,192 @@ class SimpleBacktest():
         return self.df[['nav']]
 
 
+class PortfolioBacktest():
+    def __init__(self, signals, position_sizer=None, price_label='close', init_capital=10000, volatility_lb=14):
+        """
+        Vectorized multi-symbol version of Backtester. Takes the same *signals* (dictionary with symbols and
+        dataframes with entry/exit columns) and returns the same output as Backtester.run, but:
+            - NAV, account value and returns are computed with array operations over whole (symbols x days) matrix
+            - python code runs only for sessions where there is at least one entry/exit signal. Position sizing
+              depends on capital at time of the buy so these sessions need to be processed in order.
+        It is meant to be used with FixedCapitalPerc position sizer (or any other one which does not need stop loss).
+        Stop losses are not supported.
+        """
+        self.position_sizer = position_sizer
+        self.price_label = price_label
+        self.init_capital = init_capital
+        self.volatility_lb = volatility_lb
+        self._prepare_signal(signals)
+
+    def _prepare_signal(self, signals):
+        """Aligns all symbols on shared dates index and converts them to (symbols x days) arrays."""
+        dfs = {k: df for k, df in signals.items() if df.shape[0] != 0}
+        self.symbols = list(dfs.keys())
+        self._symbols_idx = {sym: idx for idx, sym in enumerate(self.symbols)}
+        self.days = pd.DatetimeIndex(sorted(set().union(*[df.index for df in dfs.values()])))
+        shape = (len(self.symbols), len(self.days))
+        self._available = np.zeros(shape, dtype=bool)
+        self._prices = np.full(shape, np.nan)
+        self._volatility = np.full(shape, np.nan)
+        self._signals = {
+            label: np.zeros(shape, dtype=bool) for label in ('entry_long', 'exit_long', 'entry_short', 'exit_short')
+        }
+        for sym_idx, df in enumerate(dfs.values()):
+            days_idx = self.days.get_indexer(df.index)
+            self._available[sym_idx, days_idx] = True
+            self._prices[sym_idx, days_idx] = df[self.price_label].to_numpy(dtype=float)
+            if 'volatility' in df.columns:
+                volatility = df['volatility']
+            else:
+                volatility = df[self.price_label].shift().rolling(self.volatility_lb).std().fillna(0)
+            self._volatility[sym_idx, days_idx] = volatility.to_numpy(dtype=float)
+            for label, arr in self._signals.items():
+                arr[sym_idx, days_idx] = df[label].to_numpy() == 1
+        # price used for valuation. if symbol does not have session in given day, last known price is used
+        self._valuation_prices = pd.DataFrame(self._prices.T).ffill().to_numpy().T
+
+    def run(self, test_days=None):
+        no_days = len(self.days)
+        if test_days:
+            no_days = min(test_days, no_days)
+        available = self._available[:, :no_days]
+        entry_long = self._signals['entry_long'][:, :no_days] & available
+        exit_long = self._signals['exit_long'][:, :no_days] & available
+        entry_short = self._signals['entry_short'][:, :no_days] & available
+        exit_short = self._signals['exit_short'][:, :no_days] & available
+        signal_days = np.flatnonzero((entry_long | exit_long | entry_short | exit_short).any(axis=0))
+
+        self._owned_shares = {}
+        self._money_from_short = {}
+        self._trades = {}
+        self._available_money = self.init_capital
+        # money and shares are changing only during sessions with signals, those are stored here
+        available_money = np.full(no_days, np.nan)
+        money_from_short = np.full(no_days, np.nan)
+        shares_delta = np.zeros((len(self.symbols), no_days+1))
+
+        for day_idx in signal_days:
+            ds = self.days[day_idx]
+            for symbol in list(self._owned_shares.keys()):
+                sym_idx = self._owned_shares[symbol]['sym_idx']
+                if exit_long[sym_idx, day_idx]:
+                    exit_type = 'long'
+                elif exit_short[sym_idx, day_idx]:
+                    exit_type = 'short'
+                else:
+                    continue
+                shares_delta[sym_idx, day_idx] -= self._owned_shares[symbol]['cnt']
+                self._sell(symbol, self._prices[sym_idx, day_idx].item(), ds, exit_type)
+
+            if self._available_money < 0:
+                raise AccountBankruptError(
+                    "Account bankrupted! Money after sells is: {}. Backtester cannot run anymore!".format(
+                        self._available_money
+                    ))
+
+            purchease_candidates = []
+            for sym_idx in np.flatnonzero(entry_long[:, day_idx] | entry_short[:, day_idx]):
+                purchease_candidates.append(self.position_sizer.define_candidate(
+                    symbol=self.symbols[sym_idx],
+                    entry_type='long' if entry_long[sym_idx, day_idx] else 'short',
+                    price=self._prices[sym_idx, day_idx].item(),
+                ))
+            if purchease_candidates != []:
+                _account_value = 0
+                for vals in self._owned_shares.values():
+                    _account_value += vals['cnt'] * self._valuation_prices[vals['sym_idx'], day_idx].item()
+                capital_at_time = (
+                    self._available_money + _account_value + sum([m for m in self._money_from_short.values()])
+                )
+                symbols_to_buy = self.position_sizer.decide_what_to_buy(
+                    self._available_money*1.0,
+                    purchease_candidates,
+                    capital = capital_at_time,
+                    volatility = {
+                        c['symbol']: self._volatility[self._symbols_idx[c['symbol']], day_idx].item()
+                        for c in purchease_candidates
+                    }
+                )
+                for trx_details in symbols_to_buy:
+                    sym_idx = self._symbols_idx[trx_details['symbol']]
+                    self._buy(trx_details, ds, sym_idx)
+                    shares_delta[sym_idx, day_idx] += self._owned_shares[trx_details['symbol']]['cnt']
+            available_money[day_idx] = self._available_money
+            money_from_short[day_idx] = sum([m for m in self._money_from_short.values()])
+
+        available_money = pd.Series(available_money).ffill().fillna(self.init_capital).to_numpy()
+        money_from_short = pd.Series(money_from_short).ffill().fillna(0).to_numpy()
+        shares = np.cumsum(shares_delta, axis=1)[:, :no_days]
+        account_value = (shares * np.nan_to_num(self._valuation_prices[:, :no_days])).sum(axis=0)
+        nav = account_value + available_money + money_from_short
+        results = pd.DataFrame(
+            {
+                'account_value': account_value,
+                'nav': nav,
+                'rate_of_return': ((nav-self.init_capital)/self.init_capital)*100,
+            },
+            index=self.days[:no_days],
+        )
+        return results, self._trades
+
+    def _sell(self, symbol, price, ds, exit_type):
+        """Selling procedure. Same as in Backtester."""
+        shares_count = self._owned_shares[symbol]['cnt']
+        fee = self.position_sizer.calculate_fee(abs(shares_count)*price)
+        trx_value = (abs(shares_count)*price)
+        trx_id = self._owned_shares[symbol]['trx_id']
+        buy_trx_value_with_fee = self._trades[trx_id]['trx_value_with_fee']
+        if exit_type == 'long':
+            sell_trx_value_with_fee = trx_value - fee
+            profit = sell_trx_value_with_fee - buy_trx_value_with_fee
+            self._available_money += sell_trx_value_with_fee
+        elif exit_type == 'short':
+            sell_trx_value_with_fee = trx_value + fee
+            profit = buy_trx_value_with_fee - sell_trx_value_with_fee
+            self._available_money += self._money_from_short[trx_id]
+            self._money_from_short.pop(trx_id)
+            self._available_money -= sell_trx_value_with_fee
+        self._trades[trx_id].update({
+            'sell_ds': ds,
+            'sell_value_no_fee': trx_value,
+            'sell_value_with_fee': sell_trx_value_with_fee,
+            'profit': round(profit, 2)
+        })
+        self._owned_shares.pop(symbol)
+
+    def _buy(self, trx, ds, sym_idx):
+        """Buying procedure. Same as in Backtester."""
+        if self._owned_shares.get(trx['symbol']):
+            raise ValueError(
+                '[{}] Trying to buy {} of {}. You currenlty own this symbol.\
+                Buying additional/partial selling is currently not supported'.format(
+                    ds, trx['entry_type'], trx['symbol']
+                )
+            )
+        if trx['shares_count'] == 0:
+            raise ValueError(
+                f'Trying to buy 0 shares. It should not be possible'
+            )
+        trx_id = '_'.join((str(ds)[:10], trx['symbol'], trx['entry_type']))
+        if trx['entry_type'] == 'long':
+            trx_value_with_fee = trx['trx_value'] + trx['fee']
+            self._owned_shares[trx['symbol']] = {'cnt': trx['shares_count']}
+            self._available_money -= trx_value_with_fee
+        elif trx['entry_type'] == 'short':
+            trx_value_with_fee = trx['trx_value'] - trx['fee']
+            self._owned_shares[trx['symbol']] = {'cnt': -trx['shares_count']}
+            self._available_money -= trx['fee']
+            self._money_from_short[trx_id] = trx['trx_value']
+        self._available_money = round(self._available_money, 2)
+        self._owned_shares[trx['symbol']].update({'trx_id': trx_id, 'sym_idx': sym_idx})
+        self._trades[trx_id] = {
+            'buy_ds': ds,
+            'type': trx['entry_type'],
+            'trx_value_no_fee': trx['trx_value'],
+            'trx_value_with_fee': trx_value_with_fee,
+        }
+
+
 def test_backtest_normal_vs_simple():
     import gpw_data
     import position_size
@@ -0,0 +1,214 @@
+"""
+Benchmarks for performance sensitive parts of the code. Each benchmark prints timings of the current implementation
+and (where it makes sense) of the reference/previous approach. Run from repo root, e.g.:
+    python benchmarks.py backtester_logging
+"""
+# built in
+import os
+import time
+
+# 3rd party
+import numpy as np
+import pandas as pd
+
+# custom
+import backtester
+import commons
+import gpw_data
+import position_size
+import rules
+import rules_mining
+
+
+def _best_time(func, repeat=3):
+    """Returns the best (lowest) execution time of *func* in seconds."""
+    times = []
+    for _ in range(repeat):
+        t1 = time.time()
+        func()
+        times.append(time.time() - t1)
+    return min(times)
+
+
+def _ma_crossover_signals(symbols, start='2010-01-01', end='2020-01-01', ma_lookback=20):
+    """Long/short signals based on close price vs. moving average for *symbols* from pricing_data."""
+    data = gpw_data.GPWData().load(symbols=symbols, from_csv=True, df=True)
+    signals = {}
+    for sym, df in data.items():
+        df = df.loc[start:end, ['open', 'high', 'low', 'close']].copy()
+        ma = df['close'].rolling(ma_lookback).mean()
+        position = (df['close'] > ma).astype(int)
+        position[df['close'] < ma] = -1
+        prev_position = position.shift().fillna(0)
+        df.loc[:, 'entry_long'] = ((position == 1) & (prev_position != 1)).astype(int)
+        df.loc[:, 'exit_long'] = ((position != 1) & (prev_position == 1)).astype(int)
+        df.loc[:, 'entry_short'] = ((position == -1) & (prev_position != -1)).astype(int)
+        df.loc[:, 'exit_short'] = ((position != -1) & (prev_position == -1)).astype(int)
+        signals[sym] = df
+    return signals
+
+
+def backtester_logging():
+    """
+    Per day overhead of debug messages in Backtester with logger set to INFO level. "Before" forces building all
+    debug messages (as it was done before they were guarded), "after" is the default behaviour.
+    """
+    signals = _ma_crossover_signals(gpw_data.GPWData().indicies_stocks['WIG20'])
+
+    def _run(force_debug_messages):
+        tester = backtester.Backtester(
+            {k: v.copy() for k, v in signals.items()},
+            position_sizer=position_size.FixedCapitalPerc(capital_perc=0.05),
+            init_capital=100000,
+        )
+        if force_debug_messages:
+            tester._debug = True
+            tester.position_sizer._debug = True
+        no_days = len(tester.run()[0])
+        return no_days
+
+    no_days = _run(False)
+    print(f'Backtester: {len(signals)} symbols, {no_days} days, logger at INFO level')
+    for name, force in (('before (messages always built)', True), ('after (quiet mode)', False)):
+        t = _best_time(lambda: _run(force))
+        print(f'\t{name}: {round(t, 3)}s total, {round(t/no_days*1e6, 1)} us per day')
+
+
+def support_resistance():
+    """
+    Local support/resistance (with e) - quadratic scan vs. heap of e smallest/biggest prices (per call) and the
+    vectorized rule over 2000 days.
+    """
+    rng = np.random.default_rng(0)
+    arr = np.cumsum(rng.normal(size=2000)) + 100
+    for lookback in (14, 28, 56, 112):
+        y = arr[-lookback:]
+        for e in (2, 5, 20):
+            t_quadratic = _best_time(lambda: [rules._find_support_resistance_quadratic(y, e=e) for _ in range(100)])
+            t_heap = _best_time(lambda: [rules._find_support_resistance(y, e=e) for _ in range(100)])
+            t_series = _best_time(lambda: rules.support_resistance_series(arr, lookback, e=e))
+            print(
+                f'\tlookback={lookback}, e={e}: quadratic {round(t_quadratic*1e4, 1)} us, '
+                f'heap {round(t_heap*1e4, 1)} us per call, series {round(t_series*1e3, 1)} ms per 2000 days'
+            )
+
+
+def trend():
+    """trend with lstsq (before) vs. closed form slope (per call) and rolling trend over 2000 days."""
+    rng = np.random.default_rng(0)
+    arr = np.cumsum(rng.normal(size=2000)) + 100
+    for lookback in (7, 14, 28, 56):
+        y = arr[-lookback-1:]
+        t_lstsq = _best_time(lambda: [rules._trend_lstsq(y) for _ in range(100)])
+        t_closed = _best_time(lambda: [rules.trend(y) for _ in range(100)])
+        t_series = _best_time(lambda: rules.trend_series(arr, lookback))
+        print(
+            f'\tlookback={lookback}: lstsq {round(t_lstsq*1e4, 1)} us, closed form {round(t_closed*1e4, 1)} us '
+            f'per call, series {round(t_series*1e3, 2)} ms per 2000 days'
+        )
+
+
+def detrend():
+    """GPWData.detrend of DataFrame and list - per column/per row loops (before) vs. stacked array of prices."""
+    data_collector = gpw_data.GPWData()
+    for df in (True, False):
+        data = data_collector.load(symbols=['CCC', 'KGHM', 'PKNORLEN', 'CDPROJEKT'], df=df)
+        t_loops = _best_time(lambda: [data_collector._detrend_reference(d) for d in data.values()])
+        t_array = _best_time(lambda: data_collector.detrend(data))
+        print(
+            f'\t{"DataFrame" if df else "list"} (4 symbols): loops {round(t_loops*1e3, 1)} ms, '
+            f'array {round(t_array*1e3, 1)} ms'
+        )
+
+
+def pricing_load():
+    """
+    Loading all csv files from pricing_data as DataFrames - parsing csv files (before) vs. memory-mapped cache
+    (after, cache is built by the first load).
+    """
+    symbols = sorted(f[:-len('_pricing.csv')] for f in os.listdir('./pricing_data') if f.endswith('_pricing.csv'))
+    # C_pricing.csv has no volume values (can't be loaded by GPWData)
+    symbols = [s for s in symbols if s != 'C']
+    no_cache_data = gpw_data.GPWData(use_cache=False)
+    cache_data = gpw_data.GPWData(use_cache=True)
+    t_csv = _best_time(lambda: no_cache_data.load(symbols=symbols, from_csv=True, df=True))
+    t1 = time.time()
+    cache_data.load(symbols=symbols, from_csv=True, df=True)
+    t_first = time.time() - t1
+    t_cache = _best_time(lambda: cache_data.load(symbols=symbols, from_csv=True, df=True))
+    print(
+        f'	{len(symbols)} files: csv {round(t_csv*1e3, 1)} ms, cache {round(t_cache*1e3, 1)} ms '
+        f'(first load with building cache: {round(t_first*1e3, 1)} ms)'
+    )
+
+
+def wrc():
+    """
+    White's Reality Check sampling distribution (1000 samples) for 1000 rules over 2500 days - sample by sample
+    (before) vs. blocks of samples as matrix products (iid and stationary bootstrap).
+    """
+    rng = np.random.default_rng(0)
+    rules_results = {
+        f'rule_{idx}': pd.DataFrame({'daily_returns': rng.normal(0, 0.01, size=2500)}) for idx in range(1000)
+    }
+    # loop is too slow for all samples - time is scaled
+    t_loop = _best_time(lambda: rules_mining._create_wrc_sampling_dist_loop(rules_results, no_samples=100), 1) * 10
+    t_iid = _best_time(lambda: rules_mining.create_wrc_sampling_dist(rules_results, no_samples=1000, seed=0), 1)
+    t_stationary = _best_time(lambda: rules_mining.create_wrc_sampling_dist(
+        rules_results, no_samples=1000, seed=0, mean_block_length=10
+    ), 1)
+    n_jobs = os.cpu_count()
+    t_jobs = _best_time(lambda: rules_mining.create_wrc_sampling_dist(
+        rules_results, no_samples=1000, seed=0, n_jobs=n_jobs
+    ), 1)
+    print(
+        f'\tloop {round(t_loop, 2)}s (estimated from 100 samples), blocks: iid {round(t_iid, 2)}s, '
+        f'stationary {round(t_stationary, 2)}s, iid with {n_jobs} processes {round(t_jobs, 2)}s'
+    )
+
+
+def mc():
+    """
+    Monte Carlo permutation sampling distribution (1000 samples) for 1000 rules over 2500 days - sample by sample
+    and rule by rule (before) vs. blocks of permutations multiplied by matrix of rules states.
+    """
+    rng = np.random.default_rng(0)
+    rules_states = {f'rule_{idx}': rng.integers(-1, 2, size=2500) for idx in range(1000)}
+    price_changes = rng.normal(0, 0.01, size=2500)
+    # loop is too slow for all samples - time is scaled
+    t_loop = _best_time(
+        lambda: rules_mining._create_mc_sampling_distr_loop(rules_states, price_changes, no_samples=20), 1
+    ) * 50
+    t_matrix = _best_time(
+        lambda: rules_mining.create_mc_sampling_distr(rules_states, price_changes, no_samples=1000, seed=0), 1
+    )
+    n_jobs = os.cpu_count()
+    t_jobs = _best_time(lambda: rules_mining.create_mc_sampling_distr(
+        rules_states, price_changes, no_samples=1000, seed=0, n_jobs=n_jobs
+    ), 1)
+    print(
+        f'\tloop {round(t_loop, 2)}s (estimated from 20 samples), matrix {round(t_matrix, 2)}s, '
+        f'matrix with {n_jobs} processes {round(t_jobs, 2)}s'
+    )
+
+
+BENCHMARKS = {
+    'backtester_logging': backtester_logging,
+    'detrend': detrend,
+    'mc': mc,
+    'pricing_load': pricing_load,
+    'support_resistance': support_resistance,
+    'trend': trend,
+    'wrc': wrc,
+}
+
+
+if __name__ == '__main__':
+    parser = commons.get_parser()
+    parser.add_argument('benchmarks', nargs='*', help='names of benchmarks to run (all if empty): {}'.format(
+        ', '.join(BENCHMARKS.keys())
+    ))
+    args = parser.parse_args()
+    for name in (args.benchmarks or BENCHMARKS.keys()):
+        print(f'##### {name}')
+        BENCHMARKS[name]()
@@ -0,0 +1,133 @@
+"""
+Columnar representation of japanese candles. Candle features (body, color, shadows) are computed for whole arrays at
+once and patterns detectors work on them elementwise. Detectors take aligned candles (dicts of features, e.g. first
+and second candle of engulfing pattern) - either single candles (numpy scalars) or arrays of candles for many days.
+"""
+# 3rd party
+import numpy as np
+
+
+WHITE = 1
+BLACK = -1
+DOJI = 0
+
+
+def features(dict_arrs, open='open', high='high', low='low', close='close'):
+    """Returns dict of arrays: open, high, low, close, body, color (WHITE/BLACK/DOJI), upper_shadow, lower_shadow."""
+    o, h, l, c = [np.asarray(dict_arrs[name]) for name in (open, high, low, close)]
+    diff = c - o
+    color = np.select([diff > 0, diff < 0], [WHITE, BLACK], DOJI).astype(np.int8)
+    is_black = color == BLACK
+    return {
+        'open': o,
+        'high': h,
+        'low': l,
+        'close': c,
+        'body': abs(o-c),
+        'color': color,
+        'upper_shadow': np.where(is_black, h-o, h-c),
+        'lower_shadow': np.where(is_black, c-l, o-l),
+    }
+
+
+def select(candles, idx):
+    """Selects candle(s) with *idx* (int or slice) from features."""
+    return {k: v[idx] for k, v in candles.items()}
+
+
+def shift(candles, days):
+    """Shifts features by *days*, so for each idx there are features of candle idx-days (NaN/DOJI if not present)."""
+    return {k: shift_arr(v, days) for k, v in candles.items()}
+
+
+def shift_arr(arr, days):
+    output = np.full(arr.shape, 0 if arr.dtype.kind in 'iu' else np.nan, dtype=arr.dtype)
+    if days < arr.shape[0]:
+        output[days:] = arr[:arr.shape[0]-days]
+    return output
+
+
+def rolling_mean_std(arr, window):
+    """
+    Mean and std of *window* values ending at each idx (NaN if not enough values). Same results as np.mean/np.std
+    called on each window separately. Window shorter than 1 is empty, so all values are NaN then.
+    """
+    mean = np.full(arr.shape, np.nan)
+    std = np.full(arr.shape, np.nan)
+    if 0 < window <= arr.shape[0]:
+        windows = np.lib.stride_tricks.sliding_window_view(arr, window)
+        mean[window-1:] = windows.mean(axis=1)
+        std[window-1:] = windows.std(axis=1)
+    return mean, std
+
+
+def hammer_hanging_man(form, preceding_trend, avg_body, std_body, conf=None, no_std=1):
+    """
+    Hammer (after downtrend - long) / Hanging Man (after uptrend - short). *form* is the formation candle and *conf*
+    the confirmation candle (None if confirmation is not required).
+    """
+    is_formation = np.logical_and.reduce([
+        preceding_trend != 0,
+        (avg_body - form['body']) > (no_std * std_body),
+        form['lower_shadow'] >= 1.5*form['body'],
+        form['upper_shadow'] < form['body'],
+    ])
+    if conf is None:
+        signal = np.select([preceding_trend == -1, preceding_trend == 1], [1, -1], 0)
+    else:
+        # confirmation with gaps between formation and confirmation candles was never effective (formation candle
+        # was compared with color name), so only color of confirmation candle matters
+        signal = np.select(
+            [(preceding_trend == -1) & (conf['color'] == WHITE), (preceding_trend == 1) & (conf['color'] == BLACK)],
+            [1, -1],
+            0
+        )
+    return np.where(is_formation, signal, 0)
+
+
+def engulfing(first, second, preceding_trend):
+    """Bullish (after downtrend - long) / bearish (after uptrend - short) engulfing."""
+    bullish = np.logical_and.reduce([
+        preceding_trend == -1,
+        first['color'] == BLACK,
+        second['color'] == WHITE,
+        first['open'] < second['close'],
+        first['close'] > second['open'],
+    ])
+    bearish = np.logical_and.reduce([
+        preceding_trend == 1,
+        first['color'] == WHITE,
+        second['color'] == BLACK,
+        first['close'] < second['open'],
+        first['open'] > second['close'],
+    ])
+    return np.select([bullish, bearish], [1, -1], 0)
+
+
+def stars(first, second, third, preceding_trend, avg_body):
+    """
+    Morning (after downtrend - long) / evening (after uptrend - short) star. Conditions are checked as "not smaller"
+    instead of "bigger or equal", so NaN *avg_body* (not enough preceding candles) does not reject pattern.
+    """
+    first_mid = (first['open'] + first['close']) / 2
+    is_size_ok = np.logical_and(
+        np.logical_not(first['body'] < avg_body),
+        np.logical_not(second['body'] > avg_body),
+    )
+    morning = np.logical_and.reduce([
+        preceding_trend == -1,
+        first['color'] == BLACK,
+        is_size_ok,
+        third['color'] == WHITE,
+        np.logical_not(third['close'] < first_mid),
+        np.logical_not(third['close'] < first['open']),
+    ])
+    evening = np.logical_and.reduce([
+        preceding_trend == 1,
+        first['color'] == WHITE,
+        is_size_ok,
+        third['color'] == BLACK,
+        np.logical_not(third['open'] < first_mid),
+        np.logical_not(third['close'] > first['open']),
+    ])
+    return np.select([morning, evening], [1, -1], 0)
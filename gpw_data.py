@@ -1,19 +1,26 @@
 # built in
 import csv
 import os
-import time
 
 # 3rd party
 import pandas as pd
 import numpy as np
 
 # custom
-from price_collector import PriceCollector
+import pricing_cache
+from price_collector import (
+    bulk_download,
+    PriceCollector,
+)
 
 
 class GPWData():
-    def __init__(self, pricing_data_path='./pricing_data'):
+    def __init__(self, pricing_data_path='./pricing_data', use_cache=True):
+        """
+        *use_cache* - if True, DataFrames loaded from csv files are cached in binary format (see pricing_cache)
+        """
         self.pricing_data_path = pricing_data_path
+        self.use_cache = use_cache
         self.collector = PriceCollector()
         self.column_names = ['date', 'open', 'high', 'low', 'close', 'volume']
         self.indicies_stocks = {
@@ -30,20 +37,26 @@ class GPWData():
             ]
         }
 
-    def download_data_to_csv(self, symbols=None):
+    def download_data_to_csv(self, symbols=None, max_workers=4):
         """
         Collects historical data and outputs csv file in *pricing_data_path*. Currently it takes
-        full history until execution and its overwriting files.
+        full history until execution and its overwriting files. Symbols are downloaded by *max_workers* threads
+        (requests are rate limited by the collector). Raises BulkDownloadError if some symbols failed (others are
+        saved anyway).
         """
-        for symbol in symbols:
+        def _download(symbol):
             print('Downloading {}'.format(symbol))
             pricing_data = self.collector.get_historical_data(symbol)
-            with open(self._output_path(symbol), 'w') as fh:
+            # file is replaced when it's complete
+            tmp_path = self._output_path(symbol) + '.tmp'
+            with open(tmp_path, 'w') as fh:
                 writer = csv.writer(fh)
                 writer.writerow(self.column_names)
                 for date, prices in pricing_data.items():
                     writer.writerow([date] + prices)
-            time.sleep(0.5)
+            os.replace(tmp_path, self._output_path(symbol))
+
+        bulk_download(symbols, _download, max_workers=max_workers)
 
     def load(self, symbols=None, etfs=None, index=None, df=True, from_csv=True):
         """
@@ -61,29 +74,19 @@ class GPWData():
         symbols = self._gather_symbols(symbols, etfs, index)
         pricing_data = {}
         for symbol in symbols:
+            if from_csv and df and self.use_cache:
+                data = pricing_cache.load(self._output_path(symbol), self._read_csv_df, 'gpw')
+                data.name = symbol
+                pricing_data[symbol] = data
+                continue
             if from_csv:
-                with open(self._output_path(symbol), 'r') as fh:
-                    reader = csv.reader(fh)
-                    next(reader)  # skip the header
-                    data = [
-                        [row[0], float(row[1]), float(row[2]), float(row[3]), float(row[4]), int(row[5])]
-                        for row in reader
-                    ]
+                data = self._read_csv_rows(self._output_path(symbol))
             else:
                 data_dict = self.collector.get_historical_data(symbol)
                 data = [[date] + prices for date, prices in data_dict.items()]
-            # load to DataFrame to fill missing data-points
-            date_col = self.column_names[0]
-            data = pd.DataFrame(data, columns=self.column_names)
-            data.replace(to_replace=0, value=np.nan, inplace=True)
-            data.fillna(method='ffill', inplace=True)
-            # (back) to desired output format
+            data = self._to_output_format(data, df)
             if df:
                 data.name=symbol
-                data.set_index(pd.DatetimeIndex(data[date_col]), inplace=True)
-                data.drop(date_col, axis=1, inplace=True)
-            else:
-                data = data.values.tolist()
             pricing_data[symbol] = data
         if len(symbols) == 1:
             return pricing_data[symbol]
@@ -96,7 +99,25 @@ class GPWData():
         Function returns df or list (depends on input type) with new adjusted prices.
         If list, order is as follow: 
         ['date','open','high','low','close','volume','adj_open','adj_high','adj_low','adj_close']
+        If dict ({symbol: df or list}), then dict with de-trended data of each symbol is returned.
         """
+        if isinstance(data, dict):
+            return {symbol: self.detrend(symbol_data) for symbol, symbol_data in data.items()}
+        price_columns = self.column_names[1:5]
+        if isinstance(data, pd.core.frame.DataFrame):
+            df = data.copy()
+            adj_prices = _detrend_prices(df[price_columns].to_numpy(dtype=float))
+            for idx, column in enumerate(price_columns):
+                df[f'adj_{column}'] = adj_prices[:, idx]
+            return df
+        elif isinstance(data, list):
+            # where col refers to 'open','high','low','close' columns
+            prices = np.array([row[1:5] for row in data], dtype=float).reshape(len(data), 4)
+            adj_prices = _detrend_prices(prices).tolist()
+            return [row + adj_row for row, adj_row in zip(data, adj_prices)]
+
+    def _detrend_reference(self, data):
+        """Previous (per column, per row) implementation of detrend. Kept for tests and benchmarks."""
         if isinstance(data, pd.core.frame.DataFrame):
             df = data.copy()
             for column in self.column_names:
@@ -132,6 +153,32 @@ class GPWData():
                 new_data.append(row + adj_prices)
             return new_data
 
+    def _read_csv_rows(self, path):
+        with open(path, 'r') as fh:
+            reader = csv.reader(fh)
+            next(reader)  # skip the header
+            return [
+                [row[0], float(row[1]), float(row[2]), float(row[3]), float(row[4]), int(row[5])]
+                for row in reader
+            ]
+
+    def _read_csv_df(self, path):
+        return self._to_output_format(self._read_csv_rows(path), df=True)
+
+    def _to_output_format(self, data, df):
+        # load to DataFrame to fill missing data-points
+        date_col = self.column_names[0]
+        data = pd.DataFrame(data, columns=self.column_names)
+        data.replace(to_replace=0, value=np.nan, inplace=True)
+        data.fillna(method='ffill', inplace=True)
+        # (back) to desired output format
+        if df:
+            data.set_index(pd.DatetimeIndex(data[date_col]), inplace=True)
+            data.drop(date_col, axis=1, inplace=True)
+        else:
+            data = data.values.tolist()
+        return data
+
     def _gather_symbols(self, symbols, etfs, index):
         # if all provided thorw an exception
         is_not_none = [x[0] for x in zip(('symbols','etfs','index'), (symbols, etfs, index)) if x[1] is not None]
@@ -153,6 +200,21 @@ class GPWData():
         return os.path.join(self.pricing_data_path, '{}_pricing.csv'.format(symbol))
 
 
+def _detrend_prices(prices):
+    """
+    De-trends columns of 2D array of prices (day per row) all at once. Average daily change (skipping NaNs) is
+    subtracted from each change, and adjusted prices are the first price plus cumulative sum of adjusted changes.
+    """
+    changes = np.empty_like(prices)
+    changes[0] = np.nan
+    np.subtract(prices[1:], prices[:-1], out=changes[1:])
+    with np.errstate(invalid='ignore'):
+        avg_changes = np.nanmean(changes, axis=0) if prices.shape[0] > 1 else np.zeros(prices.shape[1])
+    adj_changes = changes - avg_changes
+    adj_changes[np.isnan(adj_changes)] = 0
+    return prices[:1] + np.cumsum(adj_changes, axis=0)
+
+
 def main():
     pass
 
@@ -1,9 +1,10 @@
 # built in
 import csv
 import datetime
+import io
+import json
 import os
 import statistics
-import time
 
 # 3rd party
 import dateparser
@@ -16,10 +17,29 @@ import numpy as np
 from ftse_symbols import (
     ftse_100,
 ) 
+import pricing_cache
+from price_collector import (
+    bulk_download,
+    RateLimiter,
+    retry_with_backoff,
+)
+
+
+# redo journal of incremental update (new tail of csv file), see LSEData._replace_tail
+JOURNAL_SUFFIX = '.journal'
 
 
 class LSEData():
-    def __init__(self, pricing_data_path='./pricing_data'):
+    def __init__(self, pricing_data_path='./pricing_data', use_cache=True, min_interval=1, max_retries=3, backoff=15):
+        """
+        *use_cache* - if True, DataFrames loaded from csv files are cached in binary format (see pricing_cache)
+        *min_interval* - min. seconds between requests to investing.com (shared by all download threads)
+        *max_retries*, *backoff* - retrying of connection issues (see price_collector.retry_with_backoff)
+        """
+        self.use_cache = use_cache
+        self.rate_limiter = RateLimiter(min_interval)
+        self.max_retries = max_retries
+        self.backoff = backoff
         self.country = 'united kingdom'
         self.indicies_stocks = {
             'FTSE100': [el['symbol'] for el in ftse_100]
@@ -43,19 +63,18 @@ class LSEData():
             symbols = [symbols]
         pricing_data = {}
         for symbol in symbols:
-            if from_csv:
-                data_df = pd.read_csv(self._output_path(symbol))
-                date_col = self.column_names[0]
-                data_df.set_index(pd.DatetimeIndex(data_df[date_col]), inplace=True)
-                data_df.drop(date_col, axis=1, inplace=True)
+            if from_csv and self.use_cache:
+                data_df = pricing_cache.load(self._output_path(symbol), self._read_csv_df, 'lse')
+            elif from_csv:
+                data_df = self._read_csv_df(self._output_path(symbol))
             else:
                 data_df = self._get_stock_historical_data(symbol)
                 data_df.drop('Currency', axis=1, inplace=True)
                 data_df.rename(columns={c: c.lower() for c in data_df.columns}, inplace=True)
                 data_df.index.rename('date', inplace=True)
+                data_df.replace(to_replace=0, value=np.nan, inplace=True)
+                data_df.fillna(method='ffill', inplace=True)
             data_df.name=symbol
-            data_df.replace(to_replace=0, value=np.nan, inplace=True)
-            data_df.fillna(method='ffill', inplace=True)
             if df == True:
                 pricing_data[symbol] = data_df
             else:
@@ -68,45 +87,116 @@ class LSEData():
         else:
             return pricing_data
 
-    def download_data_to_csv(self, symbols=None, from_date=None, append_csv=False):
+    def download_data_to_csv(self, symbols=None, from_date=None, append_csv=False, max_workers=4):
         """
         Collects historical data and outputs csv file in *pricing_data_path*. Currently it takes
-        history from 1990 until execution date and its overwriting files.
+        history from 1990 until execution date and its overwriting files. Symbols are downloaded by *max_workers*
+        threads. Raises price_collector.BulkDownloadError if some symbols failed (others are saved anyway).
         """
-        for symbol in symbols:
+        def _download(symbol):
             print('Downloading {}'.format(symbol))
-            pricing_data = self._download_with_retry(symbol, from_date)
-            data = self._pricing_data_2_rows(pricing_data)
-            mode = 'w' if append_csv == False else 'a'
-            with open(self._output_path(symbol), 'w') as fh:
-                writer = csv.writer(fh)
-                writer.writerow(self.column_names)
-                for row in data:
-                    writer.writerow(row)
-            time.sleep(1)
+            self._full_download(symbol, from_date)
 
-    def incremental_download_to_csv(self, symbols=None):
+        bulk_download(symbols, _download, max_workers=max_workers)
+
+    def incremental_download_to_csv(self, symbols=None, max_workers=4):
         """
         Similar to download_data_to_csv, but looks for last available date. Download data
-        from that date (including last available) and write/over-write new data.
+        from that date (including last available) and write/over-write new data. Only the last session is
+        replaced and new ones are appended (rest of the file is not touched). Files which don't exist (or have no
+        data) are downloaded fully.
         """
         print('Start incremental load')
-        for symbol in symbols:
-            print(f'Downloading {symbol}')
-            org_data = []
-            with open(self._output_path(symbol), 'r') as fh:
-                reader = csv.reader(fh)
-                for row in reader:
-                    org_data.append(tuple(row))
-            last_aval_date = org_data[-1][0]
-            pricing_data = self._download_with_retry(symbol, last_aval_date)
-            new_data = self._pricing_data_2_rows(pricing_data)
-            inc_data = org_data[:-1] + new_data
-            with open(self._output_path(symbol), 'w') as fh:
-                writer = csv.writer(fh)
-                for row in inc_data:
-                    writer.writerow(row)
-            time.sleep(1)
+        bulk_download(symbols, self._incremental_download, max_workers=max_workers)
+
+    def _full_download(self, symbol, from_date=None):
+        pricing_data = self._download_with_retry(symbol, from_date)
+        data = self._pricing_data_2_rows(pricing_data)
+        with open(self._output_path(symbol), 'w') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(self.column_names)
+            for row in data:
+                writer.writerow(row)
+
+    def _incremental_download(self, symbol):
+        print(f'Downloading {symbol}')
+        path = self._output_path(symbol)
+        # finish tail replacement interrupted by previous run (if any)
+        self._recover_tail(path)
+        if not os.path.exists(path):
+            return self._full_download(symbol)
+        last_line_start, last_line_end, last_row = self._read_last_row(path)
+        if last_row is None or last_row[0] == self.column_names[0]:
+            return self._full_download(symbol)
+        last_aval_date = last_row[0]
+        pricing_data = self._download_with_retry(symbol, last_aval_date)
+        new_data = [row for row in self._pricing_data_2_rows(pricing_data) if row[0] >= last_aval_date]
+        if not new_data:
+            return
+        # last available session is replaced only if it was downloaded again. anything after last complete line
+        # (not fully written row) is always dropped
+        tail_offset = last_line_start if new_data[0][0] == last_aval_date else last_line_end
+        self._replace_tail(path, tail_offset, new_data)
+
+    def _read_last_row(self, path, block_size=4096):
+        """
+        Returns (start offset, end offset, parsed row) of the last complete line (ending with new line) of *path*.
+        File is read backwards, so only its end is read. Row is None if there is no complete line.
+        """
+        with open(path, 'rb') as fh:
+            pos = fh.seek(0, os.SEEK_END)
+            buffer = b''
+            while pos > 0:
+                read_size = min(block_size, pos)
+                pos -= read_size
+                fh.seek(pos)
+                buffer = fh.read(read_size) + buffer
+                line_end = buffer.rfind(b'\n')
+                if line_end == -1:
+                    continue
+                line_start = buffer.rfind(b'\n', 0, line_end) + 1
+                if line_start > 0 or pos == 0:
+                    line = buffer[line_start:line_end+1].decode()
+                    return pos + line_start, pos + line_end + 1, next(csv.reader([line]))
+        return 0, 0, None
+
+    def _replace_tail(self, path, offset, rows):
+        """
+        Replaces content of *path* after *offset* with *rows*. Journal with the new tail is saved first, so if
+        process dies during replacement, it's redone by _recover_tail.
+        """
+        output = io.StringIO()
+        writer = csv.writer(output)
+        for row in rows:
+            writer.writerow(row)
+        journal = {'offset': offset, 'tail': output.getvalue()}
+        journal_path = path + JOURNAL_SUFFIX
+        tmp_journal_path = journal_path + '.tmp'
+        with open(tmp_journal_path, 'w') as fh:
+            json.dump(journal, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_journal_path, journal_path)
+        self._apply_journal(path, journal)
+        os.remove(journal_path)
+
+    def _recover_tail(self, path):
+        journal_path = path + JOURNAL_SUFFIX
+        if not os.path.exists(journal_path):
+            return
+        with open(journal_path, 'r') as fh:
+            journal = json.load(fh)
+        self._apply_journal(path, journal)
+        os.remove(journal_path)
+
+    def _apply_journal(self, path, journal):
+        # writing the same tail again is harmless, so journal can be applied many times
+        with open(path, 'r+b') as fh:
+            fh.truncate(journal['offset'])
+            fh.seek(journal['offset'])
+            fh.write(journal['tail'].encode())
+            fh.flush()
+            os.fsync(fh.fileno())
 
     def get_all_available_symbols(self):
         """
@@ -115,6 +205,15 @@ class LSEData():
         stocks_df = investpy.get_stocks(country=self.country)
         return stocks_df['symbol'].to_list()
 
+    def _read_csv_df(self, path):
+        data_df = pd.read_csv(path)
+        date_col = self.column_names[0]
+        data_df.set_index(pd.DatetimeIndex(data_df[date_col]), inplace=True)
+        data_df.drop(date_col, axis=1, inplace=True)
+        data_df.replace(to_replace=0, value=np.nan, inplace=True)
+        data_df.fillna(method='ffill', inplace=True)
+        return data_df
+
     def _output_path(self, symbol):
         return os.path.join(self.pricing_data_path, '{}_pricing.csv'.format(symbol))
 
@@ -132,13 +231,13 @@ class LSEData():
         )
 
     def _download_with_retry(self, symbol, from_date):
-        try:
-            pricing_data = self._get_stock_historical_data(symbol, from_date=from_date)
-        except ConnectionError:
-            print('Some connection issue. Waiting 60s and retrying')
-            time.sleep(60)
-            pricing_data = self._get_stock_historical_data(symbol, from_date=from_date)
-        return pricing_data
+        def _download():
+            self.rate_limiter.wait('investing.com')
+            return self._get_stock_historical_data(symbol, from_date=from_date)
+
+        return retry_with_backoff(
+            _download, (ConnectionError,), max_retries=self.max_retries, backoff=self.backoff
+        )
 
     def _pricing_data_2_rows(self, pricing_data):
         dates = [d.date().strftime('%Y-%m-%d') for d in pricing_data.index.to_list()]
@@ -1,5 +1,6 @@
 # built-in
 from abc import ABCMeta, abstractmethod
+import logging
 import random
 
 from commons import (
@@ -21,6 +22,8 @@ class PositionSize(metaclass=ABCMeta):
     """
     def __init__(self, fee_perc=0.0038, min_fee=4, sort_type='alphabetically', logger=None, debug=False):
         self.log = setup_logging(logger=logger, debug=debug)
+        # skip building debug messages if they are not going to be logged (called many times per backtest day)
+        self._debug = self.log.isEnabledFor(logging.DEBUG)
         self.fee_perc = fee_perc
         self.min_fee = min_fee
         self.sort_type = sort_type
@@ -80,16 +83,20 @@ class PositionSize(metaclass=ABCMeta):
         }
 
     def _deciding_to_buy_msg(self, symbol, entry_type):
-        self.log.debug('\t+ Deciding how much of {} to buy ({}).'.format(symbol, entry_type))
+        if self._debug:
+            self.log.debug('\t+ Deciding how much of {} to buy ({}).'.format(symbol, entry_type))
 
     def _cannot_afford_msg(self, symbol):
-        self.log.debug('\t+ Cannot afford any amount of share. Not buying {}.'.format(symbol))
+        if self._debug:
+            self.log.debug('\t+ Cannot afford any amount of share. Not buying {}.'.format(symbol))
 
     def _buying_decision_msg(self, shares_count, symbol):
-        self.log.debug('\t+ Buying decision: {} shares of {}.'.format(shares_count, symbol))
+        if self._debug:
+            self.log.debug('\t+ Buying decision: {} shares of {}.'.format(shares_count, symbol))
 
     def _money_and_price_msg(self, money, price):
-        self.log.debug('\t+ Based on available_money: {} and price: {}'.format(money, price))
+        if self._debug:
+            self.log.debug('\t+ Based on available_money: {} and price: {}'.format(money, price))
 
 
 class MaxFirstEncountered(PositionSize):
@@ -125,9 +132,10 @@ class FixedCapitalPerc(PositionSize):
 
     def decide_what_to_buy(self, available_money_at_time, candidates, capital=None, volatility={}, **kwargs):
         single_buy_limit = round(capital*self.capital_perc, 2)
-        self.log.debug('\t+ Based on capital: {} which gives signle transaction valiue limit: {} ({}%)'.format(
-            capital, single_buy_limit, self.capital_perc*100
-        ))
+        if self._debug:
+            self.log.debug('\t+ Based on capital: {} which gives signle transaction valiue limit: {} ({}%)'.format(
+                capital, single_buy_limit, self.capital_perc*100
+            ))
         symbols_to_buy = []
         for candidate in self.sort(candidates, volatility=volatility):
             price = candidate['price']
@@ -236,14 +244,17 @@ class FixedRisk(PositionSize):
                     # use only 80% of available money. 10% is safety buffer for execution slippage
                     shares_count = self.get_shares_count(money_for_partial, price)
                     if shares_count == 0:
-                        self.log.debug(f'Got 0 shares count for {sym}. No buy.')
+                        if self._debug:
+                            self.log.debug(f'Got 0 shares count for {sym}. No buy.')
                         continue
-                    self.log.debug(f'Partial order from Position Sizer: {sym}:{shares_count}')
+                    if self._debug:
+                        self.log.debug(f'Partial order from Position Sizer: {sym}:{shares_count}')
                 else:
-                    self.log.debug((
-                        f'Not enough money to fully buy {sym}. '
-                        f'Need: {theoretical_trx_value}, have: {money_for_partial}'
-                    ))
+                    if self._debug:
+                        self.log.debug((
+                            f'Not enough money to fully buy {sym}. '
+                            f'Need: {theoretical_trx_value}, have: {money_for_partial}'
+                        ))
                     continue
             else:
                 shares_count = self.get_shares_count(theoretical_trx_value, price)
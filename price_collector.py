@@ -1,7 +1,9 @@
 # built-in
+import concurrent.futures
 import datetime
 from collections import OrderedDict
 import json
+import threading
 import time
 import xml.etree.ElementTree as element_tree
 
@@ -12,15 +14,105 @@ import urllib
 # custom
 import useragents
 
-class PriceCollector():
 
-    def __init__(self):
+# HTTP statuses worth retrying (rate limited / temporary server issues)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RetryableHTTPError(requests.HTTPError):
+    pass
+
+
+class BulkDownloadError(Exception):
+    """Raised when some symbols failed in bulk download. *errors* - {symbol: exception}"""
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('Failed to download: {}'.format(', '.join(
+            '{} ({})'.format(symbol, e) for symbol, e in errors.items()
+        )))
+
+
+class RateLimiter():
+    """
+    Keeps at least *min_interval* seconds between requests with the same key (e.g. host). Thread safe - each
+    caller reserves its own slot, so concurrent requests to the same host are spread in time.
+    """
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, key):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(key, now))
+            self._next_slot[key] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def retry_with_backoff(func, retry_exceptions, max_retries=3, backoff=1.0):
+    """
+    Returns func(). If it raises one of *retry_exceptions* it's called again (up to *max_retries* times) after
+    backoff*2^attempt seconds.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return func()
+        except retry_exceptions as e:
+            if attempt == max_retries:
+                raise
+            wait = backoff * 2**attempt
+            print('Request failed ({}). Retrying in {}s'.format(e, wait))
+            time.sleep(wait)
+
+
+def bulk_download(symbols, download_func, max_workers=4):
+    """
+    Calls *download_func*(symbol) for each of *symbols* in pool of *max_workers* threads. Returns {symbol: result}.
+    Failure of single symbol does not stop others - BulkDownloadError with all failures is raised at the end.
+    """
+    results = {}
+    errors = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(download_func, symbol): symbol for symbol in symbols}
+        for future in concurrent.futures.as_completed(futures):
+            symbol = futures[future]
+            try:
+                results[symbol] = future.result()
+            except Exception as e:
+                errors[symbol] = e
+    if errors:
+        raise BulkDownloadError(errors)
+    return results
+
+
+class PriceCollector():
+    """
+    *base_url* - address of bankier.pl (historical data)
+    *min_interval* - min. seconds between requests to the same host
+    *max_retries*, *backoff* - retrying of failed requests (see retry_with_backoff)
+    *pool_size* - max. number of kept-alive connections per host (should be >= number of download workers)
+    """
+    def __init__(self, base_url='https://www.bankier.pl', min_interval=0.5, max_retries=3, backoff=1.0, timeout=30,
+                 pool_size=8):
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(min_interval)
         self.headers = {
             'User-Agent': useragents.random_useragent(),
             'Accept':'application/json, text/plain, */*',
             'Connection':'keep-alive',
             'Accept-Encoding':'gzip, deflate, sdch',
         }
+        # session is shared between download threads (connections are reused)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
     def get_historical_data(self, symbol, from_date=None, to_date=None):
         """
@@ -46,8 +138,8 @@ class PriceCollector():
                 'date_from': self._date_to_ts(from_date),
                 'date_to': self._date_to_ts(to_date)
             })
-        url = 'https://www.bankier.pl/new-charts/get-data'
-        r = requests.get(url, params=params)
+        url = self.base_url + '/new-charts/get-data'
+        r = self._get(url, params=params)
         try:
             r_json = json.loads(r.text)
         except json.decoder.JSONDecodeError:
@@ -66,7 +158,7 @@ class PriceCollector():
         """
         Returns dictionary with stocks symbols as a key and dict wtih some additional information as value
         """
-        r = requests.get('https://www.parkiet.com/data/stock.json')
+        r = self._get('https://www.parkiet.com/data/stock.json')
         return {
             company['short_name']: {
                 'full_name': company['short_name'],
@@ -126,6 +218,25 @@ class PriceCollector():
             'ETFW20L': 'LU0459113907'
         }
 
+    def _get(self, url, params=None):
+        """GET request with rate limiting per host and retrying of connection issues/temporary errors."""
+        host = urllib.parse.urlsplit(url).netloc
+
+        def _request():
+            self.rate_limiter.wait(host)
+            r = self.session.get(url, params=params, timeout=self.timeout)
+            if r.status_code in RETRY_STATUSES:
+                raise RetryableHTTPError('{} for {}'.format(r.status_code, r.url), response=r)
+            r.raise_for_status()
+            return r
+
+        return retry_with_backoff(
+            _request,
+            (requests.ConnectionError, requests.Timeout, RetryableHTTPError),
+            max_retries=self.max_retries,
+            backoff=self.backoff,
+        )
+
     def _date_to_ts(self, d):
         "Converts YYYY-MM-DD to unix timestamp"
         return int(time.mktime(datetime.datetime.strptime(d, '%Y-%m-%d').timetuple())*1000)
@@ -0,0 +1,123 @@
+"""
+Binary cache of pricing data loaded from csv files (GPWData/LSEData). Parsed and processed DataFrame of each csv is
+stored as numpy structured array (.npy) in *.cache* directory next to the csv files, so next loads only memory-map
+it. Cache entry is valid as long as modification time and size of its csv file do not change.
+
+    pricing_data
+        /SYMBOL_pricing.csv
+        /.cache
+            /SYMBOL_pricing.TAG.npy - index and columns of the DataFrame
+            /SYMBOL_pricing.TAG.json - csv mtime/size the entry was built from, index name
+
+TAG identifies the loader (e.g. gpw, lse), as each loader processes csv files on its own.
+"""
+# built in
+import json
+import os
+
+# 3rd party
+import numpy as np
+import pandas as pd
+
+
+CACHE_DIR_NAME = '.cache'
+# change when format of cached files changes (invalidates all entries)
+CACHE_VERSION = 1
+_INDEX_FIELD = '__index__'
+
+
+def load(csv_path, read_func, tag, cache_dir=None):
+    """
+    Returns DataFrame with data of *csv_path*. It's taken from cache if possible. Otherwise it's read with
+    *read_func*(csv_path) and cached (if it has datetime index and numeric columns only).
+    *tag* - name of the loader (entries of different loaders are kept separately)
+    *cache_dir* - directory with cache entries (.cache next to the csv file by default)
+    """
+    npy_path, meta_path = _entry_paths(csv_path, tag, cache_dir)
+    csv_stat = os.stat(csv_path)
+    meta = _read_meta(meta_path)
+    if meta is not None and meta == _meta(csv_stat, meta.get('index_name')):
+        try:
+            return _from_array(np.load(npy_path, mmap_mode='r'), meta['index_name'])
+        except (OSError, ValueError):
+            # entry removed or not fully written. just read the csv again
+            pass
+    df = read_func(csv_path)
+    arr = _to_array(df)
+    if arr is not None:
+        _write_entry(npy_path, meta_path, arr, _meta(csv_stat, df.index.name))
+    return df
+
+
+def clear(cache_dir):
+    """Removes all entries from *cache_dir*."""
+    if not os.path.exists(cache_dir):
+        return
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith(('.npy', '.json')):
+            os.remove(os.path.join(cache_dir, file_name))
+
+
+def _entry_paths(csv_path, tag, cache_dir):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(csv_path), CACHE_DIR_NAME)
+    name = '{}.{}'.format(os.path.splitext(os.path.basename(csv_path))[0], tag)
+    return os.path.join(cache_dir, name + '.npy'), os.path.join(cache_dir, name + '.json')
+
+
+def _meta(csv_stat, index_name):
+    return {
+        'version': CACHE_VERSION,
+        'csv_mtime_ns': csv_stat.st_mtime_ns,
+        'csv_size': csv_stat.st_size,
+        'index_name': index_name,
+    }
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, 'r') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_entry(npy_path, meta_path, arr, meta):
+    """Array first, meta after (meta makes entry valid). Both are replaced atomically."""
+    os.makedirs(os.path.dirname(npy_path), exist_ok=True)
+    pid = os.getpid()
+    tmp_npy_path = f'{npy_path}.{pid}.tmp'
+    with open(tmp_npy_path, 'wb') as fh:
+        np.save(fh, arr)
+    os.replace(tmp_npy_path, npy_path)
+    tmp_meta_path = f'{meta_path}.{pid}.tmp'
+    with open(tmp_meta_path, 'w') as fh:
+        json.dump(meta, fh)
+    os.replace(tmp_meta_path, meta_path)
+
+
+def _to_array(df):
+    """DataFrame as structured array (index + columns). None if it can't be cached."""
+    if not isinstance(df.index, pd.DatetimeIndex) or df.index.tz is not None:
+        return None
+    columns = list(df.columns)
+    if any(not isinstance(c, str) for c in columns) or _INDEX_FIELD in columns or len(set(columns)) != len(columns):
+        return None
+    if any(df[c].dtype.kind not in 'biuf' for c in columns):
+        return None
+    dtype = [(_INDEX_FIELD, 'M8[ns]')] + [(c, df[c].dtype) for c in columns]
+    arr = np.empty(len(df.index), dtype=dtype)
+    arr[_INDEX_FIELD] = df.index.values
+    for c in columns:
+        arr[c] = df[c].to_numpy()
+    return arr
+
+
+def _from_array(arr, index_name):
+    columns = [name for name in arr.dtype.names if name != _INDEX_FIELD]
+    # columns are copied from memory-mapped file, so returned DataFrame can be modified
+    return pd.DataFrame(
+        {c: np.array(arr[c]) for c in columns},
+        index=pd.DatetimeIndex(np.array(arr[_INDEX_FIELD]), name=index_name),
+        columns=columns,
+    )
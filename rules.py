@@ -1,5 +1,13 @@
+# built in
+import functools
+import heapq
+
 # 3rd party
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# custom
+import candles
 
 
 class Candle():
@@ -45,13 +53,28 @@ def _rescale(arr, new_max=100, new_min=0):
     return k * (arr-arr_max)+new_max
 
 
-def trend(arr):
-    """
-    Finds trend in 'arr'. Returns trading signals (1,0,-1) based on slope 
-    of the fitted straight line.
-    """
-    if not isinstance(arr, np.ndarray):
-        arr = np.array(arr)
+# slopes closer than that to the threshold are recomputed with lstsq (closed form may differ on last bits)
+_TREND_TH_TOLERANCE = 1e-9
+
+
+@functools.lru_cache(maxsize=None)
+def _trend_x_stats(len_arr):
+    """x is always 1..len_arr, so its centered values and sum of squares can be reused."""
+    x = np.array(range(1,len_arr+1), dtype=float)
+    x_centered = x - x.mean()
+    return x_centered, (x_centered*x_centered).sum()
+
+
+def _trend_threshold(len_arr):
+    # arbitrary thresholds. no science here - I've visually tested and adjusted these numbers
+    if len_arr <= 7:
+        return 9
+    elif len_arr <= 14:
+        return 5
+    return .7
+
+
+def _trend_slope_lstsq(arr):
     # scale values to allow similar comparison of "a"
     arr = _rescale(arr)
     len_arr = len(arr)
@@ -59,27 +82,99 @@ def trend(arr):
     A = np.vstack([x, np.ones(len(x))]).T
     # fits: y = ax + b
     a, b = np.linalg.lstsq(A, arr, rcond=None)[0]
-    # arbitrary threshold of 2. no science here - I've visually tested and adjusted this number
-    if len_arr <= 7:
-        if a > 9:
-            return 1
-        elif a < -9:
-            return -1
-    elif len_arr <= 14:
-        if a > 5:
-            return 1
-        elif a < -5:
-            return -1
-    else:
-        if a > .7:
-            return 1
-        elif a < -.7:
-            return -1
+    return a
+
+
+def _trend_slope(arr):
+    """
+    Closed form of _trend_slope_lstsq. Slope of rescaled values is slope of raw ones times rescaling factor, and
+    slope of raw ones is sum(xc*y)/sum(xc^2) (xc - centered x).
+    """
+    len_arr = len(arr)
+    # with NaNs slope is NaN anyway (and trend falls back to lstsq), so numpy's min/max are fine here
+    arr_min = arr.min()
+    arr_max = arr.max()
+    if len_arr == 1:
+        # lstsq returns minimum norm solution (a == b) for single value. values are not rescaled then
+        return arr[0]/2
+    if arr_max == arr_min:
+        return 0
+    x_centered, sxx = _trend_x_stats(len_arr)
+    k = 100/(arr_max - arr_min)
+    return k*np.correlate(arr, x_centered)[0]/sxx
+
+
+def _trend_signal(a, th):
+    if a > th:
+        return 1
+    elif a < -th:
+        return -1
     return 0
 
 
+def trend(arr):
+    """
+    Finds trend in 'arr'. Returns trading signals (1,0,-1) based on slope 
+    of the fitted straight line.
+    """
+    if not isinstance(arr, np.ndarray):
+        arr = np.array(arr)
+    th = _trend_threshold(len(arr))
+    a = _trend_slope(arr.astype(float))
+    if not np.isfinite(a) or abs(abs(a)-th) <= _TREND_TH_TOLERANCE:
+        a = _trend_slope_lstsq(arr)
+    return _trend_signal(a, th)
+
+
+def _trend_lstsq(arr):
+    """Reference implementation of trend (fits line with lstsq)."""
+    if not isinstance(arr, np.ndarray):
+        arr = np.array(arr)
+    return _trend_signal(_trend_slope_lstsq(arr), _trend_threshold(len(arr)))
+
+
 def _find_support_resistance(y, e=False):
     """
+    Finds support/resistance level in 'y' (returns tuple (support, resistance)). It looks at either 'global' or 'local' definition of 
+    support/resistance. If global - whole period is looked at. If local, then price has to be 
+    less/greater than the e previous prices.
+    e - Should be int. Used for alternative supprot/resistance definition.
+
+    Local support is the last price which has less than e smaller prices before it. That is the same as: price is not
+    bigger than e-th smallest of previous prices. e smallest prices seen so far are kept in a heap, so it is
+    O(n log e) instead of O(n^2) (see _find_support_resistance_quadratic).
+    """
+    # "global" definition of supp/res 
+    if not e or e>y.shape[0]:
+        return (min(y), max(y))
+    # "local" definition
+    support_idx = resistance_idx = 0
+    smallest = [] # e smallest prices (negated, so heap top is e-th smallest)
+    biggest = [] # e biggest prices (heap top is e-th biggest)
+    for idx, price in enumerate(y.tolist()):
+        if price != price:
+            # NaN is not smaller/bigger than anything, so it is always a level. it is not counted for later prices
+            support_idx = resistance_idx = idx
+            continue
+        if len(smallest) < e or price <= -smallest[0]:
+            support_idx = idx
+        if len(biggest) < e or price >= biggest[0]:
+            resistance_idx = idx
+        if len(smallest) < e:
+            heapq.heappush(smallest, -price)
+            heapq.heappush(biggest, price)
+            continue
+        if price < -smallest[0]:
+            heapq.heapreplace(smallest, -price)
+        if price > biggest[0]:
+            heapq.heapreplace(biggest, price)
+    return (y[support_idx], y[resistance_idx])
+
+
+def _find_support_resistance_quadratic(y, e=False):
+    """
+    Reference implementation of _find_support_resistance (quadratic in len(y)).
+
     Finds support/resistance level in 'y' (returns tuple (support, resistance)). It looks at either 'global' or 'local' definition of 
     support/resistance. If global - whole period is looked at. If local, then price has to be 
     less/greater than the e previous prices.
@@ -256,6 +351,82 @@ def candle_hammer_hanging_man(dict_arrs, open='open', high='high', low='low', cl
     Notes:
     - It is useful to use it with "hold_fixed_days" for the rule
     """
+    cdl = candles.features(dict_arrs, open=open, high=high, low=low, close=close)
+    form_idx = -2 if conf == True else -1
+    # if no trend - formation is not valid already at this point
+    preceding_trend = trend(cdl['close'][:form_idx])
+    if preceding_trend == 0:
+        return 0
+    # if there is a trend - check if Hammer/Hanging Man exists
+    preceding_bodies = cdl['body'][:form_idx][:-2]
+    return int(candles.hammer_hanging_man(
+        candles.select(cdl, form_idx),
+        preceding_trend,
+        preceding_bodies.mean(),
+        preceding_bodies.std(),
+        conf=candles.select(cdl, -1) if conf == True else None,
+        no_std=no_std,
+    ))
+
+
+def candle_engulfing(dict_arrs, open='open', high='high', low='low', close='close'):
+    """
+    The engulfing pattern is a major reversal signal with two opposite color candles composing this pattern.
+    There is bullish and bearish engulfing pattern. There are three criteria for an engulfing pattern:
+    1) The market has to be in a clearly definable uptrend or downtrend (even if the trend is short term)
+    2) Two candlesticks comprise the pattern. The second real body must "engulf" the prior real body. That is
+       both open/close prices are higher/lower in latter candle. Shadows do not need to be engulfed.
+    3) The second candle should be the opposite color of the first candle.
+
+    Bullish:
+    The market is in a downtrend, then a white bullish real body wraps around the prior period's black real body.
+
+    Bearish:
+    The market is up trending. The white real body engulfed by a black body is the signal for a top reversal. 
+
+    Notes:
+    - It is useful to use it with "hold_fixed_days" for the rule
+    - Increased volume on the second candle may be an additional confirmation
+    """
+    cdl = candles.features(dict_arrs, open=open, high=high, low=low, close=close)
+    preceding_trend = trend(cdl['close'][:-2])
+    # if no trend - formation is not valid already at this point
+    if preceding_trend == 0:
+        return 0
+    return int(candles.engulfing(candles.select(cdl, -2), candles.select(cdl, -1), preceding_trend))
+
+
+def candle_stars(dict_arrs, open='open', high='high', low='low', close='close'):
+    """
+    "Morning Star" is bullish. When there was downtrend and it appears, go long.
+    It is comprised of 3 candles:
+    - 1st should be big black
+    - 2nd should be very small. Color does not matter
+    - 3rd should be big white. It should cover at least half of the first candle
+
+    "Evening Star" is bearish. When there was an uptrend and it appears, go short. It is also made from 3 candles:
+    - 1st should be big white
+    - 2nd should be very small. Color does not matter
+    - 3rd should be big black. It should cover at least half of the first candle
+
+    Big candle shold have body bigger than average body in the array. Small should be smaller than average.
+    """
+    cdl = candles.features(dict_arrs, open=open, high=high, low=low, close=close)
+    preceding_trend = trend(cdl['close'][:-3])
+    # if no trend - formation is not valid already at this point
+    if preceding_trend == 0:
+        return 0
+    return int(candles.stars(
+        candles.select(cdl, -3),
+        candles.select(cdl, -2),
+        candles.select(cdl, -1),
+        preceding_trend,
+        cdl['body'][:-3][:-3].mean(),
+    ))
+
+
+def _candle_hammer_hanging_man_objects(dict_arrs, open='open', high='high', low='low', close='close', no_std=1, conf=True):
+    """Reference implementation of candle_hammer_hanging_man (with Candle objects per day)."""
     candels = _get_candles(dict_arrs, open=open, high=high, low=low, close=close)
     if conf == True:
         form_candle = candels[-2]
@@ -305,25 +476,8 @@ def candle_hammer_hanging_man(dict_arrs, open='open', high='high', low='low', cl
             return 0
 
 
-def candle_engulfing(dict_arrs, open='open', high='high', low='low', close='close'):
-    """
-    The engulfing pattern is a major reversal signal with two opposite color candles composing this pattern.
-    There is bullish and bearish engulfing pattern. There are three criteria for an engulfing pattern:
-    1) The market has to be in a clearly definable uptrend or downtrend (even if the trend is short term)
-    2) Two candlesticks comprise the pattern. The second real body must "engulf" the prior real body. That is
-       both open/close prices are higher/lower in latter candle. Shadows do not need to be engulfed.
-    3) The second candle should be the opposite color of the first candle.
-
-    Bullish:
-    The market is in a downtrend, then a white bullish real body wraps around the prior period's black real body.
-
-    Bearish:
-    The market is up trending. The white real body engulfed by a black body is the signal for a top reversal. 
-
-    Notes:
-    - It is useful to use it with "hold_fixed_days" for the rule
-    - Increased volume on the second candle may be an additional confirmation
-    """
+def _candle_engulfing_objects(dict_arrs, open='open', high='high', low='low', close='close'):
+    """Reference implementation of candle_engulfing (with Candle objects per day)."""
     candels = _get_candles(dict_arrs, open=open, high=high, low=low, close=close)
     preceding_trend = trend([c._close for c in candels[:-2]])
     # if no trend - formation is not valid already at this point
@@ -359,21 +513,8 @@ def candle_engulfing(dict_arrs, open='open', high='high', low='low', close='clos
             return 0
 
 
-def candle_stars(dict_arrs, open='open', high='high', low='low', close='close'):
-    """
-    "Morning Star" is bullish. When there was downtrend and it appears, go long.
-    It is comprised of 3 candles:
-    - 1st should be big black
-    - 2nd should be very small. Color does not matter
-    - 3rd should be big white. It should cover at least half of the first candle
-
-    "Evening Star" is bearish. When there was an uptrend and it appears, go short. It is also made from 3 candles:
-    - 1st should be big white
-    - 2nd should be very small. Color does not matter
-    - 3rd should be big black. It should cover at least half of the first candle
-
-    Big candle shold have body bigger than average body in the array. Small should be smaller than average.
-    """
+def _candle_stars_objects(dict_arrs, open='open', high='high', low='low', close='close'):
+    """Reference implementation of candle_stars (with Candle objects per day)."""
     candels = _get_candles(dict_arrs, open=open, high=high, low=low, close=close)
     preceding_trend = trend([c._close for c in candels[:-3]])
     preceding_candles = candels[:-3]
@@ -426,6 +567,255 @@ def candle_stars(dict_arrs, open='open', high='high', low='low', close='close'):
         return -1
 
 
+"""
+Vectorized versions of the rules. Each *_series function takes whole timeseries (or dict of them) and lookback and
+returns array with results for all days at once (int8, same length as input). Result for day idx is the same as
+result of the windowed rule for arr[idx-lookback:idx+1], days before lookback are set to 0.
+
+Windowed rules use python's sum (sequential accumulation), numpy's mean (pairwise summation) and python's min/max.
+Vectorized versions do the same operations in the same order (on all windows at once), so results are bit-for-bit
+the same. Windows with NaNs (e.g. python's min/max depend on position of NaN) are computed with windowed rule.
+"""
+
+
+def _windows(arr, lookback):
+    """Returns 2D view with one window (lookback+1 elements) per row. First row is for day idx=lookback."""
+    arr = np.asarray(arr)
+    if arr.shape[0] <= lookback:
+        return np.empty((0, lookback+1), dtype=arr.dtype)
+    return sliding_window_view(arr, lookback+1)
+
+
+def _to_series(values, lookback, length):
+    output = np.zeros(length, dtype=np.int8)
+    output[lookback:lookback+len(values)] = values
+    return output
+
+
+def _fix_nan_windows(values, rule, arrs, lookback, **params):
+    """Recomputes *values* of windows with NaNs with windowed *rule*. *arrs* is array or dict of arrays."""
+    arrs_list = list(arrs.values()) if isinstance(arrs, dict) else [arrs]
+    has_nan = np.zeros(values.shape[0], dtype=bool)
+    for arr in arrs_list:
+        arr = np.asarray(arr)
+        if arr.dtype.kind == 'f':
+            has_nan |= np.isnan(_windows(arr, lookback)).any(axis=1)
+    for row in np.flatnonzero(has_nan):
+        if isinstance(arrs, dict):
+            window = {k: v[row:row+lookback+1] for k, v in arrs.items()}
+        else:
+            window = arrs[row:row+lookback+1]
+        values[row] = rule(window, **params)
+    return values
+
+
+def _simple_average_rows(windows):
+    # same as python's sum - accumulates values one by one
+    acc = np.zeros(windows.shape[0], dtype=windows.dtype)
+    for col in range(windows.shape[1]):
+        acc = acc + windows[:, col]
+    return acc / windows.shape[1]
+
+
+def _weigted_average_rows(windows):
+    len_arr = windows.shape[1]
+    weights = 1 + (2 / (np.array(list(range(1,len_arr+1))[::-1])+1))
+    acc = np.zeros(windows.shape[0])
+    for col in range(len_arr):
+        acc = acc + windows[:, col]*weights[col]
+    return acc / len_arr
+
+
+def trend_series(arr, lookback):
+    """Vectorized version of trend (same arithmetic as _trend_slope, numerators with rolling correlation)."""
+    arr = np.asarray(arr)
+    windows = _windows(arr, lookback)
+    if windows.shape[0] == 0:
+        return _to_series([], lookback, len(arr))
+    len_arr = lookback+1
+    th = _trend_threshold(len_arr)
+    arr_min = windows.min(axis=1).astype(float)
+    arr_max = windows.max(axis=1).astype(float)
+    if len_arr == 1:
+        a = windows[:, 0]/2
+    else:
+        x_centered, sxx = _trend_x_stats(len_arr)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            k = 100/(arr_max - arr_min)
+            a = k*np.correlate(arr.astype(float), x_centered, 'valid')/sxx
+        a[arr_max == arr_min] = 0
+    values = np.select([a > th, a < -th], [1, -1], 0)
+    for row in np.flatnonzero(~np.isfinite(a) | (np.abs(np.abs(a)-th) <= _TREND_TH_TOLERANCE)):
+        values[row] = _trend_signal(_trend_slope_lstsq(windows[row]), th)
+    values = _fix_nan_windows(values, trend, arr, lookback)
+    return _to_series(values, lookback, len(arr))
+
+
+def _support_resistance_idxs(y, e):
+    """
+    Indexes (per row of *y*) of the local support and resistance (see _find_support_resistance). Instead of heaps, e
+    smallest/biggest prices of each row are kept sorted in arrays and each new price is inserted with compare-exchange
+    of all e positions. O(n*e) vector operations.
+    """
+    no_rows = y.shape[0]
+    support_idxs = np.zeros(no_rows, dtype=int)
+    resistance_idxs = np.zeros(no_rows, dtype=int)
+    # inf/-inf means "less than e prices so far" (price is a level then anyway)
+    smallest = np.full((no_rows, e), np.inf)
+    biggest = np.full((no_rows, e), -np.inf)
+    for j in range(y.shape[1]):
+        price = y[:, j]
+        support_idxs[price <= smallest[:, -1]] = j
+        resistance_idxs[price >= biggest[:, -1]] = j
+        new_small = new_big = price
+        for i in range(e):
+            smallest[:, i], new_small = np.minimum(smallest[:, i], new_small), np.maximum(smallest[:, i], new_small)
+            biggest[:, i], new_big = np.maximum(biggest[:, i], new_big), np.minimum(biggest[:, i], new_big)
+    return support_idxs, resistance_idxs
+
+
+def support_resistance_series(arr, lookback, e=False, b=False):
+    """Vectorized version of support_resistance."""
+    windows = _windows(arr, lookback)
+    price = windows[:, -1]
+    y = windows[:, :-1]
+    if not e or e>y.shape[1]:
+        support = y.min(axis=1)
+        resistance = y.max(axis=1)
+    else:
+        support_idxs, resistance_idxs = _support_resistance_idxs(y, e)
+        rows = np.arange(y.shape[0])
+        support = y[rows, support_idxs]
+        resistance = y[rows, resistance_idxs]
+    if not b:
+        values = np.select([price > resistance, price < support], [1, -1], 0)
+    else:
+        values = np.select([price > resistance+(resistance*b), price < support-(support*b)], [1, -1], 0)
+    values = _fix_nan_windows(values, support_resistance, arr, lookback, e=e, b=b)
+    return _to_series(values, lookback, len(arr))
+
+
+def moving_average_series(arr, lookback, weigth_ma=None, quick_ma_lookback=None, b=None):
+    """Vectorized version of moving_average."""
+    windows = _windows(arr, lookback)
+    mean = _simple_average_rows if weigth_ma == None else _weigted_average_rows
+    if not quick_ma_lookback:
+        val = windows[:, -1]
+        ma = mean(windows[:, :-1])
+    else:
+        # same slicing as in moving_average (also for quick_ma_lookback longer than lookback)
+        val = mean(windows[:, windows.shape[1]-1-quick_ma_lookback:])
+        ma = mean(windows)
+    threshold = ma if b == None else ma+(ma*b)
+    values = np.where(val > threshold, 1, -1)
+    return _to_series(values, lookback, len(arr))
+
+
+def channel_break_out_series(dict_arrs, lookback, channel_width=None, b=False, high='high', low='low', base='close'):
+    """Vectorized version of channel_break_out."""
+    channel_tops = _windows(dict_arrs[high], lookback)[:, :-1]
+    channel_bottoms = _windows(dict_arrs[low], lookback)[:, :-1]
+    price = _windows(dict_arrs[base], lookback)[:, -1]
+    perc_diffs = abs(channel_tops-channel_bottoms) / ((channel_tops+channel_bottoms)/2)
+    is_channel = (perc_diffs <= channel_width).all(axis=1)
+    top_mean = channel_tops.mean(axis=1)
+    bottom_mean = channel_bottoms.mean(axis=1)
+    th_top = top_mean + (top_mean * b)
+    th_bottom = bottom_mean - (bottom_mean*bottom_mean)
+    conditions = [price > th_top, price < th_bottom]
+    if not b:
+        conditions = [price > top_mean, price < bottom_mean] + conditions
+    values = np.select(conditions, [1, -1]*(len(conditions)//2), 0)
+    values = np.where(is_channel, values, 0)
+    return _to_series(values, lookback, len(dict_arrs[base]))
+
+
+def momentum_in_oscillator_series(arr, lookback, threshold=None):
+    """Vectorized version of momentum_in_oscillator."""
+    windows = _windows(arr, lookback)
+    cur_val = windows[:, -1]
+    prev_val = windows[:, :-1].mean(axis=1)
+    values = np.select(
+        [(prev_val < threshold) & (cur_val > threshold), (prev_val > threshold) & (cur_val < threshold)], [1, -1], 0
+    )
+    return _to_series(values, lookback, len(arr))
+
+
+def _windowed_series(rule, dict_arrs, lookback, **params):
+    """Calls windowed *rule* day by day (for lookbacks too short for vectorized candle rules)."""
+    length = len(next(iter(dict_arrs.values())))
+    values = [
+        rule({k: np.asarray(v)[idx-lookback:idx+1] for k, v in dict_arrs.items()}, **params)
+        for idx in range(lookback, length)
+    ]
+    return _to_series(values, lookback, length)
+
+
+def candle_hammer_hanging_man_series(
+        dict_arrs, lookback, open='open', high='high', low='low', close='close', no_std=1, conf=True
+    ):
+    """Vectorized version of candle_hammer_hanging_man."""
+    params = dict(open=open, high=high, low=low, close=close, no_std=no_std, conf=conf)
+    # formation candle is 1 day before confirmation one
+    form_shift = 1 if conf == True else 0
+    if lookback - form_shift < 1:
+        # not enough preceding candles for trend (windowed rule raises)
+        return _windowed_series(candle_hammer_hanging_man, dict_arrs, lookback, **params)
+    cdl = candles.features(dict_arrs, open=open, high=high, low=low, close=close)
+    # trend of all candles before formation, body stats without 2 last of them
+    preceding_trend = candles.shift_arr(trend_series(cdl['close'], lookback-form_shift-1), form_shift+1)
+    avg_body, std_body = candles.rolling_mean_std(cdl['body'], lookback-form_shift-2)
+    values = candles.hammer_hanging_man(
+        candles.shift(cdl, form_shift),
+        preceding_trend,
+        candles.shift_arr(avg_body, form_shift+3),
+        candles.shift_arr(std_body, form_shift+3),
+        conf=cdl if conf == True else None,
+        no_std=no_std,
+    )
+    return _to_series(values[lookback:], lookback, len(cdl['close']))
+
+
+def candle_engulfing_series(dict_arrs, lookback, open='open', high='high', low='low', close='close'):
+    """Vectorized version of candle_engulfing."""
+    if lookback < 2:
+        return _windowed_series(
+            candle_engulfing, dict_arrs, lookback, open=open, high=high, low=low, close=close
+        )
+    cdl = candles.features(dict_arrs, open=open, high=high, low=low, close=close)
+    preceding_trend = candles.shift_arr(trend_series(cdl['close'], lookback-2), 2)
+    values = candles.engulfing(candles.shift(cdl, 1), cdl, preceding_trend)
+    return _to_series(values[lookback:], lookback, len(cdl['close']))
+
+
+def candle_stars_series(dict_arrs, lookback, open='open', high='high', low='low', close='close'):
+    """Vectorized version of candle_stars."""
+    if lookback < 3:
+        return _windowed_series(
+            candle_stars, dict_arrs, lookback, open=open, high=high, low=low, close=close
+        )
+    cdl = candles.features(dict_arrs, open=open, high=high, low=low, close=close)
+    preceding_trend = candles.shift_arr(trend_series(cdl['close'], lookback-3), 3)
+    avg_body, _ = candles.rolling_mean_std(cdl['body'], lookback-5)
+    values = candles.stars(
+        candles.shift(cdl, 2), candles.shift(cdl, 1), cdl, preceding_trend, candles.shift_arr(avg_body, 6)
+    )
+    return _to_series(values[lookback:], lookback, len(cdl['close']))
+
+
+# windowed rule -> its vectorized version
+SERIES_RULES = {
+    trend: trend_series,
+    support_resistance: support_resistance_series,
+    moving_average: moving_average_series,
+    channel_break_out: channel_break_out_series,
+    momentum_in_oscillator: momentum_in_oscillator_series,
+    candle_hammer_hanging_man: candle_hammer_hanging_man_series,
+    candle_engulfing: candle_engulfing_series,
+    candle_stars: candle_stars_series,
+}
+
+
 def main():
     dict_arrs = {
         'open': np.array([420.0, 424.8, 430.0, 425.4, 429.8, 434.6, 429.0, 422.2, 421.6, 432.2]),
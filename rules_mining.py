@@ -1,5 +1,7 @@
 # built-in
+import concurrent.futures
 import math
+from multiprocessing import shared_memory
 import random
 import time
 
@@ -15,6 +17,11 @@ import rules
 import signal_generator
 
 
+# samples of sampling distributions are drawn in blocks of that size, each block with own random stream
+SAMPLES_PER_STREAM = 64
+DEFAULT_MEMORY_BUDGET = 256 * 2**20
+
+
 def same_lengths_assertion(lengths):
     try:
         assert(len(set(lengths)) == 1)
@@ -38,11 +45,52 @@ def pval_msg(pval):
         print(f'Rule has no predictive power')
 
 
-def create_wrc_sampling_dist(rules_results, daily_ret_col='daily_returns', no_samples=5000, batch=64):
+def create_wrc_sampling_dist(rules_results, daily_ret_col='daily_returns', no_samples=5000, seed=None,
+                             mean_block_length=None, memory_budget=DEFAULT_MEMORY_BUDGET, n_jobs=None):
     """
     Input: dict with rule_names and DataFrame with daily returns column present
+
+    Creates sampling distribution for White's Reality Check - max. mean (centered) daily return across all rules
+    for each bootstrap sample. Samples are drawn in blocks: each sample is turned into counts of days (how many
+    times each day was drawn), so means of all rules for the whole block are a single matrix product
+    (counts @ returns).
+
+    *seed* - seed for reproducible results (any value accepted by np.random.SeedSequence)
+    *mean_block_length* - if provided, stationary bootstrap (blocks of consecutive days with geometrically
+        distributed lengths with this mean) is used instead of sampling single days. It keeps (some of) the
+        autocorrelation of returns
+    *memory_budget* - approx. max. number of bytes used at once (by each process). Means of rules are computed in
+        chunks of rules if needed. Results are the same for the same seed, number of samples and memory budget
+        (matrix products of different shapes can differ in the last bits, so other memory budget can change results
+        slightly)
+    *n_jobs* - if bigger than 1, blocks of samples are distributed across that many processes. Returns matrix is
+        shared with them (shared memory). Results don't depend on number of processes
     """
-    # perepare data
+    returns = _centered_returns_matrix(rules_results, daily_ret_col)
+    no_days = returns.shape[0]
+    # idxs and counts (with bincount internals) of a block of samples
+    block_bytes = SAMPLES_PER_STREAM * 4*8*no_days
+    rules_chunk = max(1, (memory_budget - block_bytes) // (8*SAMPLES_PER_STREAM))
+    return _run_sampling(
+        _wrc_max_means, {'returns': returns}, _sample_blocks(no_samples, seed), n_jobs,
+        mean_block_length=mean_block_length, rules_chunk=rules_chunk,
+    )
+
+
+def _wrc_max_means(blocks, returns, mean_block_length, rules_chunk):
+    """WRC sampling distribution entries for *blocks* of samples."""
+    no_days = returns.shape[0]
+    max_avg_rets = []
+    # block by block - matrix products always have the same shapes
+    for size, seed_seq in blocks:
+        idxs = _bootstrap_idxs(np.random.default_rng(seed_seq), size, no_days, mean_block_length)
+        counts = _idxs_to_counts(idxs, no_days)
+        max_avg_rets.extend((_max_products(counts, returns, rules_chunk) / no_days).tolist())
+    return max_avg_rets
+
+
+def _centered_returns_matrix(rules_results, daily_ret_col):
+    """Returns days x rules matrix with daily returns of rules (NaN as 0) centered around 0."""
     lengths = []
     results = []
     for df in rules_results.values():
@@ -54,9 +102,117 @@ def create_wrc_sampling_dist(rules_results, daily_ret_col='daily_returns', no_sa
     results = np.nan_to_num(results, nan=0)
     # center returns
     avgs = results.mean(axis=0)
-    results = results - avgs
+    return results - avgs
+
+
+def _sample_blocks(no_samples, seed):
+    """
+    Splits samples into blocks of SAMPLES_PER_STREAM with independent random streams spawned from *seed*. Returns
+    list of (number of samples, SeedSequence). Samples depend only on the seed - not on the order blocks are
+    processed in.
+    """
+    no_blocks = math.ceil(no_samples / SAMPLES_PER_STREAM)
+    seed_seqs = np.random.SeedSequence(seed).spawn(no_blocks)
+    sizes = [min(SAMPLES_PER_STREAM, no_samples - idx*SAMPLES_PER_STREAM) for idx in range(no_blocks)]
+    return list(zip(sizes, seed_seqs))
+
+
+def _run_sampling(func, arrays, blocks, n_jobs, **kwargs):
+    """
+    Returns func(blocks, **arrays, **kwargs). If *n_jobs* is bigger than 1, consecutive parts of *blocks* are
+    computed by pool of *n_jobs* processes and results are concatenated in order of blocks. *arrays* (dict of
+    np.arrays) are copied to shared memory once, so they are not pickled for each task.
+    """
+    # same memory layout as in shared memory (matrix products of different layouts can differ in the last bits)
+    arrays = {name: np.ascontiguousarray(arr) for name, arr in arrays.items()}
+    if not n_jobs or n_jobs <= 1 or len(blocks) <= 1:
+        return func(blocks, **arrays, **kwargs)
+    shms = []
+    try:
+        specs = {}
+        for name, arr in arrays.items():
+            shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+            shms.append(shm)
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            specs[name] = (shm.name, arr.shape, arr.dtype.str)
+        # few parts per worker, so faster workers take more of them
+        no_parts = min(len(blocks), n_jobs*4)
+        parts = [blocks[idx*len(blocks)//no_parts:(idx+1)*len(blocks)//no_parts] for idx in range(no_parts)]
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=n_jobs, initializer=_init_sampling_worker, initargs=(specs,)
+            ) as executor:
+            parts_results = executor.map(_run_sampling_in_worker, [func]*no_parts, parts, [kwargs]*no_parts)
+            return [value for part_results in parts_results for value in part_results]
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+
+# arrays shared with sampling workers (views of shared memory attached while initializing worker)
+_WORKER_ARRAYS = None
+_WORKER_SHMS = None
+
+
+def _init_sampling_worker(specs):
+    global _WORKER_ARRAYS, _WORKER_SHMS
+    _WORKER_ARRAYS = {}
+    # shared memory has to be referenced as long as its arrays are used
+    _WORKER_SHMS = []
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _WORKER_SHMS.append(shm)
+        arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        arr.flags.writeable = False
+        _WORKER_ARRAYS[name] = arr
+
+
+def _run_sampling_in_worker(func, blocks, kwargs):
+    return func(blocks, **_WORKER_ARRAYS, **kwargs)
+
+
+def _max_products(left, right, chunk):
+    """
+    Max. of each row of left @ right. Computed for *chunk* columns of *right* at a time (converted to float if
+    needed).
+    """
+    return np.max([
+        (left @ np.asarray(right[:, idx:idx+chunk], dtype=np.float64)).max(axis=1)
+        for idx in range(0, right.shape[1], chunk)
+    ], axis=0)
+
+
+def _bootstrap_idxs(rng, size, no_days, mean_block_length=None):
+    """
+    Returns *size* x *no_days* matrix with idxs of days drawn with replacement. If *mean_block_length* is provided,
+    it's stationary bootstrap (Politis & Romano): with probability 1/mean_block_length new block starts at random
+    day, otherwise next day (wrapped around) is taken.
+    """
+    if mean_block_length is None:
+        return rng.integers(0, no_days, size=(size, no_days))
+    starts = rng.integers(0, no_days, size=(size, no_days))
+    new_block = rng.random(size=(size, no_days)) < 1/mean_block_length
+    new_block[:, 0] = True
+    days = np.arange(no_days)
+    # for each position - position where its block started
+    block_starts = np.maximum.accumulate(np.where(new_block, days, 0), axis=1)
+    block_start_days = np.take_along_axis(starts, block_starts, axis=1)
+    return (block_start_days + days - block_starts) % no_days
+
+
+def _idxs_to_counts(idxs, no_days):
+    """Number of times each day was drawn in each sample (row of *idxs*). Returned as float (for matmul)."""
+    size = idxs.shape[0]
+    offsets = (np.arange(size) * no_days)[:, np.newaxis]
+    counts = np.bincount((idxs + offsets).ravel(), minlength=size*no_days)
+    return counts.reshape(size, no_days).astype(np.float64)
+
+
+def _create_wrc_sampling_dist_loop(rules_results, daily_ret_col='daily_returns', no_samples=5000, batch=64):
+    """Previous implementation of create_wrc_sampling_dist (sample by sample). Kept for benchmarks."""
+    results = _centered_returns_matrix(rules_results, daily_ret_col)
     # get wrc sampling dist
-    sample_size = lengths[0]
+    sample_size = results.shape[0]
     sample_idxs = np.array(range(sample_size))
     max_avg_rets = []
     for k in range(no_samples):
@@ -67,7 +223,8 @@ def create_wrc_sampling_dist(rules_results, daily_ret_col='daily_returns', no_sa
     return max_avg_rets
 
 
-def create_mc_sampling_distr(rules_states, price_changes, no_samples=5000):
+def create_mc_sampling_distr(rules_states, price_changes, no_samples=5000, seed=None,
+                             memory_budget=DEFAULT_MEMORY_BUDGET, n_jobs=None):
     """
     Creates sampling distribution for the Monte Carlo method. This sampling distribution represent expected return of
     useless (random) rule. In high level it is done via random assignment of rule's values to market returns.
@@ -85,7 +242,50 @@ def create_mc_sampling_distr(rules_states, price_changes, no_samples=5000):
       all rules
     - determine mean rate of return for each rule (avg daily returns)
     - select highest mean return as entry for sampling distribution
+
+    States of all rules are stacked into int8 matrix (rule per row) and each block of permutations of price changes
+    is evaluated as a single matrix product (permuted changes @ states.T).
+    *seed*, *memory_budget*, *n_jobs* - same as in create_wrc_sampling_dist (states matrix is shared with processes)
     """
+    states = _states_matrix(rules_states)
+    assert(states.shape[1] == len(price_changes))
+    price_changes = np.asarray(price_changes, dtype=np.float64)
+    no_days = states.shape[1]
+    # permuted changes of a block of samples
+    block_bytes = SAMPLES_PER_STREAM * 8*no_days
+    # states of rule (as float) and its means
+    rules_chunk = max(1, (memory_budget - block_bytes) // (8*no_days + 8*SAMPLES_PER_STREAM))
+    return _run_sampling(
+        _mc_max_means, {'states': states, 'price_changes': price_changes}, _sample_blocks(no_samples, seed), n_jobs,
+        rules_chunk=rules_chunk,
+    )
+
+
+def _mc_max_means(blocks, states, price_changes, rules_chunk):
+    """MC sampling distribution entries for *blocks* of samples."""
+    no_rules, no_days = states.shape
+    if rules_chunk >= no_rules:
+        # whole matrix fits - convert it once instead of chunk by chunk
+        states = states.astype(np.float64)
+    max_avg_rets = []
+    for size, seed_seq in blocks:
+        changes = np.random.default_rng(seed_seq).permuted(np.broadcast_to(price_changes, (size, no_days)), axis=1)
+        max_avg_rets.extend((_max_products(changes, states.T, rules_chunk) / no_days).tolist())
+    return max_avg_rets
+
+
+def _states_matrix(rules_states):
+    """Stacks states of rules (-1, 0, 1) into rules x days int8 matrix."""
+    lengths = [len(positions) for positions in rules_states.values()]
+    same_lengths_assertion(lengths)
+    states = np.array([np.asarray(positions) for positions in rules_states.values()])
+    if states.size and (np.abs(states) > 1).any():
+        raise ValueError('Rules states have to be -1, 0 or 1')
+    return states.astype(np.int8)
+
+
+def _create_mc_sampling_distr_loop(rules_states, price_changes, no_samples=5000):
+    """Previous implementation of create_mc_sampling_distr (sample by sample, rule by rule). Kept for benchmarks."""
     lengths = [len(positions) for positions in rules_states.values()]
     same_lengths_assertion(lengths)
     assert(lengths[0] == len(price_changes))
@@ -0,0 +1,253 @@
+"""
+Columnar store of rules results (SignalGenerator.rules_results) for single symbol. Instead of pickle file per rule,
+all results are kept in one int8 matrix (row per rule) which is memory-mapped, so results of any rule can be read
+without loading others (and without copying them).
+
+Files in store directory:
+    rules_results.int8 - matrix with *days* columns. Results of rule are aligned to the last day (rules results
+        start after max lookback of config, so they can be shorter than *days*)
+    rules_results.idx - first line is number of days, then line per row: rule_id<TAB>length of its results
+    rules_results.lock - lock file for appending (stores can be shared by many processes)
+
+Store is append-only. Results of rules which are already stored are not overwritten. Store can only be cleared as
+whole (e.g. when data rules were computed on changed). To migrate directory with pickle files (as saved by
+SignalGenerator.save_rules_results):
+    python rules_store.py data_mining_rules/SYMBOL/rules --prefix SYMBOL_
+"""
+# built in
+import fcntl
+import os
+import pickle
+
+# 3rd party
+import numpy as np
+
+# custom
+import commons
+
+
+DATA_FILE = 'rules_results.int8'
+INDEX_FILE = 'rules_results.idx'
+LOCK_FILE = 'rules_results.lock'
+
+
+class RulesStore():
+    """
+    *path* - store directory (created if it does not exist)
+    *days* - number of days of the data rules were computed on (max. length of stored results). Required to create
+        new store. For existing store it's read from the index (and it has to match if given)
+    *overwrite* - if True, existing store is cleared and created again with *days* (see clear)
+    """
+    def __init__(self, path, days=None, overwrite=False):
+        self.path = path
+        self.days = None
+        self._rows = {}
+        self._lengths = []
+        self._index_size = 0
+        self._matrix = None
+        if not os.path.exists(path):
+            os.makedirs(path)
+        if overwrite:
+            if days is None:
+                raise AttributeError('Number of days is required to overwrite rules store: {}'.format(path))
+            self.clear(days)
+        self._refresh()
+        if self.days is not None and days is not None and days != self.days:
+            raise ValueError(
+                'Rules store {} has results of {} days, not {}. Results are aligned to the last day of the data, '
+                'so they have to be computed again (clear the store)'.format(path, self.days, days)
+            )
+        if self.days is None:
+            if days is None:
+                raise AttributeError('Number of days is required to create new rules store: {}'.format(path))
+            with self._lock():
+                # other process could create it in the meantime
+                self._refresh()
+                if self.days is None:
+                    with open(os.path.join(self.path, INDEX_FILE), 'w') as fh:
+                        fh.write('{}\n'.format(days))
+                    self._refresh()
+
+    def __contains__(self, rule_id):
+        if rule_id not in self._rows:
+            self._refresh()
+        return rule_id in self._rows
+
+    def __len__(self):
+        self._refresh()
+        return len(self._rows)
+
+    def rules_ids(self):
+        self._refresh()
+        return list(self._rows.keys())
+
+    def get(self, rule_id, length=None):
+        """
+        Returns results of *rule_id* as read-only int8 array (view of memory-mapped file - nothing is copied).
+        Raises KeyError if rule is not stored.
+        *length* - if given, only results of last *length* days are returned (e.g. results matrix of config with
+            bigger max lookback than the one which stored them). Raises ValueError if stored results are shorter
+        """
+        if rule_id not in self._rows:
+            self._refresh()
+        row = self._rows[rule_id]
+        if length is None:
+            length = self._lengths[row]
+        elif length > self._lengths[row]:
+            raise ValueError(
+                'Rules store {} has results of {} for {} days, not {}'.format(
+                    self.path, rule_id, self._lengths[row], length
+                )
+            )
+        return self._matrix[row, self.days-length:]
+
+    def get_many(self, rules_ids, length=None):
+        """Returns {rule_id: results} (see get)."""
+        return {rule_id: self.get(rule_id, length=length) for rule_id in rules_ids}
+
+    def append(self, rules_results):
+        """
+        Stores *rules_results* ({rule_id: results}). Rules which are already in the store are skipped. Results
+        have to be integers from int8 range and can't be longer than number of days of the store.
+        """
+        rules_results = {rule_id: np.asarray(results) for rule_id, results in rules_results.items()}
+        for rule_id, results in rules_results.items():
+            if ('\t' in rule_id) or ('\n' in rule_id):
+                raise ValueError('Rule id "{}" can not contain tabs or new lines'.format(rule_id))
+            if results.ndim != 1 or results.shape[0] > self.days:
+                raise ValueError('Results of "{}" have to be 1D with at most {} days. Got shape: {}'.format(
+                    rule_id, self.days, results.shape
+                ))
+            if results.shape[0] and (
+                results.dtype.kind not in 'iub' or results.min() < -128 or results.max() > 127
+            ):
+                raise ValueError('Results of "{}" can not be stored as int8'.format(rule_id))
+        with self._lock():
+            self._refresh()
+            to_store = [rule_id for rule_id in rules_results.keys() if rule_id not in self._rows]
+            if not to_store:
+                return
+            rows = np.zeros((len(to_store), self.days), dtype=np.int8)
+            for row, rule_id in enumerate(to_store):
+                results = rules_results[rule_id]
+                rows[row, self.days-results.shape[0]:] = results
+            data_path = os.path.join(self.path, DATA_FILE)
+            # data first, index after. rows without index entry (e.g. if process was killed in between) are dropped
+            with open(data_path, 'ab') as fh:
+                fh.truncate(len(self._lengths)*self.days)
+                fh.write(rows.tobytes())
+                fh.flush()
+                os.fsync(fh.fileno())
+            index_path = os.path.join(self.path, INDEX_FILE)
+            # drop not fully written last line (if any)
+            os.truncate(index_path, self._index_size)
+            with open(index_path, 'a') as fh:
+                fh.write(''.join(
+                    '{}\t{}\n'.format(rule_id, rules_results[rule_id].shape[0]) for rule_id in to_store
+                ))
+            self._refresh()
+
+    def clear(self, days=None):
+        """
+        Removes all results from the store and sets its number of *days* (current one by default). It must not be
+        called while the store is used by other processes.
+        """
+        days = self.days if days is None else days
+        if days is None:
+            raise AttributeError('Number of days is required to clear not created rules store: {}'.format(self.path))
+        with self._lock():
+            # index first (without rows), data after
+            index_path = os.path.join(self.path, INDEX_FILE)
+            with open(index_path + '.tmp', 'w') as fh:
+                fh.write('{}\n'.format(days))
+            os.replace(index_path + '.tmp', index_path)
+            open(os.path.join(self.path, DATA_FILE), 'wb').close()
+            self.days = None
+            self._rows = {}
+            self._lengths = []
+            self._index_size = 0
+            self._matrix = None
+            self._refresh()
+
+    def _lock(self):
+        return _FileLock(os.path.join(self.path, LOCK_FILE))
+
+    def _refresh(self):
+        """Reads new entries of the index (appended by this or other processes) and maps data file again if needed."""
+        index_path = os.path.join(self.path, INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+        with open(index_path, 'r') as fh:
+            fh.seek(self._index_size)
+            new_entries = fh.read()
+        # ignore last line if it's not fully written yet
+        new_entries = new_entries[:new_entries.rfind('\n')+1]
+        if not new_entries:
+            return
+        self._index_size += len(new_entries.encode())
+        for line in new_entries.splitlines():
+            if self.days is None:
+                self.days = int(line)
+                continue
+            rule_id, length = line.rsplit('\t', 1)
+            self._rows[rule_id] = len(self._lengths)
+            self._lengths.append(int(length))
+        if self._lengths and self.days == 0:
+            # empty file can not be memory-mapped
+            self._matrix = np.zeros((len(self._lengths), 0), dtype=np.int8)
+        elif self._lengths:
+            self._matrix = np.memmap(
+                os.path.join(self.path, DATA_FILE), dtype=np.int8, mode='r', shape=(len(self._lengths), self.days)
+            )
+
+
+class _FileLock():
+    """Exclusive lock (flock) on *path* for the time of with block."""
+    def __init__(self, path):
+        self.path = path
+        self._fh = None
+
+    def __enter__(self):
+        self._fh = open(self.path, 'a')
+        fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        self._fh.close()
+
+
+def migrate_pickles(pickles_dir, store_path=None, prefix='', days=None, chunk_size=1000):
+    """
+    Moves rules results from pickle files in *pickles_dir* (files *prefix*rule_id) into store in *store_path*
+    (*pickles_dir* by default). *days* - used if store has to be created (the longest results by default). Pickle
+    files are not removed. Returns number of migrated rules.
+    """
+    store_path = store_path or pickles_dir
+    excluded = {DATA_FILE, INDEX_FILE, LOCK_FILE}
+    files_names = sorted(
+        f for f in os.listdir(pickles_dir) if f.startswith(prefix) and f not in excluded
+    )
+    rules_results = {}
+    for file_name in files_names:
+        with open(os.path.join(pickles_dir, file_name), 'rb') as fh:
+            rules_results[file_name[len(prefix):]] = pickle.load(fh)
+    if days is None and not os.path.exists(os.path.join(store_path, INDEX_FILE)):
+        days = max([len(results) for results in rules_results.values()] or [0])
+    store = RulesStore(store_path, days=days)
+    rules_ids = list(rules_results.keys())
+    # append in chunks, so single rows matrix is not too big
+    for idx in range(0, len(rules_ids), chunk_size):
+        store.append({rule_id: rules_results[rule_id] for rule_id in rules_ids[idx:idx+chunk_size]})
+    return len(rules_ids)
+
+
+if __name__ == '__main__':
+    parser = commons.get_parser()
+    parser.add_argument('pickles_dir', help='directory with pickled rules results')
+    parser.add_argument('--store_path', default=None, help='store directory (pickles_dir by default)')
+    parser.add_argument('--prefix', default='', help='prefix of pickle files names (e.g. symbol_)')
+    parser.add_argument('--days', default=None, type=int, help='number of days of new store')
+    args = parser.parse_args()
+    no_rules = migrate_pickles(args.pickles_dir, store_path=args.store_path, prefix=args.prefix, days=args.days)
+    print(f'Migrated {no_rules} rules to {args.store_path or args.pickles_dir}')
@@ -1,4 +1,7 @@
 # built in
+import collections
+import hashlib
+import math
 import os
 import pickle
 
@@ -20,19 +23,195 @@ class NotAllRuleResultsPresentError(Exception):
     pass
 
 
+class RulesCache():
+    """
+    In-memory LRU cache of simple rules results. Keys are content-addressed (hash of input timeseries, rule function,
+    ts, lookback, params, ...), so the same simple rule on the same data is computed only once, no matter in how many
+    configs it is used (e.g. while sweeping parameters in strategy.optimize_strategy). Results are kept as int8 arrays.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results = collections.OrderedDict()
+
+    def get(self, key):
+        """Returns cached results (as list) or None."""
+        results = self._results.get(key)
+        if results is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._results.move_to_end(key)
+        if isinstance(results, list):
+            return list(results)
+        return results.tolist()
+
+    def put(self, key, results):
+        # rules outputs are -1/0/1, so int8 is enough. anything else is kept as it is
+        if all(res in (-1, 0, 1) and isinstance(res, (int, np.integer)) for res in results):
+            self._results[key] = np.array(results, dtype=np.int8)
+        else:
+            self._results[key] = list(results)
+        self._results.move_to_end(key)
+        if len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    def hit_rate(self):
+        if (self.hits + self.misses) == 0:
+            return 0
+        return self.hits / (self.hits + self.misses)
+
+    def __len__(self):
+        return len(self._results)
+
+
+def _param_key(value):
+    """Hashable key of rule param value. Arrays are keyed by their content (repr of big arrays is truncated)."""
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return ('ndarray', value.shape, _param_key(value.tolist()))
+        arr = np.ascontiguousarray(value)
+        return ('ndarray', str(arr.dtype), arr.shape, hashlib.sha1(arr.tobytes()).hexdigest())
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,) + tuple(_param_key(v) for v in value)
+    if isinstance(value, dict):
+        return ('dict',) + tuple(sorted((repr(k), _param_key(v)) for k, v in value.items()))
+    try:
+        hash(value)
+    except TypeError:
+        return (type(value).__name__, repr(value))
+    # type as well, so e.g. 1 and True are different
+    return (type(value), value)
+
+
+class ExecutionPlan():
+    """
+    Config compiled into execution plan (see compile_config). It does not depend on data, so it can be compiled once
+    and reused for many symbols (SignalGenerator(plan=...)).
+
+    *ts_names* - deduplicated names of timeseries used by simple rules
+    *simple_rules* / *convoluted_rules* - copies of rules from config (config itself is not modified). Convoluted
+        rules are ordered so each of them comes after rules it depends on
+    *rows* - {rule_id: row}. Row of rule results in results matrix (see results_matrix). Each rule has '_row' and
+        convoluted rules '_deps' (rows of rules they depend on) and '_is_state_base'
+    *rules_idxs* - {rule_id: idx} idx of rule in config['rules']
+    """
+    def __init__(self, config):
+        self.config = config
+        self.ts_names = []
+        self.simple_rules = []
+        self.convoluted_rules = []
+        self.rows = {}
+        self.rules_idxs = {}
+        self.max_lookback = 0
+        convoluted_rules = []
+        for idx, rule in enumerate(config['rules']):
+            self.rules_idxs[rule['id']] = idx
+            if rule['type'] == 'simple':
+                node = dict(rule)
+                node['_row'] = len(self.simple_rules)
+                self.simple_rules.append(node)
+                for ts in ([rule['ts']] if isinstance(rule['ts'], str) else rule['ts']):
+                    if ts not in self.ts_names:
+                        self.ts_names.append(ts)
+                # check max lookback. in 'generate' it will be starting point so all data is present
+                if self.max_lookback < rule['lookback']:
+                    self.max_lookback = rule['lookback']
+            elif rule['type'] == 'convoluted':
+                node = dict(rule)
+                node['_is_state_base'] = rule['aggregation_type'] == 'state-based'
+                if node['_is_state_base']:
+                    node['_state_table'] = _compile_state_table(node)
+                convoluted_rules.append(node)
+        self.rows = {rule['id']: rule['_row'] for rule in self.simple_rules}
+        # order convoluted rules, so all rules they depend on are computed before them
+        while convoluted_rules:
+            remaining = []
+            for rule in convoluted_rules:
+                missing = [rid for rid in rule['simple_rules'] if rid not in self.rows]
+                if any(rid not in self.rules_idxs for rid in missing):
+                    raise AttributeError('Rule "{}" depends on not defined rules: {}'.format(rule['id'], missing))
+                if missing:
+                    remaining.append(rule)
+                    continue
+                rule['_row'] = len(self.rows)
+                rule['_deps'] = [self.rows[rid] for rid in rule['simple_rules']]
+                self.rows[rule['id']] = rule['_row']
+                self.convoluted_rules.append(rule)
+            if len(remaining) == len(convoluted_rules):
+                raise AttributeError('Circular dependency between rules: {}'.format([r['id'] for r in remaining]))
+            convoluted_rules = remaining
+
+    def results_matrix(self, length):
+        """Preallocated results of all rules (row per rule) for *length* days."""
+        return np.zeros((len(self.rows), length), dtype=np.int8)
+
+
+# max. number of rules in state-based rule for which lookup table is built (3^10 entries)
+STATE_TABLE_MAX_RULES = 10
+# value in state table meaning "no state matched - keep previous result"
+_CARRY_STATE = 2
+
+
+def _compile_state_table(rule):
+    """
+    Lookup table for state-based convoluted *rule*. Results of rules it depends on (-1, 0, 1) are encoded as
+    sum((result+1) * 3^i), table maps the code to position of first matching state or to _CARRY_STATE. Returns None if
+    there are too many rules or the states cannot be compiled (such rule is combined day by day).
+    """
+    rules_ids = rule['simple_rules']
+    if len(rules_ids) > STATE_TABLE_MAX_RULES:
+        return None
+    codes = np.arange(3**len(rules_ids))
+    # results of rules for each code. column per rule
+    rules_values = np.stack([(codes // 3**i) % 3 - 1 for i in range(len(rules_ids))], axis=1)
+    table = np.full(codes.shape[0], _CARRY_STATE, dtype=np.int8)
+    matched = np.zeros(codes.shape[0], dtype=bool)
+    position_ints = {'long': 1, 'short': -1, 'neutral': 0}
+    for position in rule['aggregation_params'].keys():
+        for state in rule['aggregation_params'][position]:
+            if position not in position_ints or any(rid not in rules_ids for rid in state):
+                return None
+            state_matches = np.ones(codes.shape[0], dtype=bool)
+            for rid, result in state.items():
+                state_matches &= rules_values[:, rules_ids.index(rid)] == result
+            table[state_matches & ~matched] = position_ints[position]
+            matched |= state_matches
+    return table
+
+
+def compile_config(config):
+    """Compiles *config* into ExecutionPlan."""
+    return ExecutionPlan(config)
+
+
 class SignalGenerator():
     def __init__(
         self, df=None, config=None, logger=None, debug=False, load_rules_results_path=None, load_rules_results_prefix='',
-        load_only_simple=False,
+        load_only_simple=False, rules_cache=None, vectorized_rules=False, plan=None, rules_store=None,
     ):
+        """
+        *rules_cache* - RulesCache shared between SignalGenerators. Simple rules results will be taken from it (or
+            stored there if not present yet).
+        *vectorized_rules* - if True, simple rules which have vectorized version (rules.SERIES_RULES) are computed
+            for whole timeseries at once instead of day by day. Results are the same.
+        *plan* - ExecutionPlan (from compile_config). If given, *config* is taken from it. Use it to avoid compiling
+            the same config for many symbols.
+        *rules_store* - rules_store.RulesStore. If given, rules results are loaded from it (as with
+            *load_rules_results_path*, but without copying them)
+        """
+        if plan is None:
+            plan = compile_config(config)
+        self.plan = plan
+        config = plan.config
         self.log = setup_logging(logger=logger, debug=debug)
         self.config = config
+        self.rules_cache = rules_cache
+        self.vectorized_rules = vectorized_rules
         self.df = df
         self.index = len(df.index)
         self.data = {}
-        self.simple_rules = []
-        self.convoluted_rules = []
-        self.rules_results = {}
         # TODO(slaw) - would be good to have config validation here
         self.strategy_type = config['strategy']['type']
         self.strategy_rules = config['strategy']['strategy_rules']
@@ -71,49 +250,37 @@ class SignalGenerator():
                     np.log(df[self.strategy_price_label]) - df[self.strategy_price_label].shift(1)
                 ).tolist()
 
-
-        self.hold_x_days_rule_lvl = {}
         self.init_review_span_tracker = 0
-        self.max_lookback = 0
-        self.rules_idxs = {}
-        for idx, rule in enumerate(config['rules']):
-            # build map -> idx: rule_id
-            self.rules_idxs[rule['id']] = idx 
-            # initiate empty list for rules outputs
-            self.rules_results[rule['id']] = []
-            # segregate simple and convoluted rules
-            if rule['type'] == 'simple':
-                self.simple_rules.append(rule)
-                # store every rule timeseries as array and make sure all number of rows is equal
-                if load_rules_results_path == None:
-                    if isinstance(rule['ts'], str):
-                        if rule['ts'] not in self.data:
-                            self.data[rule['ts']] = df[rule['ts']].to_numpy()
-                            assert(self.data[rule['ts']].shape[0] == self.index)
-                    elif isinstance(rule['ts'], list):
-                        for ts in rule['ts']:
-                            if ts not in self.data:
-                                self.data[ts] = df[ts].to_numpy()
-                                assert(self.data[ts].shape[0] == self.index)
-                # check max lookback. in 'generate' it will be starting point so all data is present
-                if self.max_lookback < rule['lookback']:
-                    self.max_lookback = rule['lookback']
-                # simple rule may be forced to hold for specific num. of days
-                if rule.get('hold_fixed_days', None):
-                    self.hold_x_days_rule_lvl[rule['id']] = []
-            elif rule['type'] == 'convoluted':
-                if rule['aggregation_type'] == 'state-based':
-                    rule['_is_state_base'] = True
-                else:
-                    rule['_is_state_base'] = False
-                self.convoluted_rules.append(rule)
+        # prefix sums used by learning strategy reviews. present only while generating initial signal
+        self._learning_prefix = None
+        self.max_lookback = plan.max_lookback
+        self.rules_idxs = plan.rules_idxs
+        self.simple_rules = plan.simple_rules
+        self.convoluted_rules = plan.convoluted_rules
+        # initiate empty list for rules outputs
+        self.rules_results = {rule['id']: [] for rule in config['rules']}
+        self.results = None
+        # store every rule timeseries as array and make sure all number of rows is equal
+        if load_rules_results_path == None and rules_store is None:
+            for ts in plan.ts_names:
+                self.data[ts] = df[ts].to_numpy()
+                assert(self.data[ts].shape[0] == self.index)
+        self._data_hashes = {}
         self._triggers = ('entry_long', 'exit_long', 'entry_short', 'exit_short')
         self.final_positions = self._reset_final_positions()
+        # states after the last generated day and streaming state (see update)
+        self._learning_state = None
+        self._final_signal_state = None
+        self._stream = None
+        self.last_date = df.index[-1] if len(df.index) else None
         # load stored rules results (to speed up execution)
         self.load_only_simple = load_only_simple
         if load_rules_results_path:
             self._load_rules_results(load_rules_results_path, load_rules_results_prefix)
             self._rules_results_loaded = True
+        elif rules_store is not None:
+            self._load_rules_results_from_store(rules_store)
+            self._rules_results_loaded = True
         else:
             self._rules_results_loaded = False
 
@@ -130,6 +297,7 @@ class SignalGenerator():
             for rule_id, rule_signal in self.rules_results.items():
                 inversed_signal = (-1 * np.array(self.rules_results[rule_id])).tolist()
                 self.rules_results[rule_id] = inversed_signal
+            self.results *= -1
             # reverse all final signals/positions
             for col in self._triggers:
                 final_signal[f'copy_{col}'] = final_signal[col]
@@ -142,6 +310,144 @@ class SignalGenerator():
             final_signal['position'] = -1*final_signal['position']
         return final_signal
 
+    def update(self, new_bar):
+        """
+        Continues generated signal with the next day (streaming). *new_bar* is row of pricing data (pd.Series with
+        date as name, or dict) with all timeseries used by rules (and price_label of learning strategy). Returns row of
+        final signal for that day (pd.Series) - the same as the last row of generate() output for history extended
+        with *new_bar*.
+
+        Only state needed to continue is kept (last values of timeseries and rules results, hold counters, wait entry
+        confirmation tracker, learning reviews, last position), so each day is processed in O(rules). generate() has
+        to be called first (or state loaded with load_state). *df*, *rules_results* and *final_positions* are not
+        extended.
+        """
+        if self._stream is None:
+            self._stream = self._init_stream()
+        stream = self._stream
+        for ts in self.plan.ts_names:
+            buffer = stream['data'][ts]
+            buffer[:-1] = buffer[1:]
+            buffer[-1] = new_bar[ts]
+        # rules results for the new day
+        day_results = {}
+        for simple_rule in self.simple_rules:
+            hold = stream['hold'][simple_rule['id']]
+            if hold['days'] > 0:
+                # rule is still holding its result
+                hold['days'] -= 1
+                rule_res = hold['result']
+            else:
+                rule_res = simple_rule['func'](
+                    self._get_stream_ts(simple_rule['ts'], simple_rule['lookback']),
+                    **simple_rule['params']
+                )
+                _hold_fixed_days = simple_rule.get('hold_fixed_days', None)
+                if _hold_fixed_days and rule_res in (-1, 1):
+                    hold['days'], hold['result'] = _hold_fixed_days-1, rule_res
+            day_results[simple_rule['id']] = rule_res
+        for conv_rule in self.convoluted_rules:
+            previous_results = stream['results'][conv_rule['id']]
+            simple_rules_results = [day_results[rid] for rid in conv_rule['simple_rules']]
+            if conv_rule['_is_state_base']:
+                simple_rules_results = {conv_rule['id']: dict(zip(conv_rule['simple_rules'], simple_rules_results))}
+            day_results[conv_rule['id']] = self.combine_simple_results(
+                rules_results=simple_rules_results,
+                aggregation_type=conv_rule['aggregation_type'],
+                aggregation_params=conv_rule['aggregation_params'],
+                previous_state=previous_results[-1] if len(previous_results) else 0,
+            )
+        for rule_id, rule_res in day_results.items():
+            stream['results'][rule_id].append(rule_res)
+        # initial signal
+        result_idx = self.index-self.max_lookback
+        if self.strategy_type == 'fixed':
+            signal = 0
+            for rule_id in self.strategy_rules:
+                if day_results[rule_id] in (-1, 1):
+                    signal = int(day_results[rule_id])
+                    break
+        elif self.strategy_type == 'learning':
+            if self.strategy_metric != 'voting':
+                stream['returns'].append(self._get_stream_return(new_bar[self.strategy_price_label]))
+            signal = self._learning_step(
+                stream['learning'], result_idx, self._review_stream_performance,
+                lambda rule_id: stream['results'][rule_id][-1],
+            )
+        # final signal
+        final_state = stream['final_signal']
+        if not final_state['pending']:
+            signal_triggers = {k: [] for k in self._triggers}
+            final_positions = self.final_positions
+            self.final_positions = [stream['last_position']]
+            if any([self.wait_entry_confirmation, self.hold_x_days]):
+                self._constraints_step(final_state, signal, signal_triggers)
+            else:
+                if signal == final_state['previous']:
+                    self._remain_position(signal_triggers, position=signal)
+                else:
+                    self._change_position(final_state['previous'], signal, signal_triggers)
+                final_state['previous'] = signal
+            final_state['pending'] = [
+                (tuple(signal_triggers[trigger][day_idx] for trigger in self._triggers), position)
+                for day_idx, position in enumerate(self.final_positions[1:])
+            ]
+            self.final_positions = final_positions
+        day_triggers, position = final_state['pending'].pop(0)
+        stream['last_position'] = position
+        self.index += 1
+        # output row
+        new_bar = pd.Series(new_bar)
+        day_triggers = dict(zip(self._triggers, day_triggers))
+        if self.config['strategy'].get('reversed', None):
+            day_triggers = {
+                'entry_long': day_triggers['entry_short'],
+                'exit_long': day_triggers['exit_short'],
+                'entry_short': day_triggers['entry_long'],
+                'exit_short': day_triggers['exit_long'],
+            }
+            position = -1*position
+        row = dict(new_bar.fillna(0))
+        row.update(day_triggers)
+        row['position'] = position
+        self.last_date = new_bar.name
+        return pd.Series(row, name=new_bar.name)
+
+    def save_state(self, path):
+        """
+        Saves state needed to continue with update (see load_state). It does not contain pricing data history, so
+        it's small and can be saved after each update.
+        """
+        if self._stream is None:
+            self._stream = self._init_stream()
+        state = {
+            'config': self.config,
+            'df': self.df.iloc[:0],
+            'index': self.index,
+            'last_date': self.last_date,
+            'past_reviews': getattr(self, 'past_reviews', None),
+            'stream': self._stream,
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as fh:
+            pickle.dump(state, fh)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_state(cls, path, logger=None, debug=False, plan=None):
+        """
+        Returns SignalGenerator with state saved by save_state. It can only continue with update (*df* is empty).
+        """
+        with open(path, 'rb') as fh:
+            state = pickle.load(fh)
+        sg = cls(df=state['df'], config=state['config'], logger=logger, debug=debug, plan=plan)
+        sg.index = state['index']
+        sg.last_date = state['last_date']
+        if state['past_reviews'] is not None:
+            sg.past_reviews = state['past_reviews']
+        sg._stream = state['stream']
+        return sg
+
     def plot_strategy_result(self, df, price_label=None):
         # get long/short periods
         periods = {}
@@ -187,7 +493,7 @@ class SignalGenerator():
             _lookback = max(lookbacks)
             _ts = ts
         dates = self.df.index.tolist()
-        results = _lookback*[0] + self.rules_results[rule_id]
+        results = _lookback*[0] + list(self.rules_results[rule_id])
         reference_ts = self.df[_ts]
         # find segments of continuous -1,0,1s for muliti-color line to plot
         segments = []
@@ -233,14 +539,46 @@ class SignalGenerator():
             with open(file_full_path, 'wb') as fh:
                 pickle.dump(rule_res, fh)
 
+    def _get_rules_to_be_loaded(self):
+        if self.load_only_simple == False:
+            return set(self.rules_results.keys())
+        return set([r['id'] for r in self.simple_rules])
+
+    def _load_rules_results_from_store(self, rules_store):
+        """
+        Loads rules results from `rules_store` (read-only arrays, not copied). All rules has to be present.
+        """
+        rules_to_be_loaded = self._get_rules_to_be_loaded()
+        missing = [rule_id for rule_id in rules_to_be_loaded if rule_id not in rules_store]
+        if missing:
+            raise NotAllRuleResultsPresentError(
+                f'Not all rules are present in {rules_store.path}. Missing are: {set(missing)}'
+            )
+        try:
+            rules_results = rules_store.get_many(rules_to_be_loaded, length=self.index-self.max_lookback)
+        except ValueError as e:
+            raise NotAllRuleResultsPresentError(str(e))
+        self.rules_results.update(rules_results)
+
+    def _align_loaded_results(self, rules_results, source):
+        """
+        Returns loaded *rules_results* cut to days from max_lookback on. Saved results are aligned to the last day
+        and their length depends on max lookback of config which saved them, so they may be longer than needed.
+        """
+        width = self.index - self.max_lookback
+        too_short = [rule_id for rule_id, results in rules_results.items() if len(results) < width]
+        if too_short:
+            raise NotAllRuleResultsPresentError(
+                f'Results of {set(too_short)} in {source} are shorter than {width} days (saved by config with '
+                f'bigger max lookback)'
+            )
+        return {rule_id: results[len(results)-width:] for rule_id, results in rules_results.items()}
+
     def _load_rules_results(self, path, prefix):
         """
         Loads saved (in `path`) rule results. All rules has to be present.
         """
-        if self.load_only_simple == False:
-            rules_to_be_loaded = set(self.rules_results.keys())
-        else:
-            rules_to_be_loaded = set([r['id'] for r in self.simple_rules])
+        rules_to_be_loaded = self._get_rules_to_be_loaded()
         all_files = set([f for f in os.listdir(path)])
         rules_results = {}
         for rule_id in rules_to_be_loaded.copy():
@@ -252,7 +590,7 @@ class SignalGenerator():
                 rules_to_be_loaded.remove(rule_id)
         
         if len(rules_to_be_loaded) == 0:
-            self.rules_results.update(rules_results)
+            self.rules_results.update(self._align_loaded_results(rules_results, path))
         else:
             raise NotAllRuleResultsPresentError(
                 f'Not all rules are present in {path}. Missing are: {rules_to_be_loaded}'
@@ -280,6 +618,8 @@ class SignalGenerator():
             else:
                 self._change_position(previous, current, signal_triggers)
             previous = current
+        # state after the last day (used to continue with update)
+        self._final_signal_state = {'previous': previous, 'pending': []}
         signal_triggers_df = pd.DataFrame(signal_triggers, index=self.df.index[self.max_lookback:])
         if return_signal:
             return self._merge_final_signal(signal_triggers_df)
@@ -303,80 +643,29 @@ class SignalGenerator():
         self._reset_final_positions()
         dates = self.df.index.tolist()
         triggers_dates = dates[self.max_lookback:]
-        current, previous, idx = 0, 0, 0
+        idx = 0
         signal_triggers = {k: [] for k in self._triggers}
-        _wait_entry_confirmation_tracker = None
-        _previous_at_wait_start = None
-        _expected_signal = None
+        state = {
+            'previous': 0,
+            'wait_entry_confirmation_tracker': None,
+            'previous_at_wait_start': None,
+            'expected_signal': None,
+        }
         while idx < len(triggers_dates):
-            current = initial_signal[idx]
-            if self.wait_entry_confirmation:
-                # Case-0 Tracker not active, already in long/short position
-                if not _wait_entry_confirmation_tracker and (current == previous):
-                    self._remain_position(signal_triggers, position=current)
-
-                # Case-1 Tracker not active and entry signal. Set up expected signal and start to wait.
-                elif not _wait_entry_confirmation_tracker and current in (-1, 1):
-                    _expected_signal = current
-                    _wait_entry_confirmation_tracker = 1
-                    _previous_at_wait_start = previous
-                    # position is kept as previous. as not entered yet
-                    self._remain_position(signal_triggers, position=_previous_at_wait_start)
-
-                # Case-2 Tracker not active, but no entry signal. Do nothing or go neutral
-                elif not _wait_entry_confirmation_tracker and current == 0:
-                    _previous_from_processed = self.final_positions[-1]
-                    if _previous_from_processed in (-1, 1):
-                        # go neutral
-                        self._change_position(_previous_from_processed, current, signal_triggers)
-                    else:
-                        # remain current neutral position
-                        self._remain_position(signal_triggers, position=current)
-
-                # Case-3 Tracker is active, but still need to wait.
-                elif _wait_entry_confirmation_tracker < self.wait_entry_confirmation:
-                    _wait_entry_confirmation_tracker += 1
-                    # again, as its not yet time to enter position is kept as previous of waiting
-                    self._remain_position(signal_triggers, position=_previous_at_wait_start)
-
-                # Case-4 Waited enough time. Check if signal is what it was expected
-                elif _wait_entry_confirmation_tracker == self.wait_entry_confirmation:
-                    # signal as expected
-                    if current == _expected_signal:
-                        self._change_position(_previous_at_wait_start, current, signal_triggers)
-                        # if both wait_entry_confirmation and hold_x_days are active
-                        if self.hold_x_days:
-                            self._remain_position(signal_triggers, days=self.hold_x_days, position=current)
-                            previous, current = current, 0
-                            self._change_position(previous, current, signal_triggers)
-                            idx += self.hold_x_days + 1
-                    # Signal different from what was expected = eactivate tracker and force going into neutral.
-                    else:
-                        current = 0
-                        self._change_position(_previous_at_wait_start, current, signal_triggers)
-                    _wait_entry_confirmation_tracker = None
-                    _previous_at_wait_start = None
-            if not self.wait_entry_confirmation and self.hold_x_days:
-                if current == previous:
-                    self._remain_position(signal_triggers, position=current)
-                elif current in (-1, 1):
-                    # enter position
-                    self._change_position(previous, current, signal_triggers)
-                    # stay there for x days
-                    self._remain_position(signal_triggers, days=self.hold_x_days, position=current)
-                    # next go back to neutral position
-                    previous, current = current, 0
-                    self._change_position(previous, current, signal_triggers)
-                    # skip proper number of days as you just assigned all positions
-                    # that should be +1d for changed position + Xdays holding
-                    idx += self.hold_x_days + 1
-                else:
-                    self._change_position(previous, current, signal_triggers)
-            previous = current
-            idx += 1
+            # skip proper number of days if step assigned positions for more than one day (hold_x_days)
+            idx += self._constraints_step(state, initial_signal[idx], signal_triggers)
         # if any signal trigger is longer than index, it means that entered somwehere near the end and
         # hold posiition contraint made it to hold above index. truncating it here for simplicity
         ref_length = len(self.df.index[self.max_lookback:])
+        # days which are already assigned but are after the last day (used to continue with update)
+        state['pending'] = [
+            (
+                tuple(signal_triggers[trigger][day_idx] for trigger in self._triggers),
+                self.final_positions[self.max_lookback+day_idx],
+            )
+            for day_idx in range(ref_length, len(signal_triggers['entry_long']))
+        ]
+        self._final_signal_state = state
         if len(signal_triggers['entry_long']) > ref_length:
             for trigger in self._triggers:
                 signal_triggers[trigger] = signal_triggers[trigger][:ref_length]
@@ -386,6 +675,79 @@ class SignalGenerator():
         else:
             return signal_triggers_df
 
+    def _constraints_step(self, state, current, signal_triggers):
+        """
+        Assigns position(s) for a single day of _generate_final_signal_with_constraints, where *current* is the
+        initial signal of the day. *state* (previous position, wait entry confirmation tracker etc.) is updated in
+        place. Returns number of days for which positions were assigned (more than 1 if position has to be held).
+        """
+        days = 1
+        previous = state['previous']
+        if self.wait_entry_confirmation:
+            _wait_entry_confirmation_tracker = state['wait_entry_confirmation_tracker']
+            # Case-0 Tracker not active, already in long/short position
+            if not _wait_entry_confirmation_tracker and (current == previous):
+                self._remain_position(signal_triggers, position=current)
+
+            # Case-1 Tracker not active and entry signal. Set up expected signal and start to wait.
+            elif not _wait_entry_confirmation_tracker and current in (-1, 1):
+                state['expected_signal'] = current
+                state['wait_entry_confirmation_tracker'] = 1
+                state['previous_at_wait_start'] = previous
+                # position is kept as previous. as not entered yet
+                self._remain_position(signal_triggers, position=previous)
+
+            # Case-2 Tracker not active, but no entry signal. Do nothing or go neutral
+            elif not _wait_entry_confirmation_tracker and current == 0:
+                _previous_from_processed = self.final_positions[-1]
+                if _previous_from_processed in (-1, 1):
+                    # go neutral
+                    self._change_position(_previous_from_processed, current, signal_triggers)
+                else:
+                    # remain current neutral position
+                    self._remain_position(signal_triggers, position=current)
+
+            # Case-3 Tracker is active, but still need to wait.
+            elif _wait_entry_confirmation_tracker < self.wait_entry_confirmation:
+                state['wait_entry_confirmation_tracker'] += 1
+                # again, as its not yet time to enter position is kept as previous of waiting
+                self._remain_position(signal_triggers, position=state['previous_at_wait_start'])
+
+            # Case-4 Waited enough time. Check if signal is what it was expected
+            elif _wait_entry_confirmation_tracker == self.wait_entry_confirmation:
+                # signal as expected
+                if current == state['expected_signal']:
+                    self._change_position(state['previous_at_wait_start'], current, signal_triggers)
+                    # if both wait_entry_confirmation and hold_x_days are active
+                    if self.hold_x_days:
+                        self._remain_position(signal_triggers, days=self.hold_x_days, position=current)
+                        previous, current = current, 0
+                        self._change_position(previous, current, signal_triggers)
+                        days += self.hold_x_days + 1
+                # Signal different from what was expected = eactivate tracker and force going into neutral.
+                else:
+                    current = 0
+                    self._change_position(state['previous_at_wait_start'], current, signal_triggers)
+                state['wait_entry_confirmation_tracker'] = None
+                state['previous_at_wait_start'] = None
+        if not self.wait_entry_confirmation and self.hold_x_days:
+            if current == previous:
+                self._remain_position(signal_triggers, position=current)
+            elif current in (-1, 1):
+                # enter position
+                self._change_position(previous, current, signal_triggers)
+                # stay there for x days
+                self._remain_position(signal_triggers, days=self.hold_x_days, position=current)
+                # next go back to neutral position
+                previous, current = current, 0
+                self._change_position(previous, current, signal_triggers)
+                # that should be +1d for changed position + Xdays holding
+                days += self.hold_x_days + 1
+            else:
+                self._change_position(previous, current, signal_triggers)
+        state['previous'] = current
+        return days
+
     def _remain_position(self, signal_triggers, days=1, position=None):
         """
         Keep current position by not triggering any signal to change position.
@@ -411,10 +773,13 @@ class SignalGenerator():
         for k in self._triggers:
             signal_triggers[k].append(new_triggers[k])
     
-    def combine_simple_results(self, rules_results=None, aggregation_type=None, aggregation_params=None):
+    def combine_simple_results(
+        self, rules_results=None, aggregation_type=None, aggregation_params=None, previous_state=None
+    ):
         """
         Resolves set of simple rules results into single outcome. It can be done based on `aggregation_type`.
-        That is 'combine' (different votings and aggregation) or 'state-based'.
+        That is 'combine' (different votings and aggregation) or 'state-based'. For 'state-based' *previous_state*
+        is the result if no state matches (by default the last result of the convoluted rule).
         """
         if aggregation_type == 'combine':
             mode = aggregation_params['mode']
@@ -447,7 +812,9 @@ class SignalGenerator():
                 raise NotImplementedError('mode "{}" for "combine" aggregation is not supported'.format(mode))
         elif aggregation_type == 'state-based':
             _conv_rule_id = list(rules_results.keys())[0]
-            if not len(self.rules_results[_conv_rule_id]) == 0:
+            if previous_state is not None:
+                _previous_state = previous_state
+            elif not len(self.rules_results[_conv_rule_id]) == 0:
                 _previous_state = self.rules_results[_conv_rule_id][-1]
             else:
                 _previous_state = 0
@@ -464,6 +831,45 @@ class SignalGenerator():
         else:
             raise NotImplementedError('aggregation_type "{}" is not supported'.format(aggregation_type))
 
+    @staticmethod
+    def combine_results_series(stacked_results, aggregation_params):
+        """
+        Same as combine_simple_results with 'combine' aggregation_type, but for all days at once. *stacked_results*
+        is 2D array - row per simple rule, column per day.
+        """
+        mode = aggregation_params['mode']
+        stacked_results = np.asarray(stacked_results, dtype=np.int32)
+        len_resutls = stacked_results.shape[0]
+        if mode == 'strong':
+            # for signal to be 1 or -1, all simple rules results has to be 1 or -1. else 0
+            results_sum = stacked_results.sum(axis=0)
+            return np.select([results_sum == len_resutls, results_sum == -1*len_resutls], [1, -1], 0).astype(np.int8)
+        elif mode == 'majority_voting':
+            # signal will be same as most frequent result. 0 in case of tie
+            sum_zero = (stacked_results == 0).sum(axis=0)
+            sum_plus = (stacked_results == 1).sum(axis=0)
+            sum_minus = len_resutls - sum_zero - sum_plus
+            return np.select(
+                [(sum_plus > sum_zero) & (sum_plus > sum_minus), (sum_minus > sum_zero) & (sum_minus > sum_plus)],
+                [1, -1],
+                0
+            ).astype(np.int8)
+        raise NotImplementedError('mode "{}" for "combine" aggregation is not supported'.format(mode))
+
+    @staticmethod
+    def state_based_results_series(stacked_results, state_table):
+        """
+        Same as combine_simple_results with 'state-based' aggregation_type, but for all days at once (with state
+        table from _compile_state_table). Days where no state matched keep the previous result (0 at the begining).
+        """
+        stacked_results = np.asarray(stacked_results, dtype=np.int64)
+        codes = ((stacked_results + 1) * (3**np.arange(stacked_results.shape[0]))[:, None]).sum(axis=0)
+        states = state_table[codes]
+        # forward fill - index of last day with matched state
+        last_matched_idx = np.where(states != _CARRY_STATE, np.arange(states.shape[0]), -1)
+        last_matched_idx = np.maximum.accumulate(last_matched_idx) if states.shape[0] else last_matched_idx
+        return np.where(last_matched_idx >= 0, states[last_matched_idx], 0).astype(np.int8)
+
     def _get_ts(self, ts_name, idx, lookback):
         """
         Returns portion of timeseries used as rule input. If lookback is 6, then resulting array will have 7 elemements.
@@ -479,6 +885,97 @@ class SignalGenerator():
                 for name in ts_name
             }
 
+    def _get_stream_ts(self, ts_name, lookback):
+        """Same as _get_ts, but for the last day in streaming state (see update)."""
+        data = self._stream['data']
+        if isinstance(ts_name, str):
+            return data[ts_name][data[ts_name].shape[0]-lookback-1:]
+        elif isinstance(ts_name, list):
+            return {
+                name: data[name][data[name].shape[0]-lookback-1:]
+                for name in ts_name
+            }
+
+    def _get_stream_return(self, price):
+        """Return used by learning strategy metric for the next day with *price* (same as computed in __init__)."""
+        stream = self._stream
+        price = np.float64(price)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.strategy_metric == 'daily_returns':
+                # pct_change fills missing prices with previous ones
+                filled_price = stream['last_filled_price'] if np.isnan(price) else price
+                ret = filled_price / stream['last_filled_price'] - 1
+                stream['last_filled_price'] = filled_price
+            else:
+                ret = np.log(price) - stream['last_price']
+                stream['last_price'] = price
+        return float(ret)
+
+    def _review_stream_performance(self, strat_idx, end_idx):
+        """Same as _review_performance, but for the last results in streaming state (see update)."""
+        stream = self._stream
+        window = end_idx - strat_idx
+        returns = list(stream['returns'])[-window:] if self.strategy_metric != 'voting' else None
+        metrics = {
+            rule_id: self._compute_metric(list(stream['results'][rule_id])[-window:], returns)
+            for rule_id in self.strategy_rules
+        }
+        return self._choose_from_reviews(metrics, stream['past_reviews_sums'])
+
+    def _init_stream(self):
+        """
+        Streaming state (see update) from generated signal. Only the last values needed to continue are taken: max
+        lookback days of timeseries, memory_span days of rules results and returns (or just the last result of each
+        rule for fixed strategy), hold counters of rules and states of strategy and final signal after the last day.
+        """
+        if self._final_signal_state is None or self.results is None:
+            raise ValueError('Signal has to be generated (or state loaded) before update')
+        if self._rules_results_loaded:
+            raise ValueError('Update is not supported with loaded rules results (timeseries are not loaded)')
+        if self.index <= self.max_lookback:
+            raise ValueError('Not enough data to continue with update: {} days, max lookback: {}'.format(
+                self.index, self.max_lookback
+            ))
+        # rules results are already reversed if strategy is reversed
+        sign = -1 if self.config['strategy'].get('reversed', None) else 1
+        no_results = self.strategy_memory_span if self.strategy_type == 'learning' else 1
+        stream = {
+            'data': {ts: self.data[ts][-(self.max_lookback+1):].copy() for ts in self.plan.ts_names},
+            'results': {
+                rule_id: collections.deque([sign*res for res in rule_results[-no_results:]], maxlen=no_results)
+                for rule_id, rule_results in self.rules_results.items()
+            },
+            'hold': {},
+            'final_signal': self._final_signal_state,
+            'last_position': self.final_positions[-1] if self.final_positions else 0,
+        }
+        for simple_rule in self.simple_rules:
+            # replay holding of rule results, to find out for how many days the last result will be still held
+            hold = {'days': 0, 'result': 0}
+            _hold_fixed_days = simple_rule.get('hold_fixed_days', None)
+            if _hold_fixed_days:
+                for rule_res in self.rules_results[simple_rule['id']]:
+                    if hold['days'] > 0:
+                        hold['days'] -= 1
+                    elif rule_res in (-1, 1):
+                        hold['days'], hold['result'] = _hold_fixed_days-1, sign*rule_res
+            stream['hold'][simple_rule['id']] = hold
+        if self.strategy_type == 'learning':
+            stream['learning'] = self._learning_state
+            stream['past_reviews_sums'] = None
+            if self.strategy_metric != 'voting':
+                if self.strategy_metric == 'daily_returns':
+                    returns = self.daily_returns__learning
+                    stream['last_filled_price'] = np.float64(self.df[self.strategy_price_label].ffill().iloc[-1])
+                else:
+                    returns = self.daily_log_returns__learning
+                    stream['last_price'] = np.float64(self.df[self.strategy_price_label].iloc[-1])
+                stream['returns'] = collections.deque(returns[self.max_lookback:][-no_results:], maxlen=no_results)
+                stream['past_reviews_sums'] = {
+                    rule_id: sum(self.past_reviews[rule_id]) for rule_id in self.strategy_rules
+                }
+        return stream
+
     def _get_simple_rules_results(self, rules_ids, result_idx, as_dict=False, conv_rule_id=None):
         """
         `rules_ids` is iterable witch ids of simple rules. `result_idx` should be index of results
@@ -502,154 +999,322 @@ class SignalGenerator():
         initial_signal = []
         idx = self.max_lookback
         signal = 0
-        # variables specific to learning strategy type
         if self.strategy_type == 'learning':
-            if self.strategy_metric == 'voting':
-                follow = {'_type': 'position'}
-            # else:
-            else:
-                follow = {'_type': 'rule'}
-            _is_tmp_review_span = False
-            if self.strategy_review_span > 10:
-                # to avoid too long periods at the begining of backfill, where one waits for enough data to 
-                # learn from. review_span will be dynamically increased over time
-                review_span = 5
-                _is_tmp_review_span = True
-            else:
-                review_span = self.strategy_review_span
-            review_span_tracker = self.init_review_span_tracker
+            learning_state = self._init_learning_state()
+        self.results = self.plan.results_matrix(self.index-self.max_lookback)
+        if self._rules_results_loaded == False:
+            for simple_rule in self.simple_rules:
+                self.rules_results[simple_rule['id']] = self._get_simple_rule_results(simple_rule)
+        for simple_rule in self.simple_rules:
+            self.results[simple_rule['_row']] = self.rules_results[simple_rule['id']]
+        # convoluted rules are ordered, so rules they depend on are already computed
+        for conv_rule in self.convoluted_rules:
+            if (self._rules_results_loaded == False) or (self.load_only_simple == True):
+                self._generate_convoluted_rule_results(conv_rule)
+            self.results[conv_rule['_row']] = self.rules_results[conv_rule['id']]
+        if self.strategy_type == 'fixed':
+            # use signal from first encountered rule with -1 or 1. or leave 0. that makes order of rules important.
+            # rules with highest priority should be earlier in list
+            signal = np.zeros(self.results.shape[1], dtype=np.int8)
+            for rule in reversed(self.strategy_rules):
+                rule_results = self.results[self.plan.rows[rule]]
+                signal = np.where((rule_results == 1) | (rule_results == -1), rule_results, signal)
+            return signal.tolist()
+        self._learning_prefix = self._build_learning_prefix()
         while idx < self.index:
             result_idx = idx-self.max_lookback
-            if self._rules_results_loaded == False:
-                # get and append results from simple rules
-                for simple_rule in self.simple_rules:
-                    _hold_fixed_days = simple_rule.get('hold_fixed_days', None)
-                    if not _hold_fixed_days:
-                        rule_res = simple_rule['func'](
-                            self._get_ts(simple_rule['ts'], idx, simple_rule['lookback']),
-                            **simple_rule['params']
-                        )
-                    else:
-                        # if rule has holding fox x days on rule lvl set up it will output
-                        # same result for x consequent days
-                        if len(self.hold_x_days_rule_lvl[simple_rule['id']]) > 0:
-                            rule_res = self.hold_x_days_rule_lvl[simple_rule['id']].pop()
-                        else:
-                            rule_res = simple_rule['func'](
-                                self._get_ts(simple_rule['ts'], idx, simple_rule['lookback']),
-                                **simple_rule['params']
-                            )
-                            # hold only long or short. ignore neutral
-                            if rule_res in (-1, 1):
-                                self.hold_x_days_rule_lvl[simple_rule['id']].extend(
-                                    (_hold_fixed_days-1)*[rule_res]
-                                )
-                    self.rules_results[simple_rule['id']].append(rule_res)
-            if (self._rules_results_loaded == False) or (self.load_only_simple == True):
-                # get and append results from convoluted rules
-                for conv_rule in self.convoluted_rules:
-                    simple_rules_results = self._get_simple_rules_results(
-                        conv_rule['simple_rules'],
-                        result_idx,
-                        as_dict=conv_rule['_is_state_base'],
-                        conv_rule_id=conv_rule['id'],
-                    )
-                    self.rules_results[conv_rule['id']].append(
-                        self.combine_simple_results(
-                            rules_results=simple_rules_results,
-                            aggregation_type=conv_rule['aggregation_type'], 
-                            aggregation_params=conv_rule['aggregation_params'],
-                        )
-                    )
-            if self.strategy_type == 'fixed':
-                for rule in self.strategy_rules:
-                    signal = self.rules_results[rule][result_idx]
-                    # use signal from first encountered rule with -1 or 1. or leave 0
-                    # that makes order of rules important. rules with highest priority
-                    # should be earlier in list
-                    if signal in (-1, 1):
-                        break
-            elif self.strategy_type == 'learning':
-                review_span_tracker += 1
-                if _is_tmp_review_span:
-                    # dynamic review span at the begining of the backfill
-                    if review_span_tracker == review_span:
-                        # perform review and reset span tracker. +1 to make current result inclusive
-                        follow['_value'] = self._review_performance(
-                            strat_idx=self._get_learning_start_idx(result_idx+1),
-                            end_idx=result_idx+1
-                        )
-                        review_span_tracker = self.init_review_span_tracker
-                        # increase tmp review span, if new tmp span is >= actual - use and flag it
-                        review_span += 5
-                        if review_span >= self.strategy_review_span:
-                            review_span = self.strategy_review_span
-                            _is_tmp_review_span = False
-                else:
-                    # enough days to use actual review span
-                    if review_span_tracker == review_span:
-                        # perform review and reset span tracker. +1 to make current result inclusive
-                        follow['_value'] = self._review_performance(
-                            strat_idx=self._get_learning_start_idx(result_idx+1),
-                            end_idx=result_idx+1
-                        )
-                        review_span_tracker = self.init_review_span_tracker
-                # set up signal. if no rule/position yet - go neutral
-                if not follow.get('_value', None):
-                    signal = 0
-                else:
-                    if follow['_type'] == 'rule':
-                        signal = self.rules_results[follow['_value']][result_idx]
-                    elif follow['_type'] == 'position':
-                        signal = follow['_value']
+            signal = self._learning_step(
+                learning_state, result_idx, self._review_performance,
+                lambda rule_id: int(self.rules_results[rule_id][result_idx]),
+            )
             initial_signal.append(signal)
             idx += 1
+        # rules results may be modified after generation, so prefix sums would not be valid anymore
+        self._learning_prefix = None
+        # state after the last day (used to continue with update)
+        self._learning_state = learning_state
         return initial_signal
 
+    def _init_learning_state(self):
+        """State of learning strategy before the first day (see _learning_step)."""
+        if self.strategy_metric == 'voting':
+            follow = {'_type': 'position'}
+        else:
+            follow = {'_type': 'rule'}
+        if self.strategy_review_span > 10:
+            # to avoid too long periods at the begining of backfill, where one waits for enough data to
+            # learn from. review_span will be dynamically increased over time
+            review_span = 5
+            is_tmp_review_span = True
+        else:
+            review_span = self.strategy_review_span
+            is_tmp_review_span = False
+        return {
+            'follow': follow,
+            'review_span': review_span,
+            'is_tmp_review_span': is_tmp_review_span,
+            'review_span_tracker': self.init_review_span_tracker,
+        }
+
+    def _learning_step(self, state, result_idx, review, get_rule_result):
+        """
+        Signal of learning strategy for day *result_idx*. *state* (see _init_learning_state) is updated in place.
+        *review* is called as review(strat_idx, end_idx) when it's time to review rules performance and
+        *get_rule_result* returns current result of given rule id.
+        """
+        follow = state['follow']
+        state['review_span_tracker'] += 1
+        if state['review_span_tracker'] == state['review_span']:
+            # perform review and reset span tracker. +1 to make current result inclusive
+            follow['_value'] = review(self._get_learning_start_idx(result_idx+1), result_idx+1)
+            state['review_span_tracker'] = self.init_review_span_tracker
+            if state['is_tmp_review_span']:
+                # dynamic review span at the begining of the backfill. increase tmp review span, if new tmp span
+                # is >= actual - use and flag it
+                state['review_span'] += 5
+                if state['review_span'] >= self.strategy_review_span:
+                    state['review_span'] = self.strategy_review_span
+                    state['is_tmp_review_span'] = False
+        # set up signal. if no rule/position yet - go neutral
+        if not follow.get('_value', None):
+            return 0
+        if follow['_type'] == 'rule':
+            return get_rule_result(follow['_value'])
+        return follow['_value']
+
+    def _generate_convoluted_rule_results(self, conv_rule):
+        """
+        Combines results of rules *conv_rule* depends on. 'combine' aggregation is done for all days at once (on
+        stacked results of the rules), 'state-based' day by day as it depends on its previous result.
+        """
+        if conv_rule['aggregation_type'] == 'combine':
+            self.rules_results[conv_rule['id']] = self.combine_results_series(
+                self.results[conv_rule['_deps']], conv_rule['aggregation_params']
+            ).tolist()
+            return
+        if conv_rule['_is_state_base'] and conv_rule['_state_table'] is not None:
+            stacked_results = self.results[conv_rule['_deps']]
+            if np.isin(stacked_results, (-1, 0, 1)).all():
+                self.rules_results[conv_rule['id']] = self.state_based_results_series(
+                    stacked_results, conv_rule['_state_table']
+                ).tolist()
+                return
+        self.rules_results[conv_rule['id']] = []
+        for result_idx in range(self.index-self.max_lookback):
+            simple_rules_results = self._get_simple_rules_results(
+                conv_rule['simple_rules'],
+                result_idx,
+                as_dict=conv_rule['_is_state_base'],
+                conv_rule_id=conv_rule['id'],
+            )
+            self.rules_results[conv_rule['id']].append(
+                self.combine_simple_results(
+                    rules_results=simple_rules_results,
+                    aggregation_type=conv_rule['aggregation_type'], 
+                    aggregation_params=conv_rule['aggregation_params'],
+                )
+            )
+
+    def _get_simple_rule_results(self, simple_rule):
+        """
+        Returns results of simple rule for all days from max_lookback on. Takes them from rules_cache if possible.
+        """
+        if self.rules_cache is None:
+            return self._compute_simple_rule(simple_rule, self.max_lookback)
+        # results of the rule without holding do not depend on max_lookback, so they are computed from the rule own
+        # lookback and can be reused by configs with different max_lookback
+        _hold_fixed_days = simple_rule.get('hold_fixed_days', None)
+        start_idx = self.max_lookback if _hold_fixed_days else simple_rule['lookback']
+        key = (
+            self._get_data_hash(simple_rule['ts']),
+            # function object itself (closures, lambdas and partials with the same name are different rules). cache
+            # keeps reference to it, so its id can't be reused by other function
+            simple_rule['func'],
+            str(simple_rule['ts']),
+            simple_rule['lookback'],
+            tuple(sorted((k, _param_key(v)) for k, v in simple_rule['params'].items())),
+            _hold_fixed_days,
+            start_idx,
+        )
+        results = self.rules_cache.get(key)
+        if results is None:
+            results = self._compute_simple_rule(simple_rule, start_idx)
+            self.rules_cache.put(key, results)
+        return results[self.max_lookback-start_idx:]
+
+    def _compute_simple_rule(self, simple_rule, start_idx):
+        """Computes results of simple rule for days from *start_idx* to the end of data."""
+        series_func = rules.SERIES_RULES.get(simple_rule['func']) if self.vectorized_rules else None
+        if series_func is not None:
+            # whole timeseries (hold is applied on top of the raw results below)
+            series_results = series_func(
+                self._get_ts(simple_rule['ts'], self.index-1, self.index-1), simple_rule['lookback'],
+                **simple_rule['params']
+            )[start_idx:self.index].tolist()
+        results = []
+        _hold_fixed_days = simple_rule.get('hold_fixed_days', None)
+        _hold_results = []
+        for idx in range(start_idx, self.index):
+            if len(_hold_results) > 0:
+                # if rule has holding fox x days on rule lvl set up it will output same result for x consequent days
+                rule_res = _hold_results.pop()
+            else:
+                if series_func is not None:
+                    rule_res = series_results[idx-start_idx]
+                else:
+                    rule_res = simple_rule['func'](
+                        self._get_ts(simple_rule['ts'], idx, simple_rule['lookback']),
+                        **simple_rule['params']
+                    )
+                # hold only long or short. ignore neutral
+                if _hold_fixed_days and rule_res in (-1, 1):
+                    _hold_results.extend((_hold_fixed_days-1)*[rule_res])
+            results.append(rule_res)
+        return results
+
+    def _get_data_hash(self, ts_name):
+        """Content hash of timeseries (or list of timeseries) used as rule input."""
+        if isinstance(ts_name, list):
+            return tuple(self._get_data_hash(name) for name in ts_name)
+        if ts_name not in self._data_hashes:
+            arr = np.ascontiguousarray(self.data[ts_name])
+            self._data_hashes[ts_name] = (
+                str(arr.dtype), arr.shape, hashlib.sha1(arr.tobytes()).hexdigest()
+            )
+        return self._data_hashes[ts_name]
+
     def _get_learning_start_idx(self, result_idx):
         # if not enough days - take all previous results to fully cover memory span
         if result_idx <= self.strategy_memory_span-1:
             return 0
         return result_idx - self.strategy_memory_span
     
-    def _review_performance(self, strat_idx=None, end_idx=None):
+    def _build_learning_prefix(self):
         """
-        Output depends on metric. If "voting" it returns position which should be taken. Otherwise it returns 
-        rule_id which should be followed.
+        Prefix sums which allow to get performance metric of any rule in any window in O(1) (see
+        _get_metric_from_prefix).
+
+        Returns are converted to int64 fixed point numbers (scaled by power of 2, *scale*), so sums of windows are
+        exact and rules with the same signals in the window always have the same metric (ties are resolved the same
+        way as with direct computation). Non-finite returns are counted, so windows with them can be computed directly.
         """
+        no_days = self.index-self.max_lookback
+        prefix = {'rules': {}}
+        if self.strategy_metric == 'voting':
+            for rule_id in self.strategy_rules:
+                rule_signals = np.asarray(self.rules_results[rule_id])
+                prefix['rules'][rule_id] = {
+                    position: _cumsum0(rule_signals == position) for position in (-1, 0, 1)
+                }
+            return prefix
+        if self.strategy_metric == 'daily_returns':
+            returns = self.daily_returns__learning
+        else:
+            returns = self.daily_log_returns__learning
+        returns = np.asarray(returns[self.max_lookback:self.max_lookback+no_days], dtype=float)
+        is_finite = np.isfinite(returns)
+        returns = np.where(is_finite, returns, 0)
+        # the biggest scale for which no sum can overflow int64
+        abs_sum = np.abs(returns).sum()
+        prefix['scale'] = 2.0**(62 - math.frexp(abs_sum)[1] - 1) if abs_sum > 0 else 1.0
+        fixed_returns = np.rint(returns*prefix['scale']).astype(np.int64)
+        prefix['non_finite'] = _cumsum0(~is_finite)
+        for rule_id in self.strategy_rules:
+            rule_signals = np.asarray(self.rules_results[rule_id], dtype=np.int64)
+            prefix['rules'][rule_id] = {
+                'returns': _cumsum0(rule_signals*fixed_returns),
+                'held': _cumsum0(rule_signals != 0),
+            }
+        # running sums of past reviews (for historical performance in case of ties)
+        prefix['past_reviews_sums'] = {rule_id: sum(self.past_reviews[rule_id]) for rule_id in self.strategy_rules}
+        return prefix
+
+    def _get_metric_from_prefix(self, rule_id, strat_idx, end_idx):
+        """Performance metric of rule from prefix sums. None if it has to be computed directly."""
+        prefix = self._learning_prefix
+        rule_prefix = prefix['rules'][rule_id]
+        if self.strategy_metric == 'voting':
+            return tuple(int(rule_prefix[p][end_idx] - rule_prefix[p][strat_idx]) for p in (-1, 0, 1))
+        window_len = end_idx - strat_idx
+        if window_len <= 0 or prefix['non_finite'][end_idx] - prefix['non_finite'][strat_idx] > 0:
+            return None
+        returns_sum = float(rule_prefix['returns'][end_idx] - rule_prefix['returns'][strat_idx]) / prefix['scale']
+        if self.strategy_metric == 'daily_returns':
+            return returns_sum
+        elif self.strategy_metric == 'avg_log_returns':
+            return returns_sum / window_len
+        elif self.strategy_metric == 'avg_log_returns_held_only':
+            held = int(rule_prefix['held'][end_idx] - rule_prefix['held'][strat_idx])
+            if held == 0:
+                return 0
+            return returns_sum / held
+
+    def _get_metric(self, rule_id, strat_idx, end_idx):
+        """Performance metric of rule computed directly from rules results."""
         # need to adjust start/end idx here as they refers to results idx not (not idx within df)
         df_start_idx = strat_idx+self.max_lookback
         df_end_idx = end_idx+self.max_lookback
-        # for each rule and appropriate indices: calculate and store performance metric(s)
+        # get given rules signals
+        rule_signals = list(self.rules_results[rule_id][strat_idx:end_idx])
+        returns = None
+        if self.strategy_metric == 'daily_returns':
+            returns = self.daily_returns__learning[df_start_idx:df_end_idx]
+        elif self.strategy_metric in ('avg_log_returns', 'avg_log_returns_held_only'):
+            returns = self.daily_log_returns__learning[df_start_idx:df_end_idx]
+        return self._compute_metric(rule_signals, returns)
+
+    def _compute_metric(self, rule_signals, returns):
+        """Performance metric of rule from its signals (list) and corresponding returns."""
+        if self.strategy_metric == 'daily_returns':
+            metric = sum([ret*sig for ret,sig in zip(returns, rule_signals)])
+        elif self.strategy_metric == 'avg_log_returns':
+            _realized_rets = [ret*sig for ret,sig in zip(returns, rule_signals)]
+            metric = sum(_realized_rets) / len(_realized_rets)
+        elif self.strategy_metric == 'avg_log_returns_held_only':
+            _realized_rets_pos = [ret*sig for ret,sig in zip(returns, rule_signals) if sig != 0]
+            try:
+                metric = sum(_realized_rets_pos) / len(_realized_rets_pos)
+            except ZeroDivisionError:
+                metric = 0
+        elif self.strategy_metric == 'voting':
+            metric = (
+                rule_signals.count(-1),
+                rule_signals.count(0),
+                rule_signals.count(1),
+            )
+        return metric
 
-        cur_res = {}
+    def _review_performance(self, strat_idx=None, end_idx=None):
+        """
+        Output depends on metric. If "voting" it returns position which should be taken. Otherwise it returns 
+        rule_id which should be followed.
+        """
+        # for each rule and appropriate indices: calculate performance metric(s)
+        metrics = {}
+        for rule_id in self.strategy_rules:
+            metric = None
+            if self._learning_prefix is not None:
+                metric = self._get_metric_from_prefix(rule_id, strat_idx, end_idx)
+            if metric is None:
+                metric = self._get_metric(rule_id, strat_idx, end_idx)
+            metrics[rule_id] = metric
+        past_reviews_sums = None
+        if self._learning_prefix is not None:
+            past_reviews_sums = self._learning_prefix.get('past_reviews_sums')
+        return self._choose_from_reviews(metrics, past_reviews_sums)
+
+    def _choose_from_reviews(self, metrics, past_reviews_sums=None):
+        """
+        Stores rules *metrics* ({rule_id: metric}) in past reviews and returns rule to follow (or position if
+        "voting"). *past_reviews_sums* - running sums of past reviews (kept up to date here). If not given, they are
+        summed up from past reviews when needed.
+        """
         _best_rule = [(-9999999, None)]
         for rule_id in self.strategy_rules:
-            # get given rules signals
-            rule_signals = self.rules_results[rule_id][strat_idx:end_idx]
-            # calculate performance metric against signals
-            if self.strategy_metric == 'daily_returns':
-                daily_returns = self.daily_returns__learning[df_start_idx:df_end_idx]
-                metric = sum([ret*sig for ret,sig in zip(daily_returns, rule_signals)])
-            elif self.strategy_metric == 'avg_log_returns':
-                daily_log_returns = self.daily_log_returns__learning[df_start_idx:df_end_idx]
-                _realized_rets = [ret*sig for ret,sig in zip(daily_log_returns, rule_signals)]
-                metric = sum(_realized_rets) / len(_realized_rets)
-            elif self.strategy_metric == 'avg_log_returns_held_only':
-                daily_log_returns = self.daily_log_returns__learning[df_start_idx:df_end_idx]
-                _realized_rets_pos = [ret*sig for ret,sig in zip(daily_log_returns, rule_signals) if sig != 0]
-                try:
-                    metric = sum(_realized_rets_pos) / len(_realized_rets_pos)
-                except ZeroDivisionError:
-                    metric = 0
-            elif self.strategy_metric == 'voting':
-                metric = (
-                    rule_signals.count(-1),
-                    rule_signals.count(0),
-                    rule_signals.count(1),
-                )
+            metric = metrics[rule_id]
             self.past_reviews[rule_id].append(metric)
-            cur_res[rule_id] = metric
+            if past_reviews_sums is not None:
+                past_reviews_sums[rule_id] += metric
             # for non voting strategies find best performing rule(s) already in loop
             if self.strategy_metric != 'voting':
                 if metric > _best_rule[0][0]:
@@ -660,11 +1325,11 @@ class SignalGenerator():
         if self.strategy_metric != 'voting':
             if len(_best_rule) > 1:
                 _best_hist = (
-                    sum(self.past_reviews[_best_rule[0][1]])/len(self.past_reviews[_best_rule[0][1]]),
+                    self._get_historical_performance(_best_rule[0][1], past_reviews_sums),
                     _best_rule[0][1]
                 )
                 for _, rule_id in _best_rule[1:]:
-                    hist_perf = sum(self.past_reviews[rule_id])/len(self.past_reviews[rule_id])
+                    hist_perf = self._get_historical_performance(rule_id, past_reviews_sums)
                     if hist_perf > _best_hist[0]:
                         _best_hist = (hist_perf, rule_id)
                 return _best_hist[1]
@@ -673,9 +1338,9 @@ class SignalGenerator():
         else:
             positions_counts = {p: 0 for p in (-1,0,1)}
             for rule_id in self.strategy_rules:
-                positions_counts[-1] += cur_res[rule_id][0]
-                positions_counts[0] += cur_res[rule_id][1]
-                positions_counts[1] += cur_res[rule_id][2]
+                positions_counts[-1] += metrics[rule_id][0]
+                positions_counts[0] += metrics[rule_id][1]
+                positions_counts[1] += metrics[rule_id][2]
             poll_results = max([(p, cnt) for p, cnt in positions_counts.items()], key=lambda x: x[1])
             most_freq_position = poll_results[0]
             majority_votes_cnt = poll_results[1]
@@ -684,6 +1349,14 @@ class SignalGenerator():
                 return 0
             return most_freq_position
 
+    def _get_historical_performance(self, rule_id, past_reviews_sums=None):
+        """Average of all past reviews of the rule."""
+        if past_reviews_sums is not None:
+            past_reviews_sum = past_reviews_sums[rule_id]
+        else:
+            past_reviews_sum = sum(self.past_reviews[rule_id])
+        return past_reviews_sum/len(self.past_reviews[rule_id])
+
     def _reset_final_positions(self):
         self.final_positions = self.max_lookback*[0]
 
@@ -701,6 +1374,13 @@ class SignalGenerator():
         return final_signal   
 
 
+def _cumsum0(arr):
+    """Cumulative sum (int64) with leading 0, so sum of arr[i:j] is output[j]-output[i]."""
+    output = np.zeros(len(arr)+1, dtype=np.int64)
+    np.cumsum(arr, out=output[1:])
+    return output
+
+
 def triggers_to_states(df):
     """
     DEPRECATED
@@ -1,5 +1,7 @@
 # built-in
+import concurrent.futures
 import datetime
+import hashlib
 import itertools
 import os
 import pickle
@@ -18,12 +20,14 @@ import pandas as pd
 
 # custom
 import backtester
+import commons
 import gpw_data
 import strategies.helpers as helpers
 import position_size
 import results
 import rules
 import rules_mining
+import rules_store
 import signal_generator
 
 
@@ -1173,7 +1177,162 @@ def merge_final_configs(
         ('msv', msv_rules_configs),
         ('cdl', cdl_rules_configs),
     ]
+    configs = ConfigSpace(class_configs)
+    print(f'There is {configs.no_basic} basic configs')
+    print(f'Plus {configs.no_combined} complex combined configs')
+    print(f'Plus {configs.no_basic + configs.no_combined} reversed configs')
+    print(f'Plus {configs.no_learning} learning rules configs')
+    print(f'Total: {len(configs)}')
+    return configs
 
+
+class ConfigSpace():
+    """
+    Lazy sequence of all data mining configs. Contains the same configs, in the same order, as a list would:
+    basic configs, complex combined configs, reversed versions of both of them and learning configs (each followed
+    by its reversed version).
+
+    Only basic configs and simple rules of each rules class (shared rule table) are kept in memory. Any other config
+    is described by its position - rules classes, parameters, random seeds of its rules sample and reversed flag -
+    and built when accessed. So number of configs is known without building them and any slice of configs
+    (e.g. chunk of work of a worker) can be built on its own.
+    """
+    COMBINED_NO_RULES = (20, 40)
+    COMBINED_VERSIONS = 10
+    LEARNING_NO_RULES = 20
+    MEMORY_SPANS = (5, 10, 20, 60, 120)
+    REVIEW_SPANS = (5, 10, 20)
+    PERFORMANCE_METRICS = ('voting', 'daily_returns', 'avg_log_returns', 'avg_log_returns_held_only')
+
+    def __init__(self, class_configs):
+        """*class_configs* - list of (rules class name, configs of the class) tuples"""
+        self.basic_configs = [conf for _, configs in class_configs for conf in configs]
+        self.class_rules = {
+            k: [rule for conf in configs for rule in conf['rules'] if rule['type'] == 'simple']
+            for k, configs in class_configs
+        }
+        class_rules_lst = list(self.class_rules.keys())
+        self.combs = [
+            comb for k in range(1, len(class_rules_lst)+1) for comb in itertools.combinations(class_rules_lst, k)
+        ]
+        self.memory_and_reviews = [(m, r) for m in self.MEMORY_SPANS for r in self.REVIEW_SPANS if r <= m]
+        # seeds of rules samples, in order of use (first seed is used by first sampled class of first config)
+        self.random_seeds = np.array(random.Random(30753277).sample(range(1, 1000000000), 100000)[::-1])
+        # first seed used by each combination of classes (combined and learning configs use seeds of their own)
+        self._comb_seeds = np.concatenate([[0], np.cumsum([len(comb) for comb in self.combs])])
+        self._combined_per_comb = len(self.COMBINED_NO_RULES) * self.COMBINED_VERSIONS
+        self._learning_per_comb = len(self.memory_and_reviews) * len(self.PERFORMANCE_METRICS)
+        self._learning_first_seed = self._combined_per_comb * int(self._comb_seeds[-1])
+
+        self.no_basic = len(self.basic_configs)
+        self.no_combined = len(self.combs) * self._combined_per_comb
+        # normal and reversed version of each
+        self.no_learning = 2 * len(self.combs) * self._learning_per_comb
+
+    def __len__(self):
+        return 2 * (self.no_basic + self.no_combined) + self.no_learning
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._build(self.describe(i)) for i in range(*idx.indices(len(self)))]
+        return self._build(self.describe(idx))
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self._build(self.describe(idx))
+
+    def describe(self, idx):
+        """
+        Returns descriptor of config at *idx*, it's one of:
+        ('basic', index of basic config, reversed)
+        ('combined', classes, number of rules per class, version, first seed, reversed)
+        ('learning', classes, memory span, review span, performance metric, first seed, reversed)
+        """
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('config index out of range')
+        no_not_learning = self.no_basic + self.no_combined
+        if idx < 2 * no_not_learning:
+            is_reversed, idx = divmod(idx, no_not_learning)
+            if idx < self.no_basic:
+                return ('basic', idx, bool(is_reversed))
+            comb_idx, idx = divmod(idx - self.no_basic, self._combined_per_comb)
+            comb = self.combs[comb_idx]
+            first_seed = self._combined_per_comb * int(self._comb_seeds[comb_idx]) + idx * len(comb)
+            no_rules_idx, version = divmod(idx, self.COMBINED_VERSIONS)
+            return ('combined', comb, self.COMBINED_NO_RULES[no_rules_idx], version, first_seed, bool(is_reversed))
+        idx, is_reversed = divmod(idx - 2 * no_not_learning, 2)
+        comb_idx, idx = divmod(idx, self._learning_per_comb)
+        comb = self.combs[comb_idx]
+        # normal and reversed version use the same rules
+        first_seed = self._learning_first_seed + self._learning_per_comb * int(self._comb_seeds[comb_idx])
+        first_seed += idx * len(comb)
+        mr_idx, pm_idx = divmod(idx, len(self.PERFORMANCE_METRICS))
+        m, r = self.memory_and_reviews[mr_idx]
+        return ('learning', comb, m, r, self.PERFORMANCE_METRICS[pm_idx], first_seed, bool(is_reversed))
+
+    def _sample_rules(self, comb, no_rules, first_seed):
+        sample_rules = []
+        for seed_idx, cls in enumerate(comb):
+            rng = random.Random(int(self.random_seeds[first_seed + seed_idx]))
+            sample_rules.extend(rng.sample(self.class_rules[cls], no_rules))
+        return sample_rules
+
+    def _build(self, descriptor):
+        kind, is_reversed = descriptor[0], descriptor[-1]
+        if kind == 'basic':
+            conf = self.basic_configs[descriptor[1]]
+        elif kind == 'combined':
+            _, comb, no_rls, v, first_seed, _ = descriptor
+            sample_rules = self._sample_rules(comb, no_rls, first_seed)
+            cls = '_'.join(comb)
+            rule_id_template = f'{COMPLEX_RULE_PREFIX}_COM_{cls}_nr{no_rls}_v{v}'
+            conf = {
+                'rules': sample_rules + [
+                    {
+                        'id': rule_id_template,
+                        'type': 'convoluted',
+                        'simple_rules': [rule['id'] for rule in sample_rules],
+                        'aggregation_type': 'combine',
+                        'aggregation_params': {'mode': 'majority_voting'}
+                    }
+                ],
+                'strategy': {
+                    'type': 'fixed',
+                    'strategy_rules': [rule_id_template],
+                    'strategy_id': rule_id_template
+                }
+            }
+        else:
+            _, comb, m, r, pm, first_seed, _ = descriptor
+            sample_rules = self._sample_rules(comb, self.LEARNING_NO_RULES, first_seed)
+            cls = '_'.join(comb)
+            rule_id_template = f'{COMPLEX_RULE_PREFIX}_LRN_{cls}_m{m}_r{r}_{pm}'
+            conf = {
+                'rules': sample_rules,
+                'strategy': {
+                    'type': 'learning',
+                    'strategy_rules': [rule['id'] for rule in sample_rules],
+                    'strategy_id': rule_id_template,
+                    'params':{
+                        'memory_span': m,
+                        'review_span': r,
+                        'performance_metric': pm,
+                        'price_label': 'close',
+                    }
+                }
+            }
+        if is_reversed:
+            # rules are shared with normal version, only strategy is new
+            strategy = dict(conf['strategy'], reversed=True)
+            strategy['strategy_id'] = REVERSED_RULE_PREFIX+strategy['strategy_id']
+            conf = {'rules': conf['rules'], 'strategy': strategy}
+        return conf
+
+
+def _merge_final_configs_list(class_configs):
+    # reference of ConfigSpace - all configs materialized in a single list
     class_rules = {
         k: [rule for conf in configs for rule in conf['rules'] if rule['type'] == 'simple']
         for k, configs in class_configs
@@ -1309,24 +1468,30 @@ def loop_with_progressbar(it, prefix="", size=60, out=sys.stdout):
     out.flush()
 
 
-def _run_sg_and_store_results(input_df, conf, strategy_id, rules_dir, symbol, final_file_full_path):
+def _dump_pickle(obj, path):
+    # file is replaced when it's complete, so interrupted run does not leave broken files
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, "wb" ) as fh:
+        pickle.dump(obj, fh)
+    os.replace(tmp_path, path)
+
+
+def _run_sg_and_store_results(input_df, conf, strategy_id, symbol_rules_store, final_file_full_path):
     sg = signal_generator.SignalGenerator(
         df = input_df,
         config = conf,
+        vectorized_rules = True,
     )
     rule_signals = sg.generate()
     if not REVERSED_RULE_PREFIX in strategy_id:
-        sg.save_rules_results(
-            path=rules_dir,
-            prefix=f'{symbol}_'
-        )
-    with open(final_file_full_path, "wb" ) as fh:
-        pickle.dump(rule_signals, fh)
+        symbol_rules_store.append(sg.rules_results)
+    _dump_pickle(rule_signals, final_file_full_path)
         
     return rule_signals
 
 
 def _prepare_strategy_dataframe(strategy_id, input_df, rules_ids_lst):
+    # reference of per config pre-processing (replaced by prepare_features)
     # selective pre-processing for non-complex rules
     if not COMPLEX_RULE_PREFIX in strategy_id:
         # get label for potentail MSP or MSV strategy
@@ -1409,21 +1574,106 @@ def _prepare_strategy_dataframe(strategy_id, input_df, rules_ids_lst):
     return input_df
 
 
+def _obv_feature(input_df, sma):
+    return helpers.on_balance_volume_indicator(input_df)['obv']
+
+
+def _roc_feature(input_df, sma, label):
+    return helpers.roc_oscillator(input_df, days=1, col=label)
+
+
+def _sma_roc_feature(input_df, sma, label, days):
+    return helpers.roc_oscillator(pd.DataFrame({'sma': sma(label, int(days))}), days=1, col='sma')
+
+
+def _xavgs_roc_feature(input_df, sma, label, days_long, days_short):
+    ratio = sma(label, int(days_long)) / sma(label, int(days_short))
+    return helpers.roc_oscillator(pd.DataFrame({'ratio': ratio}), days=1, col='ratio')
+
+
+# features (timeseries used by rules, but not present in pricing data). name pattern -> func(input_df, sma, *groups)
+FEATURES = (
+    (re.compile(r'obv'), _obv_feature),
+    (re.compile(r'(close|volume)_roc'), _roc_feature),
+    (re.compile(r'(close|volume)_sma_roc_(\d+)'), _sma_roc_feature),
+    (re.compile(r'(close|volume)_xavgs_roc_(\d+)_(\d+)'), _xavgs_roc_feature),
+)
+
+
+def required_ts_names(configs):
+    """Names of all timeseries used by simple rules of *configs* (in order of first use)."""
+    if isinstance(configs, ConfigSpace):
+        # other configs use only simple rules of the basic ones
+        configs = configs.basic_configs
+    ts_names = {}
+    for conf in configs:
+        for rule in conf['rules']:
+            if rule['type'] == 'simple':
+                for ts in ([rule['ts']] if isinstance(rule['ts'], str) else rule['ts']):
+                    ts_names[ts] = None
+    return list(ts_names)
+
+
+def prepare_features(input_df, configs):
+    """
+    Returns copy of *input_df* with all feature columns used by *configs* (e.g. obv, close_sma_roc_20). Each unique
+    column is computed once (and moving averages are shared by features), so the same dataframe can be used by
+    SignalGenerator of every config. It must not be modified.
+    """
+    sma_cache = {}
+
+    def sma(label, days):
+        if (label, days) not in sma_cache:
+            sma_cache[(label, days)] = helpers.simple_ma(input_df, days=days, col=label)
+        return sma_cache[(label, days)]
+
+    features = {}
+    for ts in required_ts_names(configs):
+        if ts in input_df.columns:
+            continue
+        for pattern, func in FEATURES:
+            match = pattern.fullmatch(ts)
+            if match:
+                features[ts] = func(input_df, sma, *match.groups())
+                break
+        else:
+            raise AttributeError(f'Unknown timeseries: {ts}')
+    if not features:
+        return input_df.copy()
+    return pd.concat([input_df, pd.DataFrame(features, index=input_df.index)], axis=1)
+
+
+def _prepare_symbol_dirs(symbol, input_df, output_path, overwrite=False):
+    """
+    Creates folder structure of *symbol* (if it does not exist). Returns (final signals dir, rules store). Rules store
+    is cleared if *overwrite*.
+    """
+    rules_dir = os.path.join(output_path, symbol, 'rules')
+    final_dir = os.path.join(output_path, symbol, 'final')
+    for _path in (rules_dir, final_dir):
+        os.makedirs(_path, exist_ok=True)
+    # rules results used to be stored as pickle file per rule. move them to the store if not done yet
+    if not overwrite and not os.path.exists(os.path.join(rules_dir, rules_store.INDEX_FILE)) and os.listdir(rules_dir):
+        rules_store.migrate_pickles(rules_dir, prefix=f'{symbol}_', days=len(input_df))
+    return final_dir, rules_store.RulesStore(rules_dir, days=len(input_df), overwrite=overwrite)
+
+
 def get_symbol_signals(
     symbol=None,
     pricing_data=None,
     configs=None,
     run_and_overwrite = False,
     data_collector=None,
+    output_path=ALL_SIGNALS_PATH,
+    progressbar=True,
 ):
     """
     Generates signal for all rules for given symbol. Save/retrive data to speed things up
     
-    data_mining_rules
+    data_mining_rules (*output_path*)
         /SYMBOL
             /rules
-                /simple_rule...
-                /convoluted_rule...
+                rules_store files (results of simple and convoluted rules)
             /final
                 /strategy_id...    
     """
@@ -1431,16 +1681,13 @@ def get_symbol_signals(
     # detrend data
     # input_df = data_collector.detrend(input_df)
     
-    # create folder structure if does not exists
-    rules_dir = os.path.join(ALL_SIGNALS_PATH, symbol, 'rules')
-    final_dir = os.path.join(ALL_SIGNALS_PATH, symbol, 'final')
-    for _path in (rules_dir, final_dir):
-        if not os.path.exists(_path):
-            os.makedirs(_path)
+    final_dir, symbol_rules_store = _prepare_symbol_dirs(symbol, input_df, output_path, overwrite=run_and_overwrite)
+    # all columns used by rules are computed once, when first signal needs to be generated
+    features_df = None
         
     signals = {}
     states = {}
-    for conf in loop_with_progressbar(configs):
+    for conf in (loop_with_progressbar(configs) if progressbar else configs):
         # assumes single final rule in strategy. may need to change in later
         strategy_id = conf['strategy']['strategy_id']
         
@@ -1449,24 +1696,15 @@ def get_symbol_signals(
         final_file_full_path = os.path.join(final_dir, signal_file_name)
         signal_file_exists = os.path.isfile(os.path.join(final_dir, signal_file_name))
         
-        # if complex combined rule check only for simple rules files existence
+        # if complex combined rule check only for simple rules results existence
         if f'{COMPLEX_RULE_PREFIX}_' in strategy_id:
-            rules_results_file_names = [
-                '{symbol}_{rule_id}'.format(symbol=symbol, rule_id=rule_dict['id']) 
-                for rule_dict in conf['rules'] if rule_dict['type'] == 'simple'
-            ]
+            rules_results_ids = [rule_dict['id'] for rule_dict in conf['rules'] if rule_dict['type'] == 'simple']
             load_only_simple = True
         else:
-            rules_results_file_names = [
-                '{symbol}_{rule_id}'.format(symbol=symbol, rule_id=rule_dict['id']) 
-                for rule_dict in conf['rules']
-            ]
+            rules_results_ids = [rule_dict['id'] for rule_dict in conf['rules']]
             load_only_simple = False
         
-        all_rules_files_exists = all([
-            os.path.isfile(os.path.join(rules_dir, rule_file_name))
-            for rule_file_name in rules_results_file_names
-        ])
+        all_rules_files_exists = all([rule_id in symbol_rules_store for rule_id in rules_results_ids])
         
         # generate signal (it may be partially or fully retrived from file. or just newly generated)
         if (signal_file_exists == True) and (run_and_overwrite == False):
@@ -1480,33 +1718,37 @@ def get_symbol_signals(
                 
         elif run_and_overwrite == True:
             # if run and overwrite -> run full generate. ignore saving rules results for reversed strategies.
-            rules_ids_lst = [rule['id'] for rule in conf['rules']]
-            input_df = _prepare_strategy_dataframe(strategy_id, input_df, rules_ids_lst)
+            if features_df is None:
+                features_df = prepare_features(input_df, configs)
             rule_signals = _run_sg_and_store_results(
-                input_df, conf, strategy_id, rules_dir, symbol, final_file_full_path
+                features_df, conf, strategy_id, symbol_rules_store, final_file_full_path
             )
             
         elif signal_file_exists == False:
+            if features_df is None:
+                features_df = prepare_features(input_df, configs)
             # final signal file does not exists
+            sg = None
             if all_rules_files_exists == True:
-                # generate signal with "load_rules_results_path". store only final result
-                sg = signal_generator.SignalGenerator(
-                    df = input_df,
-                    config = conf,
-                    load_rules_results_path = rules_dir,
-                    load_rules_results_prefix = f'{symbol}_',
-                    load_only_simple=load_only_simple,
-                )
+                try:
+                    sg = signal_generator.SignalGenerator(
+                        df = features_df,
+                        config = conf,
+                        rules_store = symbol_rules_store,
+                        load_only_simple=load_only_simple,
+                    )
+                except signal_generator.NotAllRuleResultsPresentError:
+                    # stored results are too short (stored by config with bigger max lookback) -> full generate
+                    pass
+            if sg is not None:
+                # generate signal with rules results from the store. store only final result
                 #print('Will generate: ', strategy_id)
                 rule_signals = sg.generate()
-                with open(final_file_full_path, "wb" ) as fh:
-                    pickle.dump(rule_signals, fh)
+                _dump_pickle(rule_signals, final_file_full_path)
             else:
                 # run full generate. ignore saving rules results for reversed strategies.
-                rules_ids_lst = [rule['id'] for rule in conf['rules']]
-                input_df = _prepare_strategy_dataframe(strategy_id, input_df, rules_ids_lst)
                 rule_signals = _run_sg_and_store_results(
-                    input_df, conf, strategy_id, rules_dir, symbol, final_file_full_path
+                    features_df, conf, strategy_id, symbol_rules_store, final_file_full_path
                 )
         # append generated result to output dictionary. leave only necessery columns
         signals[strategy_id] = rule_signals[[PRICE_LABEL, 'entry_long', 'exit_long', 'entry_short', 'exit_short', 'position']]
@@ -1521,7 +1763,9 @@ def data_mine_symbol(
     configs=None,
     limit_rules=None,
     no_samples=500,
-    run_and_overwrite=False
+    run_and_overwrite=False,
+    output_path=ALL_SIGNALS_PATH,
+    progressbar=True,
 ):
     time_format = '%H:%M:%S'
     t1 = datetime.datetime.fromtimestamp(time.time())
@@ -1531,7 +1775,9 @@ def data_mine_symbol(
         pricing_data=pricing_data,
         configs=configs,
         data_collector=data_collector,
-        run_and_overwrite=run_and_overwrite
+        run_and_overwrite=run_and_overwrite,
+        output_path=output_path,
+        progressbar=progressbar,
     )
 
     name_signal_list = list(symbol_signals.items())
@@ -1545,7 +1791,7 @@ def data_mine_symbol(
     t2 = datetime.datetime.fromtimestamp(time.time())
     print(f'[{t2.strftime(time_format)}] Running backtests')
     _idx = 0  # used as index to replace name_signal_list values with 0
-    for r_name, r_signal in loop_with_progressbar(name_signal_list):
+    for r_name, r_signal in (loop_with_progressbar(name_signal_list) if progressbar else name_signal_list):
         tester = backtester.SimpleBacktest(
             df = r_signal,
             price_label=PRICE_LABEL,
@@ -1638,7 +1884,199 @@ def data_mine_symbol(
     }
 
 
-def main():
+def _show_progress(done, total, t_start, done_at_start=0, prefix="", size=60, out=sys.stdout):
+    """Progress bar of all units with ETA (estimated from units done since *t_start*)."""
+    x = int(size*done/total) if total else size
+    elapsed = time.time() - t_start
+    eta = '--:--:--'
+    if done > done_at_start:
+        eta = str(datetime.timedelta(seconds=int(elapsed / (done - done_at_start) * (total - done))))
+    out.write("%s[%s%s] %i/%i elapsed: %s ETA: %s\r" % (
+        prefix, "#"*x, "."*(size-x), done, total, datetime.timedelta(seconds=int(elapsed)), eta
+    ))
+    out.flush()
+
+
+def _results_path(symbol, output_path):
+    return os.path.join(output_path, symbol, f'{symbol}.pickle')
+
+
+def _configs_chunks(configs, chunk_size):
+    """
+    Returns (start, end, hash of strategies ids) of each chunk of *configs*. Hash is part of chunk's marker,
+    so chunks of changed configs are run again.
+    """
+    chunks = []
+    for start in range(0, len(configs), chunk_size):
+        end = min(start+chunk_size, len(configs))
+        ids = '\n'.join(conf['strategy']['strategy_id'] for conf in configs[start:end])
+        chunks.append((start, end, hashlib.md5(ids.encode()).hexdigest()))
+    return chunks
+
+
+def _chunk_marker_path(symbol, chunk, output_path):
+    """Marker of generated signals of configs chunk (start, end, ids hash)."""
+    return os.path.join(output_path, symbol, 'progress', 'signals_{}_{}_{}.done'.format(*chunk))
+
+
+def _run_unit(context, unit):
+    """
+    Runs single unit of work:
+    ('signals', symbol, (start, end, ids hash)) - generates signals of configs[start:end] and marks chunk as done
+    ('results', symbol) - backtests all rules of the symbol, runs WRC and MC. saves results
+    """
+    kind, symbol = unit[:2]
+    output_path = context['output_path']
+    if kind == 'signals':
+        chunk = unit[2]
+        start, end = chunk[:2]
+        get_symbol_signals(
+            symbol=symbol,
+            pricing_data=context['pricing_data'],
+            configs=context['configs'][start:end],
+            # everything was removed already if run is overwritten
+            run_and_overwrite=False,
+            output_path=output_path,
+            progressbar=False,
+        )
+        open(_chunk_marker_path(symbol, chunk, output_path), 'w').close()
+    elif kind == 'results':
+        mining_res = data_mine_symbol(
+            symbol=symbol,
+            pricing_data=context['pricing_data'],
+            configs=context['configs'],
+            no_samples=context['no_samples'],
+            # signals were generated by 'signals' units already
+            run_and_overwrite=False,
+            output_path=output_path,
+            progressbar=False,
+        )
+        _dump_pickle(mining_res, _results_path(symbol, output_path))
+    else:
+        raise AttributeError(f'Unknown unit of work: {kind}')
+
+
+_WORKER_CONTEXT = None
+
+
+def _init_mining_worker(context):
+    global _WORKER_CONTEXT
+    _WORKER_CONTEXT = context
+
+
+def _run_unit_in_worker(unit):
+    _run_unit(_WORKER_CONTEXT, unit)
+    return unit
+
+
+def run_data_mining(
+    symbols=None,
+    pricing_data=None,
+    configs=None,
+    no_samples=1000,
+    run_and_overwrite=False,
+    output_path=ALL_SIGNALS_PATH,
+    n_jobs=None,
+    chunk_size=500,
+    out=sys.stdout,
+):
+    """
+    Data mines all *symbols* with *configs* (list or ConfigSpace). Work is split into units - generating signals
+    of *chunk_size* configs for a symbol, and backtests/WRC/MC of a symbol (scheduled when all its signals are ready).
+    Units are run in pool of *n_jobs* processes (in this process if *n_jobs* is 1) and results of each symbol are
+    saved as soon as they are ready:
+
+    data_mining_rules (*output_path*)
+        /SYMBOL
+            /SYMBOL.pickle - results of data_mine_symbol
+            /progress
+                markers of done signals units
+
+    Run can be interrupted and restarted - symbols with results file and chunks with markers are skipped.
+    *run_and_overwrite* removes all saved results of symbols (rules store, signals, markers) and runs everything again.
+    Rules results are aligned to the last day of pricing data, so it's required when pricing data has changed.
+    """
+    if chunk_size < 1:
+        raise AttributeError('chunk_size must be positive')
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    chunks = _configs_chunks(configs, chunk_size)
+
+    # units of each symbol still to run. dirs are prepared here, so workers don't race for it
+    pending_signals = {}
+    total = done = 0
+    for symbol in symbols:
+        total += len(chunks) + 1
+        if not run_and_overwrite and os.path.exists(_results_path(symbol, output_path)):
+            done += len(chunks) + 1
+            continue
+        final_dir, _ = _prepare_symbol_dirs(symbol, pricing_data[symbol], output_path, overwrite=run_and_overwrite)
+        progress_dir = os.path.join(output_path, symbol, 'progress')
+        os.makedirs(progress_dir, exist_ok=True)
+        if run_and_overwrite:
+            for _dir in (final_dir, progress_dir):
+                for file_name in os.listdir(_dir):
+                    os.remove(os.path.join(_dir, file_name))
+        pending_signals[symbol] = []
+        for chunk in chunks:
+            if os.path.exists(_chunk_marker_path(symbol, chunk, output_path)):
+                done += 1
+            else:
+                pending_signals[symbol].append(('signals', symbol, chunk))
+
+    context = {
+        'pricing_data': pricing_data,
+        'configs': configs,
+        'no_samples': no_samples,
+        'output_path': output_path,
+    }
+    # symbols are processed one after another (signals units of next symbol fill the gaps),
+    # so results are saved progressively and not all at the very end
+    queue = [unit for symbol in pending_signals for unit in pending_signals[symbol]]
+    queue += [('results', symbol) for symbol, units in pending_signals.items() if not units]
+    remaining = {symbol: len(units) for symbol, units in pending_signals.items()}
+    done_at_start = done
+    t_start = time.time()
+    _show_progress(done, total, t_start, done_at_start, out=out)
+
+    def _unit_done(unit):
+        nonlocal done
+        done += 1
+        _show_progress(done, total, t_start, done_at_start, out=out)
+        if unit[0] == 'signals':
+            symbol = unit[1]
+            remaining[symbol] -= 1
+            if remaining[symbol] == 0:
+                return ('results', symbol)
+        return None
+
+    if n_jobs <= 1:
+        while queue:
+            unit = queue.pop(0)
+            _run_unit(context, unit)
+            next_unit = _unit_done(unit)
+            if next_unit is not None:
+                queue.insert(0, next_unit)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=n_jobs, initializer=_init_mining_worker, initargs=(context,)
+        ) as executor:
+            queue = list(reversed(queue))
+            futures = set()
+            while queue or futures:
+                # bounded number of submitted units, so 'results' units get in early
+                while queue and len(futures) < n_jobs * 2:
+                    futures.add(executor.submit(_run_unit_in_worker, queue.pop()))
+                finished, futures = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    next_unit = _unit_done(future.result())
+                    if next_unit is not None:
+                        queue.append(next_unit)
+    out.write("\n")
+    out.flush()
+
+
+def main(n_jobs=None, chunk_size=500, run_and_overwrite=False):
     print('### Get data and prepare connfigs')
     dc = gpw_data.GPWData(pricing_data_path='/Users/slaw/osobiste/trading/pricing_data')
     universe = [
@@ -1677,22 +2115,22 @@ def main():
 
     symbols = universe[0:]
 
-    for symbol in symbols:
-        mining_res = data_mine_symbol(
-            symbol=symbol,
-            pricing_data=pricing_data,
-            data_collector=dc,
-            configs=configs,
-            no_samples=1000,
-            run_and_overwrite=False,
-            # limit_rules=100,
-        )
-
-        strategy_results_path = os.path.join(ALL_SIGNALS_PATH, symbol)
-        results_file = os.path.join(strategy_results_path, f'{symbol}.pickle')
-        with open(results_file, "wb" ) as fh:
-            pickle.dump(mining_res, fh)
+    run_data_mining(
+        symbols=symbols,
+        pricing_data=pricing_data,
+        configs=configs,
+        no_samples=1000,
+        run_and_overwrite=run_and_overwrite,
+        n_jobs=n_jobs,
+        chunk_size=chunk_size,
+    )
 
 
 if __name__ == '__main__':
-    main()
+    parser = commons.get_parser()
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='number of processes used for data mining')
+    parser.add_argument('--chunk_size', '-c', type=int, default=500, help='number of configs in single unit of work')
+    parser.add_argument('--overwrite', '-o', action='store_true', help='run everything again, ignore saved results')
+    args = parser.parse_args()
+    main(n_jobs=args.jobs, chunk_size=args.chunk_size, run_and_overwrite=args.overwrite)
+
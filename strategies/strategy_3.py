@@ -106,7 +106,10 @@ def create_config(f1_lookback=None, f1_b=None, f2_lookback=None, f2_b=None, hold
     return new_config
 
 
-def generate_signal(df, f1_lookback=None, f1_b=None, f2_lookback=None, f2_b=None, hold_x_days=None, wait=None, binary=None):
+def generate_signal(
+        df, f1_lookback=None, f1_b=None, f2_lookback=None, f2_b=None, hold_x_days=None, wait=None, binary=None,
+        rules_cache=None,
+    ):
     if f2_b > f1_b:
         raise ValueError('f1_b has to be bigger than f2_b')
     sg = signal_generator.SignalGenerator(
@@ -120,11 +123,12 @@ def generate_signal(df, f1_lookback=None, f1_b=None, f2_lookback=None, f2_b=None
             wait=wait,
             binary=binary
         ),
+        rules_cache=rules_cache,
     )
     return sg.generate()
 
 
-def optimize():
+def optimize(n_jobs=None, resume=False):
     data_collector = gpw_data.GPWData()
     symbol = 'CCC'
     pricing_data = {
@@ -154,6 +158,10 @@ def optimize():
         position_sizer=position_sizer,
         init_capital=10000,
         results_path='/Users/slaw/osobiste/trading/filter_rule_opt_results_all.csv',
+        n_jobs=n_jobs,
+        chunk_size=16,
+        resume=resume,
+        rules_cache=signal_generator.RulesCache(),
     )
 
 
@@ -189,8 +197,10 @@ if __name__ == '__main__':
     parser = commons.get_parser()
     parser.add_argument('--days', '-d', type=int, default=-1, help='number of days to run backtester for')
     parser.add_argument('--optimize', '-o', action='store_true', help='run optimization')
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='number of processes used for optimization')
+    parser.add_argument('--resume', '-r', action='store_true', help='resume optimization from results file')
     args = parser.parse_args()
     if args.optimize:
-        optimize()
+        optimize(n_jobs=args.jobs, resume=args.resume)
     else:
         run_strategy(args.days, args.debug)
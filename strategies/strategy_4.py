@@ -19,7 +19,7 @@ logger.addHandler(fh)
 # custom
 from lse_data import LSEData
 from backtester import Backtester
-from signal_generator import SignalGenerator
+from signal_generator import SignalGenerator, compile_config
 from position_size import FixedRisk
 
 import results
@@ -156,11 +156,12 @@ def main():
         universe[sym] = helpers.on_balance_volume_indicator(df)
 
     signals = {}
+    plan = compile_config(long_only_s4_config)
     for sym, df in universe.items():
         print('Processing: ', sym)
         signals[sym] = SignalGenerator(
             df = universe[sym],
-            config = long_only_s4_config
+            plan = plan,
         ).generate()
 
     print('All symbols generated. Moving to backtest')
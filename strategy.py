@@ -1,6 +1,9 @@
 # built-in
+import ast
+import concurrent.futures
 import csv
 import itertools
+import os
 import traceback
 
 # custom
@@ -10,12 +13,21 @@ import results
 
 
 def optimize_strategy(
-        data=None, signal_gen_func=None, strategy_args=None, strategy_kwargs=None, 
+        data=None, signal_gen_func=None, strategy_args=None, strategy_kwargs=None,
         position_sizer=None, init_capital=None, optimize_for='sharpe', show_all=False,
-        logger=None, debug=None, results_path=None
+        logger=None, debug=None, results_path=None, n_jobs=None, chunk_size=1, resume=False, rules_cache=None,
     ):
     """
-    
+    Generates signals with *signal_gen_func* for all combinations of *strategy_args* and *strategy_kwargs*, backtests
+    them and returns the best one according to *optimize_for* metric (or all of them sorted if *show_all*).
+
+    *n_jobs* - if bigger than 1, combinations are distributed across process pool with that many workers. Each task
+        sent to a worker has *chunk_size* combinations. *signal_gen_func* has to be picklable (module level function).
+    *results_path* - csv file to which results are written as soon as given combination finishes
+    *resume* - if True and *results_path* exists, combinations already present there are not run again (they are
+        still included in the output)
+    *rules_cache* - signal_generator.RulesCache. If given it is passed to *signal_gen_func* as *rules_cache* kwarg, so
+        simple rules shared by different combinations are computed only once (each worker has its own copy)
     """
     log = commons.setup_logging(logger=logger, debug=debug)
     options = {}
@@ -32,33 +44,200 @@ def optimize_strategy(
     # execute strategy for each comibinations
     all_metrics = []
     if results_path:
-        fh = open(results_path, 'w')
-        writer = csv.writer(fh)
-        writer.writerow([all_names])
-    for combination in combinations:
-        # unpack args and kwargs for each combination
-        args = [a for a in combination[:len(args_names)]]
-        kwargs = dict(zip(kwargs_names, combination[len(args_names):]))
-        try:
-            signals = {
-                symbol_key: signal_gen_func(symbol_data, *args, **kwargs)
-                for symbol_key, symbol_data in data.items() if not symbol_data.empty
-            }
-            backtest = backtester.Backtester(signals, position_sizer=position_sizer, init_capital=init_capital)
-            res, trades = backtest.run()
-            metrics = results.evaluate(res, trades)
+        done = {}
+        if resume and os.path.exists(results_path):
+            done, valid_size = _read_results(results_path, all_names)
+            log.info('Resuming optimization. {} combinations already done'.format(len(done)))
+            all_metrics = [(all_names, combination, metrics) for combination, metrics in done.items()]
+            combinations = (c for c in combinations if c not in done)
+            fh = open(results_path, 'a')
+            # drop incomplete last row (if any), so new rows are not appended to it
+            fh.truncate(valid_size)
+            writer = csv.writer(fh)
+        else:
+            valid_size = 0
+            fh = open(results_path, 'w')
+            writer = csv.writer(fh)
+        if valid_size == 0:
+            # flushed right away, so file can be resumed even if run is killed before first result
+            writer.writerow([all_names])
+            fh.flush()
+    runner = _SweepRunner(
+        data, signal_gen_func, len(args_names), kwargs_names, position_sizer, init_capital, rules_cache
+    )
+    workers_cache_stats = {}
+    if n_jobs and n_jobs > 1:
+        chunks_results = _run_parallel(runner, combinations, n_jobs, chunk_size, workers_cache_stats)
+    else:
+        chunks_results = (runner.run_chunk([combination]) for combination in combinations)
+    for chunk_results in chunks_results:
+        for combination, metrics, err in chunk_results:
+            if err:
+                log.warning('Not able to run optimization for: {combination}{names}. Got following exception:\n{err}'.format(
+                    combination=combination, names=all_names, err=err
+                ))
+                continue
             if results_path:
-                writer.writerow([combination, metrics, metrics[optimize_for]])
-        except Exception:
-            log.warning('Not able to run optimization for: {combination}{names}. Got following exception:\n{err}'.format(
-                combination=combination, names=all_names, err=traceback.format_exc()
-            ))
-            continue
-        all_metrics.append((all_names, combination, metrics))
+                writer.writerow([combination, _to_builtin(metrics), metrics[optimize_for]])
+                fh.flush()
+            all_metrics.append((all_names, combination, metrics))
     all_metrics = sorted(all_metrics, key=lambda x: x[2][optimize_for], reverse=True)
     if results_path:
         fh.close()
+    if rules_cache is not None:
+        if workers_cache_stats:
+            hits = sum(h for h, _ in workers_cache_stats.values())
+            misses = sum(m for _, m in workers_cache_stats.values())
+        else:
+            hits, misses = rules_cache.hits, rules_cache.misses
+        log.info('Rules cache: {} hits, {} misses (hit rate: {}%)'.format(
+            hits, misses, round(100*hits/max(hits+misses, 1), 1)
+        ))
     if show_all:
         return all_metrics
     return all_metrics[0]
 
+
+class _SweepRunner():
+    """Runs signal generation + backtest + evaluation for chunks of combinations (in main process or in workers)."""
+    def __init__(self, data, signal_gen_func, no_args, kwargs_names, position_sizer, init_capital, rules_cache=None):
+        self.data = data
+        self.signal_gen_func = signal_gen_func
+        self.no_args = no_args
+        self.kwargs_names = kwargs_names
+        self.position_sizer = position_sizer
+        self.init_capital = init_capital
+        self.rules_cache = rules_cache
+
+    def run_chunk(self, chunk):
+        """Returns list of (combination, metrics, error). Exceptions are returned as formatted traceback."""
+        output = []
+        for combination in chunk:
+            # unpack args and kwargs for each combination
+            args = [a for a in combination[:self.no_args]]
+            kwargs = dict(zip(self.kwargs_names, combination[self.no_args:]))
+            if self.rules_cache is not None:
+                kwargs['rules_cache'] = self.rules_cache
+            try:
+                signals = {
+                    symbol_key: self.signal_gen_func(symbol_data, *args, **kwargs)
+                    for symbol_key, symbol_data in self.data.items() if not symbol_data.empty
+                }
+                backtest = backtester.Backtester(
+                    signals, position_sizer=self.position_sizer, init_capital=self.init_capital
+                )
+                res, trades = backtest.run()
+                output.append((combination, results.evaluate(res, trades), None))
+            except Exception:
+                output.append((combination, None, traceback.format_exc()))
+        return output
+
+
+# runner used by process pool workers. data is sent to each worker only once (while initializing it)
+_WORKER_RUNNER = None
+
+
+def _init_sweep_worker(runner):
+    global _WORKER_RUNNER
+    _WORKER_RUNNER = runner
+
+
+def _run_chunk_in_worker(chunk):
+    """Returns chunk results and (pid, hits, misses) of worker rules cache (counts are cumulative per worker)."""
+    output = _WORKER_RUNNER.run_chunk(chunk)
+    cache = _WORKER_RUNNER.rules_cache
+    if cache is None:
+        return output, None
+    return output, (os.getpid(), cache.hits, cache.misses)
+
+
+def _run_parallel(runner, combinations, n_jobs, chunk_size, cache_stats=None):
+    """
+    Yields chunks results as soon as they are done. Only limited number of chunks is submitted at once, so
+    combinations are not all materialized for big grids. Latest rules cache stats of each worker are stored in
+    *cache_stats* dict ({pid: (hits, misses)}).
+    """
+    chunks = _chunked(combinations, chunk_size)
+    max_in_flight = n_jobs*4
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=n_jobs, initializer=_init_sweep_worker, initargs=(runner,)
+        ) as executor:
+        in_flight = set()
+        for chunk in itertools.islice(chunks, max_in_flight):
+            in_flight.add(executor.submit(_run_chunk_in_worker, chunk))
+        while in_flight:
+            done, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    in_flight.add(executor.submit(_run_chunk_in_worker, chunk))
+                output, worker_stats = future.result()
+                if worker_stats is not None and cache_stats is not None:
+                    pid, hits, misses = worker_stats
+                    # counts are cumulative, so keep the biggest ones (futures may complete out of order)
+                    prev_hits, prev_misses = cache_stats.get(pid, (0, 0))
+                    cache_stats[pid] = (max(hits, prev_hits), max(misses, prev_misses))
+                yield output
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _to_builtin(metrics):
+    """Converts numpy scalars to python ones, so they can be read back from results file."""
+    return {k: v.item() if hasattr(v, 'item') else v for k, v in metrics.items()}
+
+
+class _SpecialFloats(ast.NodeTransformer):
+    """Replaces nan and inf names (repr of float nan/inf) with constants."""
+    def visit_Name(self, node):
+        if node.id in ('nan', 'inf'):
+            return ast.copy_location(ast.Constant(float(node.id)), node)
+        return node
+
+
+def _parse_value(text):
+    """Parses python literal written to results file (tuple of parameters, dict of metrics)."""
+    tree = _SpecialFloats().visit(ast.parse(text, mode='eval'))
+    return ast.literal_eval(tree.body)
+
+
+def _read_results(results_path, all_names):
+    """
+    Reads results file written by optimize_strategy. Returns {combination: metrics} and size of the valid part of the
+    file. Last row is skipped if it's incomplete or can't be parsed (previous run was killed while writing it). Any
+    other invalid row raises ValueError. Empty file (or with incomplete header only) is treated as no results.
+    """
+    with open(results_path, 'r', newline='') as fh:
+        encoding = fh.encoding
+        lines = fh.readlines()
+    if not lines or (len(lines) == 1 and not lines[0].endswith('\n')):
+        return {}, 0
+    header = next(csv.reader(lines[:1]), None)
+    if header != [str(all_names)]:
+        raise ValueError('Cannot resume. Results file {} has different parameters: {} (expected: {})'.format(
+            results_path, header, all_names
+        ))
+    done = {}
+    valid_size = len(lines[0].encode(encoding))
+    for line_no, line in enumerate(lines[1:], start=2):
+        try:
+            if not line.endswith('\n'):
+                raise ValueError('incomplete row')
+            row = next(csv.reader([line]))
+            combination, metrics = _parse_value(row[0]), _parse_value(row[1])
+        except (ValueError, TypeError, SyntaxError, IndexError, csv.Error) as e:
+            if line_no == len(lines):
+                break
+            raise ValueError('Cannot resume. Row {} of results file {} cannot be parsed: {}'.format(
+                line_no, results_path, e
+            ))
+        done[combination] = metrics
+        valid_size += len(line.encode(encoding))
+    return done, valid_size
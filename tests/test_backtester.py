@@ -9,8 +9,11 @@ from position_size import (
 )
 from backtester import (
     AccountBankruptError,
+    ArrayBacktester,
     Backtester,
+    PortfolioBacktest,
 )
+from gpw_data import GPWData
 
 
 def signals_test_sigs_1():
@@ -188,6 +191,26 @@ def signals_test_long_short_same():
     return {'TEST_SHORT_LONG_SAME': pd.DataFrame(signals_data, index=pd.DatetimeIndex(dates))}
 
 
+def signals_gpw_ma_crossover(symbols=('CCC', 'KGHM', 'ALIOR'), start='2012-06-01', end='2014-06-01'):
+    """
+    Creates signals for real symbols from pricing_data. By default symbols do not share all dates (ALIOR has
+    debut in the middle of the period). Signals are long/short based on close price vs. 20 days moving average.
+    """
+    data = GPWData().load(symbols=list(symbols), from_csv=True, df=True)
+    signals = {}
+    for sym, df in data.items():
+        df = df.loc[start:end, ['open', 'high', 'low', 'close']].copy()
+        position = (df['close'] > df['close'].rolling(20).mean()).astype(int)
+        position[df['close'] < df['close'].rolling(20).mean()] = -1
+        prev_position = position.shift().fillna(0)
+        df.loc[:, 'entry_long'] = ((position == 1) & (prev_position != 1)).astype(int)
+        df.loc[:, 'exit_long'] = ((position != 1) & (prev_position == 1)).astype(int)
+        df.loc[:, 'entry_short'] = ((position == -1) & (prev_position != -1)).astype(int)
+        df.loc[:, 'exit_short'] = ((position != -1) & (prev_position == -1)).astype(int)
+        signals[sym] = df
+    return signals
+
+
 def max_first_encountered_alpha_sizer():
     """
     Returns MaxFirstEncountered position sizer with alphabetical sorting. That position sizer will decide
@@ -732,3 +755,96 @@ def test_functional_backtester_auto_stop_loss_2(backtester_auto_sl):
     assert(backtester_auto_sl._available_money == expected_available_money)
     assert(backtester_auto_sl._net_account_value[ds_key] == expected_nav)
     assert(expected_trades == trades)
+
+
+def assert_same_backtest_output(signals_func, **kwargs):
+    """Runs Backtester and ArrayBacktester on the same signals and compares results and trades."""
+    results, trades = Backtester(signals_func(), **kwargs).run()
+    arr_results, arr_trades = ArrayBacktester(signals_func(), **kwargs).run()
+    pd.testing.assert_frame_equal(results, arr_results)
+    assert(trades == arr_trades)
+
+
+@pytest.mark.parametrize('signals_func, sizer_func, init_capital', [
+    (signals_test_sigs_1, max_first_encountered_alpha_sizer, 500),
+    (signals_test_sigs_2, lambda: fixed_capital_perc_sizer(0.2), 1000000),
+    (signals_test_sigs_3, lambda: fixed_capital_perc_sizer(0.35), 400000),
+    (signals_gpw_ma_crossover, lambda: fixed_capital_perc_sizer(0.3), 100000),
+])
+def test_array_backtester_same_output(signals_func, sizer_func, init_capital):
+    assert_same_backtest_output(signals_func, position_sizer=sizer_func(), init_capital=init_capital)
+
+
+def test_array_backtester_same_output_stop_loss():
+    assert_same_backtest_output(
+        signals_test_stop_loss_1, position_sizer=max_first_encountered_alpha_sizer(), init_capital=500,
+        stop_loss=True,
+    )
+
+
+@pytest.mark.parametrize('signals_func, init_capital', [
+    (signals_test_auto_stop_loss_1, 500),
+    (signals_gpw_ma_crossover, 100000),
+])
+def test_array_backtester_same_output_auto_stop_loss(signals_func, init_capital):
+    assert_same_backtest_output(
+        signals_func, position_sizer=fixed_capital_perc_sizer(0.3), init_capital=init_capital, auto_stop_loss=0.05,
+    )
+
+
+def test_array_backtester_bankruptcy():
+    tester = ArrayBacktester(signals_test_sigs_2(), position_sizer=max_first_encountered_alpha_sizer(), init_capital=5000000)
+    with pytest.raises(AccountBankruptError):
+        tester.run()
+
+
+def signals_gpw_portfolio():
+    return signals_gpw_ma_crossover(
+        symbols=('CCC', 'KGHM', 'ALIOR', 'PKNORLEN', 'PKOBP', 'PZU', 'LPP', 'ORANGEPL'),
+        start='2010-01-01', end='2016-01-01',
+    )
+
+
+@pytest.mark.parametrize('signals_func, capital_perc, init_capital, test_days', [
+    (signals_test_sigs_2, 0.2, 1000000, None),
+    (signals_test_sigs_3, 0.35, 400000, None),
+    (signals_test_sigs_3, 0.35, 400000, 3),
+    (signals_gpw_ma_crossover, 0.3, 100000, None),
+    (signals_gpw_portfolio, 0.1, 100000, None),
+    (signals_gpw_portfolio, 0.15, 100000, 700),
+])
+def test_portfolio_backtest_vs_backtester(signals_func, capital_perc, init_capital, test_days):
+    results, trades = Backtester(
+        signals_func(), position_sizer=fixed_capital_perc_sizer(capital_perc), init_capital=init_capital,
+    ).run(test_days=test_days)
+    vec_results, vec_trades = PortfolioBacktest(
+        signals_func(), position_sizer=fixed_capital_perc_sizer(capital_perc), init_capital=init_capital,
+    ).run(test_days=test_days)
+    pd.testing.assert_frame_equal(results, vec_results)
+    assert(trades == vec_trades)
+
+
+@pytest.mark.parametrize('signals_func, sizer', [
+    (signals_test_sigs_2, max_first_encountered_alpha_sizer()),
+    (signals_gpw_portfolio, fixed_capital_perc_sizer(0.5)),
+])
+def test_portfolio_backtest_bankruptcy(signals_func, sizer):
+    tester = PortfolioBacktest(signals_func(), position_sizer=sizer, init_capital=100000)
+    with pytest.raises(AccountBankruptError):
+        tester.run()
+
+
+@pytest.mark.parametrize('tester_class', [Backtester, ArrayBacktester])
+def test_debug_messages_do_not_change_output(tester_class):
+    results, trades = tester_class(
+        signals_test_sigs_3(), position_sizer=fixed_capital_perc_sizer(0.35), init_capital=400000,
+    ).run()
+    debug_tester = tester_class(
+        signals_test_sigs_3(), position_sizer=FixedCapitalPerc(capital_perc=0.35, debug=True), init_capital=400000,
+        debug=True,
+    )
+    assert(debug_tester._debug == True)
+    assert(debug_tester.position_sizer._debug == True)
+    debug_results, debug_trades = debug_tester.run()
+    pd.testing.assert_frame_equal(results, debug_results)
+    assert(trades == debug_trades)
@@ -0,0 +1,51 @@
+# 3rd party
+import numpy as np
+import pytest
+
+# custom
+import candles
+
+
+@pytest.fixture()
+def dict_arrs():
+    return {
+        'open': [3.6, 3.5, 3.47, 3.73, 3.85],
+        'high': [3.6, 3.59, 3.71, 3.88, 3.92],
+        'low': [3.42, 3.4, 3.42, 3.72, 3.53],
+        'close': [3.48, 3.5, 3.68, 3.83, 3.55]
+    }
+
+
+def test_features(dict_arrs):
+    cdl = candles.features(dict_arrs)
+    assert(cdl['color'].tolist() == [candles.BLACK, candles.DOJI, candles.WHITE, candles.WHITE, candles.BLACK])
+    assert(np.allclose(cdl['body'], [0.12, 0, 0.21, 0.1, 0.3]))
+    assert(np.allclose(cdl['upper_shadow'], [0, 0.09, 0.03, 0.05, 0.07]))
+    assert(np.allclose(cdl['lower_shadow'], [0.06, 0.1, 0.05, 0.01, 0.02]))
+
+
+def test_shift(dict_arrs):
+    cdl = candles.shift(candles.features(dict_arrs), 2)
+    assert(cdl['color'].tolist() == [0, 0, candles.BLACK, candles.DOJI, candles.WHITE])
+    assert(np.isnan(cdl['close'][:2]).all())
+    assert(cdl['close'][2:].tolist() == [3.48, 3.5, 3.68])
+
+
+def test_rolling_mean_std():
+    arr = np.array([1., 5., 2., 8., 3.])
+    mean, std = candles.rolling_mean_std(arr, 3)
+    assert(np.isnan(mean[:2]).all() and np.isnan(std[:2]).all())
+    for idx in range(2, 5):
+        assert(mean[idx] == arr[idx-2:idx+1].mean())
+        assert(std[idx] == arr[idx-2:idx+1].std())
+    # empty window
+    assert(np.isnan(candles.rolling_mean_std(arr, 0)[0]).all())
+
+
+def test_engulfing_scalars_and_arrays(dict_arrs):
+    cdl = candles.features(dict_arrs)
+    # bearish engulfing on the last two candles
+    assert(candles.engulfing(candles.select(cdl, -2), candles.select(cdl, -1), 1) == -1)
+    assert(candles.engulfing(candles.select(cdl, -2), candles.select(cdl, -1), -1) == 0)
+    test = candles.engulfing(candles.shift(cdl, 1), cdl, np.ones(5))
+    assert(test.tolist() == [0, 0, 0, 0, -1])
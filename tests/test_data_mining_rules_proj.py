@@ -0,0 +1,263 @@
+# built in
+import io
+import os
+import pickle
+
+# 3rd party
+import numpy as np
+import pandas as pd
+import pytest
+
+# custom
+from gpw_data import GPWData
+import strategies.data_mining_rules_proj as dmr
+
+
+SYMBOLS = ['11BIT', 'AAL']
+
+
+@pytest.fixture(scope='module')
+def pricing_data():
+    dc = GPWData(pricing_data_path='pricing_data', use_cache=False)
+    return {symbol: dc.load(symbols=symbol, df=True).iloc[-250:].copy() for symbol in SYMBOLS}
+
+
+@pytest.fixture(scope='module')
+def configs():
+    configs = dmr.filter_rules()[:5]
+    reversed_configs = []
+    for conf in configs:
+        conf_copy = pickle.loads(pickle.dumps(conf, -1))
+        conf_copy['strategy']['reversed'] = True
+        conf_copy['strategy']['strategy_id'] = dmr.REVERSED_RULE_PREFIX + conf['strategy']['strategy_id']
+        reversed_configs.append(conf_copy)
+    return configs + reversed_configs
+
+
+def _run(tmpdir, pricing_data, configs, symbols=SYMBOLS, **kwargs):
+    out = io.StringIO()
+    dmr.run_data_mining(
+        symbols=symbols,
+        pricing_data=pricing_data,
+        configs=configs,
+        no_samples=50,
+        output_path=str(tmpdir),
+        chunk_size=4,
+        out=out,
+        **kwargs
+    )
+    return out.getvalue()
+
+
+def _results(tmpdir, symbol):
+    with open(os.path.join(str(tmpdir), symbol, f'{symbol}.pickle'), 'rb') as fh:
+        return pickle.load(fh)
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_run_data_mining(tmpdir, pricing_data, configs, n_jobs):
+    progress = _run(tmpdir, pricing_data, configs, n_jobs=n_jobs)
+    # 3 chunks of signals + results for each symbol
+    assert('8/8' in progress)
+    for symbol in SYMBOLS:
+        results = _results(tmpdir, symbol)
+        assert(sorted(results['avg_daily_returns'].keys()) == sorted(c['strategy']['strategy_id'] for c in configs))
+        assert(len(results['wrc_dist']) == 50)
+        assert(len(os.listdir(os.path.join(str(tmpdir), symbol, 'final'))) == len(configs))
+        assert(len(os.listdir(os.path.join(str(tmpdir), symbol, 'progress'))) == 3)
+
+
+def test_run_data_mining_same_as_symbol_data_mining(tmpdir, pricing_data, configs):
+    _run(tmpdir, pricing_data, configs, n_jobs=2)
+    expected = dmr.data_mine_symbol(
+        symbol='AAL',
+        pricing_data=pricing_data,
+        configs=configs,
+        no_samples=50,
+        output_path=str(tmpdir.mkdir('expected')),
+        progressbar=False,
+    )
+    assert(_results(tmpdir, 'AAL')['avg_daily_returns'] == expected['avg_daily_returns'])
+
+
+def test_run_data_mining_restart(tmpdir, pricing_data, configs):
+    _run(tmpdir, pricing_data, configs, n_jobs=1)
+    # interrupted run - results of one symbol are missing, signals of one chunk are not done
+    os.remove(os.path.join(str(tmpdir), 'AAL', 'AAL.pickle'))
+    progress_dir = os.path.join(str(tmpdir), 'AAL', 'progress')
+    os.remove(os.path.join(progress_dir, sorted(os.listdir(progress_dir))[0]))
+    final_dir = os.path.join(str(tmpdir), 'AAL', 'final')
+    signal_files = sorted(os.listdir(final_dir))
+    os.remove(os.path.join(final_dir, signal_files[-1]))
+    mtimes = {f: os.stat(os.path.join(final_dir, f)).st_mtime_ns for f in signal_files[:-1]}
+
+    progress = _run(tmpdir, pricing_data, configs, n_jobs=1)
+    # 11BIT and 2 chunks of AAL are skipped
+    assert(progress.startswith('[' + '#' * int(60 * 6 / 8)))
+    assert('8/8' in progress)
+    assert(sorted(os.listdir(final_dir)) == signal_files)
+    assert(mtimes == {f: os.stat(os.path.join(final_dir, f)).st_mtime_ns for f in signal_files[:-1]})
+    assert(len(_results(tmpdir, 'AAL')['avg_daily_returns']) == len(configs))
+
+
+def test_run_data_mining_changed_configs(tmpdir, pricing_data, configs):
+    _run(tmpdir, pricing_data, configs[:5], n_jobs=1)
+    os.remove(os.path.join(str(tmpdir), 'AAL', 'AAL.pickle'))
+    # markers of chunks with different configs are not reused
+    _run(tmpdir, pricing_data, configs, n_jobs=1)
+    assert(len(_results(tmpdir, 'AAL')['avg_daily_returns']) == len(configs))
+    assert(len(_results(tmpdir, '11BIT')['avg_daily_returns']) == 5)
+
+
+def test_run_data_mining_longer_pricing_data(tmpdir, pricing_data, configs):
+    _run(tmpdir, pricing_data, configs[:3], n_jobs=1)
+    os.remove(os.path.join(str(tmpdir), 'AAL', 'AAL.pickle'))
+    aal_df = GPWData(pricing_data_path='pricing_data', use_cache=False).load(symbols='AAL', df=True)
+    longer_data = dict(pricing_data, AAL=aal_df.iloc[-260:].copy())
+    # stored rules results are not valid for the new data
+    with pytest.raises(ValueError):
+        _run(tmpdir, longer_data, configs[:3], n_jobs=1)
+    _run(tmpdir, longer_data, configs[:3], n_jobs=1, run_and_overwrite=True)
+    assert(len(_results(tmpdir, 'AAL')['avg_daily_returns']) == 3)
+    final_dir = os.path.join(str(tmpdir), 'AAL', 'final')
+    for file_name in os.listdir(final_dir):
+        with open(os.path.join(final_dir, file_name), 'rb') as fh:
+            assert(len(pickle.load(fh).index) == len(longer_data['AAL'].index))
+    assert(dmr.rules_store.RulesStore(os.path.join(str(tmpdir), 'AAL', 'rules')).days == 260)
+
+
+@pytest.fixture(scope='module')
+def random_pricing_data():
+    rng = np.random.default_rng(0)
+    close = np.exp(np.cumsum(rng.normal(scale=0.02, size=400))) * 100
+    df = pd.DataFrame(
+        {
+            'open': close * (1 + rng.normal(scale=0.005, size=400)),
+            'high': close * 1.02,
+            'low': close * 0.98,
+            'close': close,
+            'volume': rng.integers(1000, 10000, size=400),
+        },
+        index=pd.date_range('2018-01-01', periods=400, freq='B', name='date'),
+    )
+    return {'RND': df}
+
+
+@pytest.fixture(scope='module')
+def complex_configs():
+    configs = dmr.ConfigSpace([('filter', dmr.filter_rules()), ('ma', dmr.ma_rules())])
+    no_basic = len(configs.basic_configs)
+    combined = configs[no_basic:no_basic+1]
+    reversed_combined = configs[2*no_basic+configs.no_combined:2*no_basic+configs.no_combined+1]
+    # learning config and its reversed version
+    learning = configs[2*(no_basic+configs.no_combined):2*(no_basic+configs.no_combined)+2]
+    # basic configs with (shorter lookback) rules which are also sampled in combined config. before and after it,
+    # so rules results stored by one are loaded by the other
+    combined_rules = {rule['id'] for rule in combined[0]['rules']}
+    basic = [
+        conf for conf in configs.basic_configs
+        if any(rule['id'] in combined_rules and rule['lookback'] < 56 for rule in conf['rules'])
+    ][:2]
+    return basic[:1] + combined + basic[1:] + reversed_combined + learning
+
+
+def _expected_signal(pricing_data, configs, conf):
+    features_df = dmr.prepare_features(pricing_data['RND'], configs)
+    return dmr.signal_generator.SignalGenerator(df=features_df, config=conf).generate()
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_run_data_mining_complex_configs(tmpdir, random_pricing_data, complex_configs, n_jobs):
+    assert([conf['strategy']['strategy_id'] for conf in complex_configs][3:] == [
+        'reversed_CPX_COM_filter_nr20_v0',
+        'CPX_LRN_filter_m5_r5_voting', 'reversed_CPX_LRN_filter_m5_r5_voting',
+    ])
+    _run(tmpdir, random_pricing_data, complex_configs, symbols=['RND'], n_jobs=n_jobs)
+    final_dir = os.path.join(str(tmpdir), 'RND', 'final')
+    for conf in complex_configs:
+        with open(os.path.join(final_dir, 'RND_' + conf['strategy']['strategy_id']), 'rb') as fh:
+            signal = pickle.load(fh)
+        expected_signal = _expected_signal(random_pricing_data, complex_configs, conf)
+        pd.testing.assert_frame_equal(signal, expected_signal, check_dtype=False)
+    results = _results(tmpdir, 'RND')
+    assert(len(results['avg_daily_returns']) == len(complex_configs))
+    # restart - signals are generated again from stored rules results (of configs with different lookbacks)
+    os.remove(os.path.join(str(tmpdir), 'RND', 'RND.pickle'))
+    for file_name in os.listdir(final_dir):
+        os.remove(os.path.join(final_dir, file_name))
+    progress_dir = os.path.join(str(tmpdir), 'RND', 'progress')
+    for file_name in os.listdir(progress_dir):
+        os.remove(os.path.join(progress_dir, file_name))
+    _run(tmpdir, random_pricing_data, complex_configs, symbols=['RND'], n_jobs=n_jobs)
+    assert(_results(tmpdir, 'RND')['avg_daily_returns'] == results['avg_daily_returns'])
+
+
+def test_prepare_features_same_as_per_config(pricing_data):
+    input_df = pricing_data['AAL']
+    configs = dmr.oba_rules() + dmr.msp_rules() + dmr.msv_rules()
+    features_df = dmr.prepare_features(input_df, configs)
+    assert(list(features_df.columns[:len(input_df.columns)]) == list(input_df.columns))
+    for ts in dmr.required_ts_names(configs):
+        assert(ts in features_df.columns)
+    for conf in configs[::7]:
+        strategy_id = conf['strategy']['strategy_id']
+        expected_df = dmr._prepare_strategy_dataframe(
+            strategy_id, input_df.copy(), [rule['id'] for rule in conf['rules']]
+        )
+        for ts in dmr.required_ts_names([conf]):
+            pd.testing.assert_series_equal(features_df[ts], expected_df[ts], check_names=False)
+    # input is not modified
+    assert(list(input_df.columns) == ['open', 'high', 'low', 'close', 'volume'])
+
+
+def test_prepare_features_unknown_ts(pricing_data):
+    conf = {'rules': [{'id': 'a', 'type': 'simple', 'ts': 'close_unknown', 'lookback': 1}]}
+    with pytest.raises(AttributeError):
+        dmr.prepare_features(pricing_data['AAL'], [conf])
+
+
+@pytest.fixture(scope='module')
+def class_configs():
+    return [
+        ('filter', dmr.filter_rules()[:60]),
+        ('ma', dmr.ma_rules()[:50]),
+        ('cdl', dmr.cdl_rules()),
+    ]
+
+
+def test_config_space_same_as_list(class_configs):
+    expected = dmr._merge_final_configs_list(class_configs)
+    configs = dmr.ConfigSpace(class_configs)
+    assert(len(configs) == len(expected))
+    assert(list(configs) == expected)
+    # any slice can be built on its own
+    assert(configs[500:520] == expected[500:520])
+    assert(configs[-3:] == expected[-3:])
+    assert(configs[-1] == expected[-1])
+    with pytest.raises(IndexError):
+        configs[len(expected)]
+
+
+def test_config_space_describe(class_configs):
+    configs = dmr.ConfigSpace(class_configs)
+    no_basic = len(configs.basic_configs)
+    assert(configs.describe(0) == ('basic', 0, False))
+    assert(configs.describe(no_basic)[:4] == ('combined', ('filter',), 20, 0))
+    reversed_conf = configs[no_basic + configs.no_combined]
+    assert(reversed_conf['strategy']['reversed'])
+    assert(reversed_conf['rules'] is configs.basic_configs[0]['rules'])
+    assert(configs.basic_configs[0]['strategy'].get('reversed') is None)
+    # small enough to be sent to workers
+    assert(pickle.loads(pickle.dumps(configs))[-20:] == configs[-20:])
+
+
+def test_config_space_size():
+    configs = dmr.merge_final_configs(
+        dmr.filter_rules(), dmr.support_resistance_rules(), dmr.ma_rules(), dmr.cb_rules(), dmr.oba_rules(),
+        dmr.msp_rules(), dmr.msv_rules(), dmr.cdl_rules(),
+    )
+    assert(len(configs) == 59132)
+    assert(configs[-1]['strategy']['strategy_id'] == (
+        'reversed_CPX_LRN_filter_support_resistance_ma_cb_oba_msp_msv_cdl_m120_r20_avg_log_returns_held_only'
+    ))
+    assert(len(configs[-1]['rules']) == 8 * 20)
@@ -76,3 +76,31 @@ def test_detrend_list():
     ]
     mean_change = sum(adj_price_changes)/len(adj_price_changes)
     assert pytest.approx(mean_change) == 0
+
+
+@pytest.mark.parametrize('df', [True, False])
+def test_detrend_same_as_reference(df):
+    gpw_data = GPWData()
+    data = gpw_data.load(symbols='CCC', df=df)
+    test_data = gpw_data.detrend(data)
+    expected_data = gpw_data._detrend_reference(data)
+    if df:
+        assert(list(test_data.columns) == list(expected_data.columns))
+        assert_frame_equal(test_data, expected_data)
+    else:
+        assert(len(test_data) == len(expected_data))
+        for test_row, expected_row in zip(test_data, expected_data):
+            assert(test_row[:6] == expected_row[:6])
+            assert(test_row[6:] == pytest.approx(expected_row[6:]))
+
+
+def test_detrend_dict():
+    gpw_data = GPWData()
+    data = gpw_data.load(symbols=['CCC', 'AAL'])
+    data['AAL_list'] = gpw_data.load(symbols='AAL', df=False)
+    test_data = gpw_data.detrend(data)
+    assert(sorted(test_data.keys()) == ['AAL', 'AAL_list', 'CCC'])
+    assert_frame_equal(test_data['CCC'], gpw_data.detrend(data['CCC']))
+    assert(test_data['AAL_list'] == gpw_data.detrend(data['AAL_list']))
+    # input is not modified
+    assert('adj_close' not in data['CCC'].columns)
@@ -0,0 +1,116 @@
+# built in
+import os
+
+# 3rd party
+import pandas as pd
+import pytest
+
+pytest.importorskip('investpy')
+pytest.importorskip('dateparser')
+
+# custom
+from lse_data import (
+    JOURNAL_SUFFIX,
+    LSEData,
+)
+
+
+HEADER = 'date,open,high,low,close,volume\r\n'
+
+
+def _investpy_df(rows):
+    """DataFrame in investpy.get_stock_historical_data format from [date, open, high, low, close, volume] rows."""
+    df = pd.DataFrame(rows, columns=['Date', 'Open', 'High', 'Low', 'Close', 'Volume'])
+    df.set_index(pd.DatetimeIndex(df['Date']), inplace=True)
+    df.drop('Date', axis=1, inplace=True)
+    df['Currency'] = 'GBP'
+    return df
+
+
+@pytest.fixture()
+def lse_data(tmpdir):
+    lse_data = LSEData(pricing_data_path=str(tmpdir), min_interval=0)
+    lse_data.requested_from_dates = []
+
+    def _mock_historical_data(symbol, from_date=None):
+        lse_data.requested_from_dates.append(from_date)
+        rows = [
+            ['2020-01-02', 1.0, 2.0, 0.5, 1.5, 100],
+            ['2020-01-03', 1.5, 2.5, 1.0, 2.0, 200],
+            ['2020-01-06', 2.0, 3.0, 1.5, 2.5, 300],
+        ]
+        return _investpy_df([row for row in rows if from_date is None or row[0] >= from_date])
+
+    lse_data._get_stock_historical_data = _mock_historical_data
+    return lse_data
+
+
+def _write(path, content):
+    with open(path, 'w', newline='') as fh:
+        fh.write(content)
+
+
+def _read(path):
+    with open(path, 'r', newline='') as fh:
+        return fh.read()
+
+
+def test_incremental_replaces_last_session(lse_data):
+    path = lse_data._output_path('TEST')
+    # last session was saved before the close
+    _write(path, HEADER + '2019-12-31,0.5,1.0,0.5,1.0,50\r\n2020-01-02,1.0,1.2,0.5,1.1,10\r\n')
+    lse_data.incremental_download_to_csv(symbols=['TEST'])
+    assert(lse_data.requested_from_dates == ['2020-01-02'])
+    assert(_read(path) == (
+        HEADER
+        + '2019-12-31,0.5,1.0,0.5,1.0,50\r\n'
+        + '2020-01-02,1.0,2.0,0.5,1.5,100\r\n'
+        + '2020-01-03,1.5,2.5,1.0,2.0,200\r\n'
+        + '2020-01-06,2.0,3.0,1.5,2.5,300\r\n'
+    ))
+    assert(not os.path.exists(path + JOURNAL_SUFFIX))
+    # nothing new
+    lse_data.incremental_download_to_csv(symbols=['TEST'])
+    assert(lse_data.load(symbols='TEST', from_csv=True, df=True)['close'].tolist() == [1.0, 1.5, 2.0, 2.5])
+
+
+def test_incremental_partially_written_row(lse_data):
+    path = lse_data._output_path('TEST')
+    _write(path, HEADER + '2020-01-02,1.0,2.0,0.5,1.5,100\r\n2020-01-03,1.5,2')
+    lse_data.incremental_download_to_csv(symbols=['TEST'])
+    assert(_read(path) == (
+        HEADER
+        + '2020-01-02,1.0,2.0,0.5,1.5,100\r\n'
+        + '2020-01-03,1.5,2.5,1.0,2.0,200\r\n'
+        + '2020-01-06,2.0,3.0,1.5,2.5,300\r\n'
+    ))
+
+
+def test_incremental_recovers_interrupted_update(lse_data):
+    path = lse_data._output_path('TEST')
+    content = HEADER + '2020-01-02,1.0,2.0,0.5,1.5,100\r\n'
+    # journal saved, but process died while replacing the tail
+    _write(path, content + '2020-01-03,1.5')
+    _write(path + JOURNAL_SUFFIX, '{"offset": %d, "tail": "2020-01-03,1.5,2.5,1.0,2.0,200\\r\\n"}' % len(content))
+    lse_data.incremental_download_to_csv(symbols=['TEST'])
+    assert(lse_data.requested_from_dates == ['2020-01-03'])
+    assert(_read(path) == (
+        content
+        + '2020-01-03,1.5,2.5,1.0,2.0,200\r\n'
+        + '2020-01-06,2.0,3.0,1.5,2.5,300\r\n'
+    ))
+    assert(not os.path.exists(path + JOURNAL_SUFFIX))
+
+
+def test_incremental_missing_file(lse_data):
+    lse_data.incremental_download_to_csv(symbols=['TEST'])
+    assert(lse_data.requested_from_dates == [None])
+    assert(len(lse_data.load(symbols='TEST', from_csv=True, df=True).index) == 3)
+
+
+def test_read_last_row_small_blocks(lse_data):
+    path = lse_data._output_path('TEST')
+    _write(path, HEADER + '2020-01-02,1.0,2.0,0.5,1.5,100\r\n')
+    start, end, row = lse_data._read_last_row(path, block_size=3)
+    assert((start, end) == (len(HEADER), os.path.getsize(path)))
+    assert(row == ['2020-01-02', '1.0', '2.0', '0.5', '1.5', '100'])
@@ -0,0 +1,190 @@
+# built in
+from collections import defaultdict
+import csv
+import http.server
+import json
+import os
+import threading
+import time
+import urllib
+
+# 3rd party
+import pytest
+import requests
+
+# custom
+from gpw_data import GPWData
+from price_collector import (
+    bulk_download,
+    BulkDownloadError,
+    PriceCollector,
+    RateLimiter,
+    retry_with_backoff,
+)
+
+
+# 2020-01-02, 2020-01-03 (ms)
+MOCK_TS = [1577923200000, 1578009600000]
+
+
+class _MockBankierHandler(http.server.BaseHTTPRequestHandler):
+    """Mimics /new-charts/get-data of bankier.pl. Symbols starting with FAIL return *failures* 503s first."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        symbol = params.get('symbol')
+        server = self.server
+        with server.lock:
+            server.requests[symbol] += 1
+            server.connections.add(self.client_address)
+            no_request = server.requests[symbol]
+        if url.path != '/new-charts/get-data' or symbol == 'MISSING':
+            return self._send(404, b'not found')
+        if symbol.startswith('FAIL') and no_request <= server.failures:
+            return self._send(503, b'unavailable')
+        base = 10 if symbol == 'A' else 20
+        data = {
+            'main': [[ts, base + i, base + i + 2, base + i - 1, base + i + 1] for i, ts in enumerate(MOCK_TS)],
+            'volume': [[ts, 100 * (i + 1)] for i, ts in enumerate(MOCK_TS)],
+        }
+        self._send(200, json.dumps(data).encode())
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def mock_server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _MockBankierHandler)
+    server.lock = threading.Lock()
+    server.requests = defaultdict(int)
+    server.connections = set()
+    server.failures = 2
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def collector(mock_server):
+    return PriceCollector(
+        base_url='http://127.0.0.1:{}'.format(mock_server.server_address[1]),
+        min_interval=0,
+        backoff=0.01,
+    )
+
+
+def test_get_historical_data(collector):
+    prices = collector.get_historical_data('A')
+    assert(list(prices.items()) == [
+        ('2020-01-02', [10.0, 12.0, 9.0, 11.0, 100]),
+        ('2020-01-03', [11.0, 13.0, 10.0, 12.0, 200]),
+    ])
+
+
+def test_retry_of_temporary_errors(collector, mock_server):
+    prices = collector.get_historical_data('FAIL_1')
+    assert(len(prices) == 2)
+    assert(mock_server.requests['FAIL_1'] == 3)
+    collector.max_retries = 1
+    with pytest.raises(requests.HTTPError):
+        collector.get_historical_data('FAIL_2')
+    assert(mock_server.requests['FAIL_2'] == 2)
+
+
+def test_no_retry_of_client_errors(collector, mock_server):
+    with pytest.raises(requests.HTTPError):
+        collector.get_historical_data('MISSING')
+    assert(mock_server.requests['MISSING'] == 1)
+
+
+def test_session_reuses_connections(collector, mock_server):
+    for _ in range(5):
+        collector.get_historical_data('A')
+    assert(len(mock_server.connections) == 1)
+
+
+def test_download_data_to_csv(tmpdir, collector, mock_server):
+    gpw_data = GPWData(pricing_data_path=str(tmpdir))
+    gpw_data.collector = collector
+    symbols = ['A', 'B', 'FAIL_1', 'FAIL_2']
+    gpw_data.download_data_to_csv(symbols=symbols, max_workers=4)
+    for symbol in symbols:
+        with open(os.path.join(str(tmpdir), f'{symbol}_pricing.csv'), 'r') as fh:
+            rows = list(csv.reader(fh))
+        assert(rows[0] == gpw_data.column_names)
+        assert(len(rows) == 3)
+    df = gpw_data.load(symbols='A', from_csv=True, df=True)
+    assert(df['close'].tolist() == [11.0, 12.0])
+    assert(df['volume'].tolist() == [100, 200])
+
+
+def test_download_data_to_csv_with_failures(tmpdir, collector):
+    gpw_data = GPWData(pricing_data_path=str(tmpdir))
+    gpw_data.collector = collector
+    with pytest.raises(BulkDownloadError) as e:
+        gpw_data.download_data_to_csv(symbols=['A', 'MISSING', 'B'])
+    assert(list(e.value.errors.keys()) == ['MISSING'])
+    # other symbols are downloaded anyway
+    assert(sorted(os.listdir(str(tmpdir))) == ['A_pricing.csv', 'B_pricing.csv'])
+
+
+def test_bulk_download_parallel():
+    def _download(symbol):
+        time.sleep(0.2)
+        return symbol.lower()
+
+    t1 = time.monotonic()
+    results = bulk_download(['A', 'B', 'C', 'D'], _download, max_workers=4)
+    assert(time.monotonic() - t1 < 0.6)
+    assert(results == {'A': 'a', 'B': 'b', 'C': 'c', 'D': 'd'})
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(min_interval=0.05)
+    times = defaultdict(list)
+
+    def _request(key):
+        limiter.wait(key)
+        times[key].append(time.monotonic())
+
+    threads = [threading.Thread(target=_request, args=(key,)) for key in ['a']*4 + ['b']*2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for key, key_times in times.items():
+        key_times = sorted(key_times)
+        assert(all(t2 - t1 >= 0.045 for t1, t2 in zip(key_times, key_times[1:])))
+    # different keys are not limited by each other
+    assert(abs(min(times['a']) - min(times['b'])) < 0.04)
+
+
+def test_retry_with_backoff():
+    calls = []
+
+    def _func():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError('test')
+        return 'ok'
+
+    assert(retry_with_backoff(_func, (ConnectionError,), max_retries=2, backoff=0.001) == 'ok')
+    calls.clear()
+    with pytest.raises(ConnectionError):
+        retry_with_backoff(_func, (ConnectionError,), max_retries=1, backoff=0.001)
+    calls.clear()
+    with pytest.raises(ConnectionError):
+        retry_with_backoff(_func, (ValueError,), max_retries=2, backoff=0.001)
+    assert(len(calls) == 1)
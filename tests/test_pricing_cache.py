@@ -0,0 +1,87 @@
+# built in
+import os
+import shutil
+
+# 3rd party
+import pandas as pd
+from pandas.testing import assert_frame_equal
+import pytest
+
+# custom
+from gpw_data import GPWData
+import pricing_cache
+
+
+@pytest.fixture()
+def pricing_dir(tmpdir):
+    for symbol in ('11BIT', 'AAL'):
+        shutil.copy(os.path.join('pricing_data', f'{symbol}_pricing.csv'), str(tmpdir))
+    return str(tmpdir)
+
+
+def _cache_files(pricing_dir):
+    cache_dir = os.path.join(pricing_dir, pricing_cache.CACHE_DIR_NAME)
+    return sorted(os.listdir(cache_dir)) if os.path.exists(cache_dir) else []
+
+
+def test_cached_same_as_csv(pricing_dir):
+    expected = GPWData(pricing_data_path=pricing_dir, use_cache=False).load(
+        symbols=['11BIT', 'AAL'], from_csv=True, df=True
+    )
+    cached_data = GPWData(pricing_data_path=pricing_dir)
+    # first load builds the cache, second one reads it
+    for _ in range(2):
+        test_data = cached_data.load(symbols=['11BIT', 'AAL'], from_csv=True, df=True)
+        for symbol, expected_df in expected.items():
+            assert_frame_equal(test_data[symbol], expected_df)
+            assert(test_data[symbol].name == symbol)
+    assert(_cache_files(pricing_dir) == [
+        '11BIT_pricing.gpw.json', '11BIT_pricing.gpw.npy', 'AAL_pricing.gpw.json', 'AAL_pricing.gpw.npy'
+    ])
+    # loaded data can be modified
+    test_data['AAL'].iloc[0, 0] = 0.0
+
+
+def test_cache_invalidated_by_csv_change(pricing_dir):
+    csv_path = os.path.join(pricing_dir, 'AAL_pricing.csv')
+    gpw_data = GPWData(pricing_data_path=pricing_dir)
+    df = gpw_data.load(symbols='AAL', from_csv=True, df=True)
+    with open(csv_path, 'a') as fh:
+        fh.write('2030-01-02,1.0,2.0,0.5,1.5,100\n')
+    test_df = gpw_data.load(symbols='AAL', from_csv=True, df=True)
+    assert(len(test_df.index) == len(df.index) + 1)
+    assert(test_df.index[-1] == pd.Timestamp('2030-01-02'))
+    # same size, different modification time
+    stat = os.stat(csv_path)
+    with open(csv_path, 'r+') as fh:
+        fh.seek(stat.st_size - len('100\n'))
+        fh.write('200\n')
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    test_df = gpw_data.load(symbols='AAL', from_csv=True, df=True)
+    assert(test_df['volume'].iloc[-1] == 200)
+
+
+def test_cache_entry_not_fully_written(pricing_dir):
+    gpw_data = GPWData(pricing_data_path=pricing_dir)
+    df = gpw_data.load(symbols='AAL', from_csv=True, df=True)
+    cache_dir = os.path.join(pricing_dir, pricing_cache.CACHE_DIR_NAME)
+    with open(os.path.join(cache_dir, 'AAL_pricing.gpw.npy'), 'wb') as fh:
+        fh.write(b'\x93NUMPY')
+    assert_frame_equal(gpw_data.load(symbols='AAL', from_csv=True, df=True), df)
+    # and the entry is built again
+    assert_frame_equal(gpw_data.load(symbols='AAL', from_csv=True, df=True), df)
+
+
+def test_not_cacheable_data(tmpdir):
+    csv_path = os.path.join(str(tmpdir), 'TEST_pricing.csv')
+    with open(csv_path, 'w') as fh:
+        fh.write('a,b\n1,x\n2,y\n')
+    df = pricing_cache.load(csv_path, pd.read_csv, 'test')
+    assert_frame_equal(df, pd.read_csv(csv_path))
+    assert(_cache_files(str(tmpdir)) == [])
+
+
+def test_clear(pricing_dir):
+    GPWData(pricing_data_path=pricing_dir).load(symbols=['11BIT', 'AAL'], from_csv=True, df=True)
+    pricing_cache.clear(os.path.join(pricing_dir, pricing_cache.CACHE_DIR_NAME))
+    assert(_cache_files(pricing_dir) == [])
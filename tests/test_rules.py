@@ -49,6 +49,25 @@ def test_horizontal():
     assert(rule_output == 0)
 
 
+def test_trend_single_value():
+    # lstsq returns minimum norm solution for single point, so slope is half of the value
+    assert(rules.trend([20]) == 1)
+    assert(rules.trend([17]) == 0)
+    assert(rules.trend([-20]) == -1)
+
+
+@pytest.mark.parametrize('len_arr', [2, 3, 7, 8, 14, 15, 56])
+def test_trend_same_as_lstsq(prices_local_sr, len_arr):
+    rng = np.random.default_rng(len_arr)
+    arrs = [
+        prices_local_sr[:len_arr],
+        np.full(len_arr, 3.),
+        rng.integers(0, 4, size=len_arr),
+    ] + [np.cumsum(rng.normal(size=len_arr)*scale) for scale in (0.01, 1, 10, 1000) for _ in range(30)]
+    for arr in arrs:
+        assert(rules.trend(arr) == rules._trend_lstsq(arr))
+
+
 def test_find_support_resistance_global(prices_global_sr):
     support, resistance = rules._find_support_resistance(prices_global_sr[:-1])
     expected_support = 12
@@ -65,6 +84,20 @@ def test_find_support_resistance_local(prices_local_sr):
     assert(expected_resistance == resistance)
 
 
+@pytest.mark.parametrize('e', [1, 2, 3, 7, 15])
+def test_find_support_resistance_same_as_quadratic(prices_local_sr, e):
+    rng = np.random.default_rng(e)
+    # integers for a lot of ties
+    ties = rng.integers(0, 5, size=40).astype(float)
+    with_nan = rng.normal(size=30)
+    with_nan[[3, 17]] = np.nan
+    for y in (prices_local_sr, ties, with_nan):
+        for end in range(1, len(y)+1):
+            expected = rules._find_support_resistance_quadratic(y[:end], e=e)
+            test = rules._find_support_resistance(y[:end], e=e)
+            assert(np.array_equal(expected, test, equal_nan=True))
+
+
 def test_between_global_levels(prices_global_sr):
     rule_output = rules.support_resistance(prices_global_sr)
     assert(rule_output == 0)
@@ -200,3 +233,99 @@ def test_candle_engulfing_long():
     rule_output = rules.candle_engulfing(dict_arrs)
     assert(rule_output == 1)
 
+
+
+@pytest.fixture()
+def prices_random_walk():
+    rng = np.random.default_rng(7)
+    arr = np.round(np.cumsum(rng.normal(size=120)) + 50, 1)
+    arr[[40, 41]] = np.nan
+    return arr
+
+
+def windowed_results(func, arrs, lookback, **params):
+    """Results of *func* called day by day on windows with *lookback* (as done by SignalGenerator)."""
+    length = len(arrs['close']) if isinstance(arrs, dict) else len(arrs)
+    results = [0]*min(lookback, length)
+    for idx in range(lookback, length):
+        if isinstance(arrs, dict):
+            window = {k: np.array(v)[idx-lookback:idx+1] for k, v in arrs.items()}
+        else:
+            window = arrs[idx-lookback:idx+1]
+        results.append(func(window, **params))
+    return results
+
+
+@pytest.mark.parametrize('lookback', [0, 1, 5, 7, 14, 20])
+def test_trend_series(prices_local_sr, prices_random_walk, lookback):
+    for arr in (prices_local_sr, prices_random_walk):
+        expected = windowed_results(rules.trend, arr, lookback)
+        assert(rules.trend_series(arr, lookback).tolist() == expected)
+
+
+@pytest.mark.parametrize('params', [{}, {'b': 0.01}, {'e': 3}, {'e': 7, 'b': 0.01}, {'e': 50}])
+def test_support_resistance_series(prices_global_sr, prices_local_sr, prices_random_walk, params):
+    for arr in (prices_global_sr, prices_local_sr, prices_random_walk):
+        for lookback in (3, 6, 18):
+            expected = windowed_results(rules.support_resistance, arr, lookback, **params)
+            assert(rules.support_resistance_series(arr, lookback, **params).tolist() == expected)
+
+
+@pytest.mark.parametrize('params', [
+    {}, {'b': 0.02}, {'weigth_ma': True}, {'weigth_ma': True, 'quick_ma_lookback': 3},
+    {'quick_ma_lookback': 2, 'b': 0.01}, {'quick_ma_lookback': 30},
+])
+def test_moving_average_series(prices_global_sr, prices_local_sr, prices_random_walk, params):
+    for arr in (prices_global_sr, prices_local_sr, prices_random_walk):
+        for lookback in (1, 4, 7):
+            expected = windowed_results(rules.moving_average, arr, lookback, **params)
+            assert(rules.moving_average_series(arr, lookback, **params).tolist() == expected)
+
+
+@pytest.mark.parametrize('params', [{'channel_width': 0.2}, {'channel_width': 0.2, 'b': 0.1}, {'channel_width': 0.05}])
+def test_channel_break_out_series(prices_multp_1, prices_random_walk, params):
+    dict_arrs = {
+        'high': prices_random_walk*1.03, 'low': prices_random_walk*0.97, 'close': np.roll(prices_random_walk, 1)
+    }
+    for arrs, lookback in ((prices_multp_1, 3), (dict_arrs, 3), (dict_arrs, 10)):
+        expected = windowed_results(rules.channel_break_out, arrs, lookback, **params)
+        assert(rules.channel_break_out_series(arrs, lookback, **params).tolist() == expected)
+
+
+@pytest.mark.parametrize('threshold', [0.1, 0.15, 0.2])
+def test_momentum_in_oscillator_series(threshold):
+    arr = np.array([.1, .15, .25, .1, .25, .2, .1, .2, .1, .25, .05, .3, .12])
+    for lookback in (1, 2, 4):
+        expected = windowed_results(rules.momentum_in_oscillator, arr, lookback, threshold=threshold)
+        assert(rules.momentum_in_oscillator_series(arr, lookback, threshold=threshold).tolist() == expected)
+
+
+@pytest.fixture()
+def candles_random_walk():
+    rng = np.random.default_rng(11)
+    close = np.cumsum(rng.normal(size=300)*2) + 100
+    open = close + rng.normal(size=300)*1.5
+    open[rng.random(300) < 0.05] = close[rng.random(300) < 0.05][0]
+    high = np.maximum(open, close) + np.abs(rng.normal(size=300))*rng.choice([0, 0.2, 2], size=300)
+    low = np.minimum(open, close) - np.abs(rng.normal(size=300))*rng.choice([0, 0.2, 3], size=300)
+    close[[100, 101]] = np.nan
+    return {'open': open, 'high': high, 'low': low, 'close': close}
+
+
+@pytest.mark.parametrize('func,params', [
+    ('candle_hammer_hanging_man', {}),
+    ('candle_hammer_hanging_man', {'conf': False}),
+    ('candle_hammer_hanging_man', {'no_std': 0}),
+    ('candle_engulfing', {}),
+    ('candle_stars', {}),
+])
+def test_candle_rules_same_as_with_objects(candles_random_walk, func, params):
+    signals_found = False
+    for lookback in (3, 7, 14, 28):
+        expected = windowed_results(getattr(rules, '_'+func+'_objects'), candles_random_walk, lookback, **params)
+        test = windowed_results(getattr(rules, func), candles_random_walk, lookback, **params)
+        assert(test == expected)
+        signals_found = signals_found or any(expected)
+        test_series = getattr(rules, func+'_series')(candles_random_walk, lookback, **params)
+        assert(test_series.tolist() == expected)
+    assert(signals_found)
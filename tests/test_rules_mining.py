@@ -0,0 +1,151 @@
+# 3rd party
+import numpy as np
+import pandas as pd
+import pytest
+
+# custom
+import rules_mining
+
+
+@pytest.fixture()
+def rules_results():
+    rng = np.random.default_rng(0)
+    no_days = 300
+    results = {}
+    for idx in range(20):
+        rets = rng.normal(0.0002 * (idx % 5), 0.01, size=no_days)
+        rets[:5] = np.nan
+        results[f'rule_{idx}'] = pd.DataFrame({'daily_returns': rets})
+    return results
+
+
+@pytest.fixture()
+def rules_states():
+    rng = np.random.default_rng(1)
+    states = {f'rule_{idx}': rng.integers(-1, 2, size=300) for idx in range(20)}
+    # list of positions (as in SignalGenerator.final_positions)
+    states['rule_20'] = [1] * 300
+    return states
+
+
+@pytest.fixture()
+def price_changes():
+    return np.random.default_rng(2).normal(0, 0.01, size=300)
+
+
+@pytest.mark.parametrize('mean_block_length', [None, 5])
+def test_wrc_same_as_direct_means(rules_results, mean_block_length):
+    returns = rules_mining._centered_returns_matrix(rules_results, 'daily_returns')
+    no_days = returns.shape[0]
+    idxs = np.concatenate([
+        rules_mining._bootstrap_idxs(np.random.default_rng(seed_seq), size, no_days, mean_block_length)
+        for size, seed_seq in rules_mining._sample_blocks(150, 7)
+    ])
+    expected_dist = returns[idxs].mean(axis=1).max(axis=1)
+    test_dist = rules_mining.create_wrc_sampling_dist(
+        rules_results, no_samples=150, seed=7, mean_block_length=mean_block_length
+    )
+    assert(len(test_dist) == 150)
+    np.testing.assert_allclose(test_dist, expected_dist, rtol=1e-10, atol=1e-15)
+
+
+def test_wrc_reproducible(rules_results):
+    dist = rules_mining.create_wrc_sampling_dist(rules_results, no_samples=200, seed=1)
+    assert(rules_mining.create_wrc_sampling_dist(rules_results, no_samples=200, seed=1) == dist)
+    assert(rules_mining.create_wrc_sampling_dist(rules_results, no_samples=200, seed=2) != dist)
+    # rules computed in chunks
+    np.testing.assert_allclose(
+        rules_mining.create_wrc_sampling_dist(rules_results, no_samples=200, seed=1, memory_budget=1), dist,
+        rtol=1e-10,
+    )
+
+
+def test_wrc_similar_to_loop(rules_results):
+    np.random.seed(0)
+    expected_dist = rules_mining._create_wrc_sampling_dist_loop(rules_results, no_samples=500)
+    test_dist = rules_mining.create_wrc_sampling_dist(rules_results, no_samples=500, seed=0)
+    assert(np.mean(test_dist) == pytest.approx(np.mean(expected_dist), rel=0.1))
+    assert(np.std(test_dist) == pytest.approx(np.std(expected_dist), rel=0.1))
+
+
+def test_stationary_bootstrap_idxs():
+    rng = np.random.default_rng(0)
+    # new block every day - same as sampling single days
+    idxs = rules_mining._bootstrap_idxs(rng, 10, 50, mean_block_length=1)
+    assert(idxs.shape == (10, 50))
+    # (almost) never new block - consecutive days wrapped around
+    idxs = rules_mining._bootstrap_idxs(rng, 10, 50, mean_block_length=1e12)
+    assert((idxs == (idxs[:, :1] + np.arange(50)) % 50).all())
+    idxs = rules_mining._bootstrap_idxs(rng, 200, 50, mean_block_length=5)
+    continued = (np.diff(idxs, axis=1) % 50) == 1
+    assert(continued.mean() == pytest.approx(0.8, abs=0.02))
+
+
+def test_max_products():
+    rng = np.random.default_rng(0)
+    left = rng.normal(size=(4, 10))
+    right = rng.normal(size=(10, 7))
+    for chunk in (1, 3, 7, 100):
+        np.testing.assert_allclose(rules_mining._max_products(left, right, chunk), (left @ right).max(axis=1))
+
+
+def test_mc_same_as_direct_means(rules_states, price_changes):
+    test_dist = rules_mining.create_mc_sampling_distr(rules_states, price_changes, no_samples=150, seed=3)
+    assert(len(test_dist) == 150)
+    expected_dist = []
+    for size, seed_seq in rules_mining._sample_blocks(150, 3):
+        rng = np.random.default_rng(seed_seq)
+        changes = rng.permuted(np.broadcast_to(price_changes, (size, len(price_changes))), axis=1)
+        for sample_changes in changes:
+            # permutation of price changes
+            assert((np.sort(sample_changes) == np.sort(price_changes)).all())
+            expected_dist.append(max((np.asarray(states)*sample_changes).mean() for states in rules_states.values()))
+    np.testing.assert_allclose(test_dist, expected_dist, rtol=1e-10, atol=1e-15)
+
+
+def test_mc_reproducible(rules_states, price_changes):
+    dist = rules_mining.create_mc_sampling_distr(rules_states, price_changes, no_samples=200, seed=1)
+    assert(rules_mining.create_mc_sampling_distr(rules_states, price_changes, no_samples=200, seed=1) == dist)
+    assert(rules_mining.create_mc_sampling_distr(rules_states, price_changes, no_samples=200, seed=2) != dist)
+    # rules states converted and multiplied in chunks
+    np.testing.assert_allclose(
+        rules_mining.create_mc_sampling_distr(rules_states, price_changes, no_samples=200, seed=1, memory_budget=1),
+        dist,
+        rtol=1e-10,
+    )
+
+
+def test_mc_similar_to_loop(rules_states, price_changes):
+    np.random.seed(0)
+    expected_dist = rules_mining._create_mc_sampling_distr_loop(rules_states, price_changes, no_samples=300)
+    test_dist = rules_mining.create_mc_sampling_distr(rules_states, price_changes, no_samples=300, seed=0)
+    assert(np.mean(test_dist) == pytest.approx(np.mean(expected_dist), rel=0.1))
+    assert(np.std(test_dist) == pytest.approx(np.std(expected_dist), rel=0.2))
+
+
+def test_states_matrix(rules_states):
+    states = rules_mining._states_matrix(rules_states)
+    assert(states.dtype == np.int8)
+    assert(states.shape == (21, 300))
+    with pytest.raises(ValueError):
+        rules_mining._states_matrix({'a': [1, 2, 0]})
+    with pytest.raises(AssertionError):
+        rules_mining._states_matrix({'a': [1, 0, 0], 'b': [1, 0]})
+
+
+@pytest.mark.parametrize('n_jobs', [2, 3])
+def test_wrc_same_for_any_number_of_jobs(rules_results, n_jobs):
+    expected_dist = rules_mining.create_wrc_sampling_dist(rules_results, no_samples=300, seed=4, mean_block_length=3)
+    test_dist = rules_mining.create_wrc_sampling_dist(
+        rules_results, no_samples=300, seed=4, mean_block_length=3, n_jobs=n_jobs
+    )
+    assert(test_dist == expected_dist)
+
+
+@pytest.mark.parametrize('n_jobs', [2, 3])
+def test_mc_same_for_any_number_of_jobs(rules_states, price_changes, n_jobs):
+    expected_dist = rules_mining.create_mc_sampling_distr(rules_states, price_changes, no_samples=300, seed=4)
+    test_dist = rules_mining.create_mc_sampling_distr(
+        rules_states, price_changes, no_samples=300, seed=4, n_jobs=n_jobs
+    )
+    assert(test_dist == expected_dist)
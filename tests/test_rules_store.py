@@ -0,0 +1,244 @@
+# built in
+import concurrent.futures
+import os
+
+# 3rd party
+import numpy as np
+from numpy.testing import assert_array_equal
+import pandas as pd
+from pandas.testing import assert_frame_equal
+import pytest
+
+# custom
+import rules
+from rules_store import (
+    INDEX_FILE,
+    DATA_FILE,
+    migrate_pickles,
+    RulesStore,
+)
+from signal_generator import (
+    NotAllRuleResultsPresentError,
+    SignalGenerator,
+)
+
+
+@pytest.fixture()
+def config():
+    return {
+        'rules': [
+            {
+                'id': 'trend',
+                'type': 'simple',
+                'ts': 'close',
+                'lookback': 5,
+                'params': {},
+                'func': rules.trend,
+            },
+            {
+                'id': 'ma',
+                'type': 'simple',
+                'ts': 'close',
+                'lookback': 10,
+                'params': {},
+                'func': rules.moving_average,
+            },
+            {
+                'id': 'conv',
+                'type': 'convoluted',
+                'simple_rules': ['trend', 'ma'],
+                'aggregation_type': 'combine',
+                'aggregation_params': {'mode': 'strong'},
+            },
+        ],
+        'strategy': {
+            'type': 'fixed',
+            'strategy_rules': ['conv', 'trend'],
+        }
+    }
+
+
+@pytest.fixture()
+def pricing_df():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'close': np.cumsum(rng.normal(size=100)) + 100})
+
+
+def _append_in_process(path, rule_id):
+    RulesStore(path).append({rule_id: [1, 0, -1]})
+
+
+def test_append_and_get(tmpdir):
+    store = RulesStore(str(tmpdir), days=5)
+    store.append({'a': [1, 0, -1, 1, 1], 'b': [-1, -1]})
+    assert(len(store) == 2)
+    assert('a' in store)
+    assert('c' not in store)
+    assert_array_equal(store.get('a'), np.array([1, 0, -1, 1, 1]))
+    # shorter results are aligned to the last day
+    assert_array_equal(store.get('b'), np.array([-1, -1]))
+    assert(store.get('a').dtype == np.int8)
+    with pytest.raises(KeyError):
+        store.get('c')
+
+
+def test_get_last_days(tmpdir):
+    store = RulesStore(str(tmpdir), days=5)
+    store.append({'a': [1, 0, -1, 1, 1]})
+    assert_array_equal(store.get('a', length=2), np.array([1, 1]))
+    assert_array_equal(store.get_many(['a'], length=3)['a'], np.array([-1, 1, 1]))
+    assert(store.get('a', length=0).size == 0)
+    # view of memory-mapped file
+    assert(isinstance(store.get('a', length=2), np.memmap))
+    with pytest.raises(ValueError):
+        store.get('a', length=6)
+
+
+def test_append_does_not_overwrite(tmpdir):
+    store = RulesStore(str(tmpdir), days=3)
+    store.append({'a': [1, 1, 1]})
+    store.append({'a': [0, 0, 0], 'b': [-1, 0, 1]})
+    assert_array_equal(store.get('a'), np.array([1, 1, 1]))
+    assert_array_equal(store.get('b'), np.array([-1, 0, 1]))
+    assert(os.path.getsize(os.path.join(str(tmpdir), DATA_FILE)) == 2*3)
+
+
+def test_reopen_and_shared(tmpdir):
+    store = RulesStore(str(tmpdir), days=3)
+    store.append({'a': [1, 0, 1]})
+    other_store = RulesStore(str(tmpdir))
+    assert(other_store.days == 3)
+    other_store.append({'b': [0, -1, 0]})
+    # appended by other instance
+    assert_array_equal(store.get('b'), np.array([0, -1, 0]))
+    assert(store.rules_ids() == ['a', 'b'])
+
+
+def test_partially_written_append_ignored(tmpdir):
+    store = RulesStore(str(tmpdir), days=3)
+    store.append({'a': [1, 0, 1]})
+    # data written but index entry only partially (e.g. process killed while appending)
+    with open(os.path.join(str(tmpdir), DATA_FILE), 'ab') as fh:
+        fh.write(np.array([1, 1, 1], dtype=np.int8).tobytes())
+    with open(os.path.join(str(tmpdir), INDEX_FILE), 'a') as fh:
+        fh.write('b\t')
+    store = RulesStore(str(tmpdir))
+    assert(store.rules_ids() == ['a'])
+    store.append({'c': [-1, -1, 0]})
+    store = RulesStore(str(tmpdir))
+    assert(store.rules_ids() == ['a', 'c'])
+    assert_array_equal(store.get('c'), np.array([-1, -1, 0]))
+
+
+def test_different_days(tmpdir):
+    store = RulesStore(str(tmpdir), days=10)
+    store.append({'a': [1] * 10})
+    assert(RulesStore(str(tmpdir), days=10).rules_ids() == ['a'])
+    # e.g. pricing data got longer. stored results are aligned to the old last day
+    with pytest.raises(ValueError):
+        RulesStore(str(tmpdir), days=12)
+    store = RulesStore(str(tmpdir), days=12, overwrite=True)
+    assert(store.days == 12)
+    assert(len(store) == 0)
+    store.append({'a': [-1] * 12})
+    store = RulesStore(str(tmpdir))
+    assert(store.days == 12)
+    assert_array_equal(store.get('a'), np.array([-1] * 12))
+
+
+def test_clear(tmpdir):
+    store = RulesStore(str(tmpdir), days=3)
+    store.append({'a': [1, 0, 1], 'b': [0, 0, 1]})
+    other_store = RulesStore(str(tmpdir))
+    store.clear()
+    assert(store.days == 3)
+    assert('a' not in store)
+    assert(os.path.getsize(os.path.join(str(tmpdir), DATA_FILE)) == 0)
+    store.append({'b': [-1, -1, -1]})
+    assert_array_equal(RulesStore(str(tmpdir)).get('b'), np.array([-1, -1, -1]))
+    assert(other_store.days == 3)
+
+
+def test_invalid_results(tmpdir):
+    store = RulesStore(str(tmpdir), days=3)
+    with pytest.raises(ValueError):
+        store.append({'too_long': [1, 0, 1, 1]})
+    with pytest.raises(ValueError):
+        store.append({'not_int8': [1, 0, 300]})
+    with pytest.raises(ValueError):
+        store.append({'floats': [0.5, 0, 1]})
+    assert(len(store) == 0)
+
+
+def test_new_store_requires_days(tmpdir):
+    with pytest.raises(AttributeError):
+        RulesStore(str(tmpdir))
+
+
+def test_concurrent_appends(tmpdir):
+    path = str(tmpdir)
+    RulesStore(path, days=3)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(_append_in_process, [path]*20, [f'rule_{i}' for i in range(20)]))
+    store = RulesStore(path)
+    assert(sorted(store.rules_ids()) == sorted(f'rule_{i}' for i in range(20)))
+    for rule_id in store.rules_ids():
+        assert_array_equal(store.get(rule_id), np.array([1, 0, -1]))
+
+
+def test_signal_generator_with_store(tmpdir, config, pricing_df):
+    store = RulesStore(str(tmpdir), days=len(pricing_df.index))
+    sg = SignalGenerator(df=pricing_df, config=config)
+    expected_signal = sg.generate()
+    store.append(sg.rules_results)
+    test_sg = SignalGenerator(df=pricing_df, config=config, rules_store=store)
+    assert(isinstance(test_sg.rules_results['trend'], np.memmap))
+    test_signal = test_sg.generate()
+    assert_frame_equal(test_signal, expected_signal)
+
+
+def test_signal_generator_with_store_missing_rules(tmpdir, config, pricing_df):
+    store = RulesStore(str(tmpdir), days=len(pricing_df.index))
+    sg = SignalGenerator(df=pricing_df, config=config)
+    sg.generate()
+    store.append({'trend': sg.rules_results['trend'], 'ma': sg.rules_results['ma']})
+    with pytest.raises(NotAllRuleResultsPresentError):
+        SignalGenerator(df=pricing_df, config=config, rules_store=store)
+    # convoluted rule is computed from stored simple rules
+    test_sg = SignalGenerator(df=pricing_df, config=config, rules_store=store, load_only_simple=True)
+    test_sg.generate()
+    assert(list(test_sg.rules_results['conv']) == sg.rules_results['conv'])
+
+
+def test_signal_generator_with_store_different_lookbacks(tmpdir, config, pricing_df):
+    store = RulesStore(str(tmpdir), days=len(pricing_df.index))
+    # trend is stored by config with smaller max lookback, so its results are longer
+    trend_config = {'rules': config['rules'][:1], 'strategy': {'type': 'fixed', 'strategy_rules': ['trend']}}
+    trend_sg = SignalGenerator(df=pricing_df, config=trend_config)
+    trend_sg.generate()
+    sg = SignalGenerator(df=pricing_df, config=config)
+    expected_signal = sg.generate()
+    store.append({'trend': trend_sg.rules_results['trend'], 'ma': sg.rules_results['ma']})
+    test_sg = SignalGenerator(df=pricing_df, config=config, rules_store=store, load_only_simple=True)
+    assert(len(test_sg.rules_results['trend']) == len(test_sg.rules_results['ma']) == 90)
+    assert_frame_equal(test_sg.generate(), expected_signal)
+    # results stored by config with bigger max lookback are too short
+    other_store = RulesStore(str(tmpdir.mkdir('other')), days=len(pricing_df.index))
+    other_store.append(sg.rules_results)
+    with pytest.raises(NotAllRuleResultsPresentError):
+        SignalGenerator(df=pricing_df, config=trend_config, rules_store=other_store)
+
+
+def test_migrate_pickles(tmpdir, config, pricing_df):
+    pickles_dir = str(tmpdir.mkdir('pickles'))
+    sg = SignalGenerator(df=pricing_df, config=config)
+    sg.generate()
+    sg.save_rules_results(path=pickles_dir, prefix='SYM_')
+    no_rules = migrate_pickles(pickles_dir, prefix='SYM_', days=len(pricing_df.index))
+    assert(no_rules == 3)
+    store = RulesStore(pickles_dir)
+    for rule_id, rule_results in sg.rules_results.items():
+        assert(store.get(rule_id).tolist() == rule_results)
+    # already migrated rules are skipped
+    migrate_pickles(pickles_dir, prefix='SYM_')
+    assert(len(store) == 3)
@@ -1,4 +1,6 @@
 # built in
+import copy
+import functools
 import os
 import pickle
 
@@ -11,10 +13,14 @@ import pytest
 
 # custom
 from signal_generator import (
+    compile_config,
+    NotAllRuleResultsPresentError,
+    RulesCache,
     SignalGenerator,
     triggers_to_states,
 )
 import rules
+import signal_generator
 
 def simple_rule1(arr):
     """ If average value in array < 0 then -1, else 1. if 0 then 0 """
@@ -833,6 +839,40 @@ def test_results_load_only_simple_rules(tmpdir, config_7, pricing_df3):
     assert_frame_equal(expected_df, test_df)
 
 
+def lookback_rules_config(lookbacks):
+    return {
+        'rules': [
+            {'id': rule_id, 'type': 'simple', 'ts': 'close', 'lookback': lookback, 'params': {}, 'func': simple_rule1}
+            for rule_id, lookback in lookbacks.items()
+        ],
+        'strategy': {'type': 'fixed', 'strategy_rules': list(lookbacks)},
+    }
+
+
+def test_load_rules_results_saved_with_different_lookbacks(tmpdir, pricing_df_random):
+    for lookbacks in ({'A': 3}, {'B': 10}):
+        sg = SignalGenerator(df=pricing_df_random, config=lookback_rules_config(lookbacks))
+        sg.generate()
+        sg.save_rules_results(path=tmpdir)
+    config = lookback_rules_config({'A': 3, 'B': 10})
+    expected_df = SignalGenerator(df=pricing_df_random, config=config).generate()
+    sg_loaded = SignalGenerator(
+        df=pricing_df_random, config=config, load_rules_results_path=tmpdir, load_only_simple=True,
+    )
+    assert(len(sg_loaded.rules_results['A']) == len(sg_loaded.rules_results['B']) == 140)
+    assert_frame_equal(expected_df, sg_loaded.generate())
+
+
+def test_load_rules_results_too_short(tmpdir, pricing_df_random):
+    sg = SignalGenerator(df=pricing_df_random, config=lookback_rules_config({'A': 10}))
+    sg.generate()
+    sg.save_rules_results(path=tmpdir)
+    with pytest.raises(NotAllRuleResultsPresentError):
+        SignalGenerator(
+            df=pricing_df_random, config=lookback_rules_config({'A': 3}), load_rules_results_path=tmpdir,
+        )
+
+
 def test_positions_in_final_df(pricing_df2, config_2):
     sg = SignalGenerator(df=pricing_df2, config=config_2)
     test_results = sg.generate()
@@ -873,3 +913,350 @@ def test_reversed_initial_signal(config_2, pricing_df2):
     test_signals = sg_rev.rules_results['mock_rule']
     assert(expected_signals == test_signals)
 
+
+def test_rules_cache_same_results(config_7, pricing_df3):
+    expected_df = SignalGenerator(df=pricing_df3, config=config_7).generate()
+    cache = RulesCache()
+    first_df = SignalGenerator(df=pricing_df3, config=config_7, rules_cache=cache).generate()
+    second_df = SignalGenerator(df=pricing_df3, config=config_7, rules_cache=cache).generate()
+    assert_frame_equal(expected_df, first_df)
+    assert_frame_equal(expected_df, second_df)
+    assert((cache.hits, cache.misses) == (1, 1))
+
+
+def test_rules_cache_different_max_lookback(config_2, pricing_df2):
+    cache = RulesCache()
+    SignalGenerator(df=pricing_df2, config=config_2, rules_cache=cache).generate()
+    # same rule, but max lookback of config is bigger, so less of cached results is needed
+    config_2['rules'].append({
+        'id': 'mock_rule_long', 'type': 'simple', 'ts': 'close', 'lookback': 5, 'params': {}, 'func': simple_rule1,
+    })
+    expected_sg = SignalGenerator(df=pricing_df2, config=config_2)
+    expected_sg.generate()
+    test_sg = SignalGenerator(df=pricing_df2, config=config_2, rules_cache=cache)
+    test_sg.generate()
+    assert(expected_sg.rules_results == test_sg.rules_results)
+    assert((cache.hits, cache.misses) == (1, 2))
+
+
+def test_rules_cache_hold_fixed_days(config_2, pricing_df2):
+    config_2['rules'][0]['hold_fixed_days'] = 3
+    cache = RulesCache()
+    SignalGenerator(df=pricing_df2, config=config_2, rules_cache=cache).generate()
+    test_signals = triggers_to_states(SignalGenerator(df=pricing_df2, config=config_2, rules_cache=cache).generate())
+    expected_signals = [0, 0, 0, 1, 1, 1, 0, 0, -1, -1, -1, -1, -1]
+    assert(test_signals == expected_signals)
+    assert(cache.hits == 1)
+
+
+def test_rules_cache_different_data(config_2, pricing_df1, pricing_df2):
+    cache = RulesCache()
+    for df in (pricing_df1, pricing_df2):
+        expected_df = SignalGenerator(df=df, config=config_2).generate()
+        test_df = SignalGenerator(df=df, config=config_2, rules_cache=cache).generate()
+        assert_frame_equal(expected_df, test_df)
+    assert((cache.hits, cache.misses) == (0, 2))
+
+
+def threshold_rule(arr, threshold=0):
+    return 1 if arr[-1] > threshold else -1
+
+
+def weights_rule(arr, weights=None):
+    return 1 if weights[len(weights)//2] > 0 else -1
+
+
+def make_threshold_rule(threshold):
+    def closure_rule(arr):
+        return 1 if arr[-1] > threshold else -1
+    return closure_rule
+
+
+def single_rule_config(func, params=None):
+    return {
+        'rules': [{'id': 'rule', 'type': 'simple', 'ts': 'close', 'lookback': 1, 'params': params or {}, 'func': func}],
+        'strategy': {'type': 'fixed', 'strategy_rules': ['rule']},
+    }
+
+
+@pytest.mark.parametrize('configs', [
+    # partials and closures with the same name, but different thresholds
+    [single_rule_config(functools.partial(threshold_rule, threshold=t)) for t in (0, 5)],
+    [single_rule_config(make_threshold_rule(t)) for t in (0, 5)],
+    [single_rule_config(lambda arr, t=t: 1 if arr[-1] > t else -1) for t in (0, 5)],
+    # arrays differing only in the middle (repr of them is the same)
+    [single_rule_config(weights_rule, {'weights': w}) for w in (np.zeros(5000), np.arange(5000))],
+])
+def test_rules_cache_different_rules(configs, pricing_df3):
+    expected = [SignalGenerator(df=pricing_df3, config=conf).generate() for conf in configs]
+    assert(not expected[0].equals(expected[1]))
+    cache = RulesCache()
+    for conf, expected_df in zip(configs, expected):
+        assert_frame_equal(SignalGenerator(df=pricing_df3, config=conf, rules_cache=cache).generate(), expected_df)
+    assert((cache.hits, cache.misses) == (0, 2))
+
+
+def test_rules_cache_same_partial_and_array(pricing_df3):
+    func = functools.partial(threshold_rule, threshold=5)
+    cache = RulesCache()
+    for weights in (np.arange(5000), np.arange(5000)):
+        SignalGenerator(df=pricing_df3, config=single_rule_config(func), rules_cache=cache).generate()
+        SignalGenerator(
+            df=pricing_df3, config=single_rule_config(weights_rule, {'weights': weights}), rules_cache=cache
+        ).generate()
+    assert((cache.hits, cache.misses) == (2, 2))
+
+
+def test_rules_cache_lru():
+    cache = RulesCache(maxsize=2)
+    cache.put('a', [1, 0])
+    cache.put('b', [0, -1])
+    cache.get('a')
+    cache.put('c', [1, 1])
+    assert(cache.get('b') is None)
+    assert(cache.get('a') == [1, 0])
+    assert(len(cache) == 2)
+
+
+@pytest.mark.parametrize('hold_fixed_days', [None, 3])
+def test_vectorized_rules_same_results(config_1, pricing_df1, hold_fixed_days):
+    if hold_fixed_days:
+        config_1['rules'][0]['hold_fixed_days'] = hold_fixed_days
+    expected_sg = SignalGenerator(df=pricing_df1, config=config_1)
+    expected_df = expected_sg.generate()
+    test_sg = SignalGenerator(df=pricing_df1, config=config_1, vectorized_rules=True)
+    test_df = test_sg.generate()
+    assert_frame_equal(expected_df, test_df)
+    assert(expected_sg.rules_results == test_sg.rules_results)
+
+
+def test_compile_config(config_3):
+    plan = compile_config(config_3)
+    assert(plan.ts_names == ['close'])
+    assert(plan.max_lookback == 6)
+    assert(plan.rows == {'trend': 0, 'supprot/resistance': 1, 'trend+supprot/resistance': 2})
+    assert(plan.convoluted_rules[0]['_deps'] == [0, 1])
+    assert(plan.results_matrix(5).shape == (3, 5))
+
+
+def test_compile_config_does_not_modify_config(config_8, pricing_df3):
+    expected_config = copy.deepcopy(config_8)
+    SignalGenerator(df=pricing_df3, config=config_8).generate()
+    assert(config_8 == expected_config)
+
+
+def test_compile_config_orders_convoluted_rules(config_8, pricing_df3):
+    expected_sg = SignalGenerator(df=pricing_df3, config=config_8)
+    expected_df = expected_sg.generate()
+    # convoluted rule which depends on convoluted rule defined after it
+    config_8['rules'].insert(0, {
+        'id': 'conv_of_conv',
+        'type': 'convoluted',
+        'simple_rules': ['conv', 'simple_rule_3'],
+        'aggregation_type': 'combine',
+        'aggregation_params': {'mode': 'strong'},
+    })
+    config_8['strategy']['strategy_rules'] = ['conv_of_conv', 'conv']
+    plan = compile_config(config_8)
+    assert([r['id'] for r in plan.convoluted_rules] == ['conv', 'conv_of_conv'])
+    test_sg = SignalGenerator(df=pricing_df3, plan=plan)
+    test_df = test_sg.generate()
+    assert(test_sg.rules_results['conv'] == expected_sg.rules_results['conv'])
+    expected_conv_of_conv = [
+        c if c == s else 0 for c, s in zip(test_sg.rules_results['conv'], test_sg.rules_results['simple_rule_3'])
+    ]
+    assert(test_sg.rules_results['conv_of_conv'] == expected_conv_of_conv)
+
+
+@pytest.mark.parametrize('config_name,deps', [
+    ('config_3', ['trend', 'not_existing']),
+    ('config_8', ['conv', 'simple_rule_2']),
+])
+def test_compile_config_invalid_dependencies(config_name, deps, request):
+    config = request.getfixturevalue(config_name)
+    # either not existing rule or circular dependency
+    config['rules'][-1]['simple_rules'] = deps
+    with pytest.raises(AttributeError):
+        compile_config(config)
+
+
+def test_plan_reused_for_many_symbols(config_3, pricing_df1, pricing_df2, pricing_df3):
+    plan = compile_config(config_3)
+    for df in (pricing_df1, pricing_df2, pricing_df3):
+        expected_df = SignalGenerator(df=df, config=config_3).generate()
+        test_df = SignalGenerator(df=df, plan=plan).generate()
+        assert_frame_equal(expected_df, test_df)
+
+
+@pytest.mark.parametrize('mode', ['strong', 'majority_voting'])
+@pytest.mark.parametrize('no_rules', [1, 2, 3, 20, 160])
+def test_combine_results_series_same_as_daily(config_3, pricing_df1, mode, no_rules):
+    sg = SignalGenerator(df=pricing_df1, config=config_3)
+    rng = np.random.default_rng(no_rules)
+    stacked_results = rng.integers(-1, 2, size=(no_rules, 500))
+    # make sure all agree on some of the days (for 'strong')
+    stacked_results[:, :50] = 1
+    stacked_results[:, 50:100] = -1
+    expected_output = [
+        sg.combine_simple_results(
+            rules_results=stacked_results[:, day].tolist(),
+            aggregation_type='combine',
+            aggregation_params={'mode': mode},
+        )
+        for day in range(stacked_results.shape[1])
+    ]
+    test_output = sg.combine_results_series(stacked_results, {'mode': mode}).tolist()
+    assert(test_output == expected_output)
+
+
+def test_combine_results_series_not_supported_mode():
+    with pytest.raises(NotImplementedError):
+        SignalGenerator.combine_results_series(np.zeros((2, 3)), {'mode': 'weak'})
+
+
+def state_based_daily(sg, conv_rule_id, rules_ids, stacked_results, aggregation_params):
+    """Results of state-based rule computed day by day with combine_simple_results."""
+    sg.rules_results[conv_rule_id] = []
+    for day in range(stacked_results.shape[1]):
+        sg.rules_results[conv_rule_id].append(sg.combine_simple_results(
+            rules_results={conv_rule_id: dict(zip(rules_ids, stacked_results[:, day].tolist()))},
+            aggregation_type='state-based',
+            aggregation_params=aggregation_params,
+        ))
+    return sg.rules_results[conv_rule_id]
+
+
+@pytest.mark.parametrize('aggregation_params', [
+    {'long': [{'simple_rule_2': 1}], 'short': [{'simple_rule_2': -1}]},
+    {
+        'neutral': [{'simple_rule_3': 0}],
+        'long': [{'simple_rule_2': 1, 'simple_rule_3': 0}, {'simple_rule_2': 1, 'simple_rule_3': 1}],
+        'short': [{'simple_rule_2': -1}, {'simple_rule_3': -1}],
+    },
+    {'short': [{'simple_rule_3': 1, 'simple_rule_2': -1}], 'long': [{}]},
+])
+def test_state_based_results_series_same_as_daily(config_8, pricing_df3, aggregation_params):
+    sg = SignalGenerator(df=pricing_df3, config=config_8)
+    rules_ids = ['simple_rule_2', 'simple_rule_3']
+    rng = np.random.default_rng(len(aggregation_params))
+    stacked_results = rng.integers(-1, 2, size=(2, 300))
+    expected_output = state_based_daily(sg, 'conv', rules_ids, stacked_results, aggregation_params)
+    conv_rule = dict(config_8['rules'][2], aggregation_params=aggregation_params)
+    state_table = signal_generator._compile_state_table(conv_rule)
+    test_output = sg.state_based_results_series(stacked_results, state_table).tolist()
+    assert(test_output == expected_output)
+
+
+def test_state_based_too_many_rules(config_8, pricing_df3):
+    expected_sg = SignalGenerator(df=pricing_df3, config=config_8)
+    expected_sg.generate()
+    # rule depends on the same rule many times, so the results do not change
+    config_8['rules'][2]['simple_rules'] = 6*['simple_rule_2', 'simple_rule_3']
+    plan = compile_config(config_8)
+    assert(plan.convoluted_rules[0]['_state_table'] is None)
+    test_sg = SignalGenerator(df=pricing_df3, plan=plan)
+    test_sg.generate()
+    assert(test_sg.rules_results == expected_sg.rules_results)
+
+
+@pytest.mark.parametrize('performance_metric', [
+    'daily_returns', 'avg_log_returns', 'avg_log_returns_held_only', 'voting'
+])
+def test_learning_prefix_same_as_direct(config_9, performance_metric, monkeypatch):
+    rng = np.random.default_rng(0)
+    close = np.cumsum(rng.normal(size=300)) + 100
+    # zero price - non-finite returns, so some windows are computed directly
+    close[150] = 0
+    df = pd.DataFrame({'close': close})
+    config_9['strategy']['params']['performance_metric'] = performance_metric
+    config_9['strategy']['params']['memory_span'] = 20
+    config_9['strategy']['params']['review_span'] = 5
+    test_sg = SignalGenerator(df=df.copy(), config=config_9)
+    test_initial_signal = test_sg._generate_initial_signal()
+    assert(test_sg._learning_prefix is None)
+    # without prefix sums all metrics are computed directly from rules results
+    monkeypatch.setattr(SignalGenerator, '_build_learning_prefix', lambda self: None)
+    expected_sg = SignalGenerator(df=df.copy(), config=config_9)
+    expected_initial_signal = expected_sg._generate_initial_signal()
+    assert(test_initial_signal == expected_initial_signal)
+    for rule_id, expected_reviews in expected_sg.past_reviews.items():
+        test_reviews = test_sg.past_reviews[rule_id]
+        assert(len(test_reviews) == len(expected_reviews))
+        for test_review, expected_review in zip(test_reviews, expected_reviews):
+            if performance_metric == 'voting' or np.isnan(expected_review):
+                assert(test_review == expected_review or np.isnan(test_review))
+            else:
+                assert(test_review == pytest.approx(expected_review, rel=1e-12, abs=1e-15))
+
+
+def generate_with_updates(df, config, no_generated, state_path=None):
+    """Generates signal for first *no_generated* days and continues with update (saving/loading state midway)."""
+    sg = SignalGenerator(df=df.iloc[:no_generated], config=config)
+    sg.generate()
+    rows = []
+    for idx in range(no_generated, len(df.index)):
+        if state_path and idx == no_generated+5:
+            sg.save_state(state_path)
+            sg = SignalGenerator.load_state(state_path)
+        rows.append(sg.update(df.iloc[idx]))
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture()
+def pricing_df_random():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'close': rng.normal(size=150),
+        'mock_rules_input': rng.integers(0, 14, size=150),
+        'price': np.cumsum(rng.normal(size=150)) + 100,
+    })
+
+
+@pytest.mark.parametrize('config_name', ['config_2', 'config_4', 'config_5', 'config_6', 'config_8', 'config_9'])
+@pytest.mark.parametrize('is_reversed', [False, True])
+def test_update_same_as_generate(request, pricing_df_random, config_name, is_reversed):
+    config = request.getfixturevalue(config_name)
+    if config_name == 'config_8':
+        # rules expect ints 0-13
+        for rule in config['rules'][:2]:
+            rule['ts'] = 'mock_rules_input'
+    if config_name == 'config_9':
+        config['strategy']['params']['price_label'] = 'price'
+        for rule in config['rules']:
+            rule['ts'] = 'price'
+    config['strategy']['reversed'] = is_reversed
+    expected_signal = SignalGenerator(df=pricing_df_random, config=copy.deepcopy(config)).generate()
+    for no_generated in (10, 100):
+        test_signal = generate_with_updates(pricing_df_random, copy.deepcopy(config), no_generated)
+        assert_frame_equal(test_signal, expected_signal.iloc[no_generated:], check_dtype=False)
+
+
+@pytest.mark.parametrize('performance_metric', [
+    'daily_returns', 'avg_log_returns', 'avg_log_returns_held_only', 'voting'
+])
+def test_update_learning_same_as_generate(config_9, pricing_df_random, performance_metric):
+    config_9['strategy']['params'].update({
+        'performance_metric': performance_metric, 'price_label': 'price', 'memory_span': 30, 'review_span': 15,
+    })
+    for rule in config_9['rules']:
+        rule['ts'] = 'price'
+    expected_sg = SignalGenerator(df=pricing_df_random, config=copy.deepcopy(config_9))
+    expected_signal = expected_sg.generate()
+    test_signal = generate_with_updates(pricing_df_random, copy.deepcopy(config_9), 20)
+    assert_frame_equal(test_signal, expected_signal.iloc[20:], check_dtype=False)
+
+
+def test_update_with_loaded_state(tmpdir, config_6, pricing_df_random):
+    expected_signal = SignalGenerator(df=pricing_df_random, config=copy.deepcopy(config_6)).generate()
+    state_path = os.path.join(str(tmpdir), 'state.pickle')
+    test_signal = generate_with_updates(pricing_df_random, copy.deepcopy(config_6), 50, state_path=state_path)
+    assert_frame_equal(test_signal, expected_signal.iloc[50:], check_dtype=False)
+    sg = SignalGenerator.load_state(state_path)
+    assert(sg.last_date == 54)
+    assert(sg.df.empty)
+
+
+def test_update_without_generate(config_2, pricing_df_random):
+    sg = SignalGenerator(df=pricing_df_random, config=config_2)
+    with pytest.raises(ValueError):
+        sg.update(pricing_df_random.iloc[0])
@@ -1,8 +1,11 @@
 # thrid party
+import numpy as np
 import pandas as pd
+import pytest
 
 # custom
 import position_size
+from signal_generator import RulesCache, SignalGenerator
 import strategy
 
 def func_gen_test_signals(df, arg1, arg2=None):
@@ -64,3 +67,175 @@ def test_optimize_strategy_correct_best():
     best_all_args_from_optimization = dict(zip(res[0], res[1]))
     assert(best_all_args_from_optimization == expected_all_args)
 
+
+
+CALLED_COMBINATIONS = []
+
+
+def func_gen_test_signals_recorded(df, arg1, arg2=None):
+    CALLED_COMBINATIONS.append((arg1, arg2))
+    return func_gen_test_signals(df, arg1, arg2=arg2)
+
+
+def optimization_inputs():
+    return {
+        'data': {
+            'TEST_SIGS_1': pd.DataFrame({'close':[1,2,3]}, index=pd.DatetimeIndex(['2019-01-01', '2019-01-02', '2019-01-03']))
+        },
+        'strategy_args': [['long_only', 'long_and_short']],
+        'strategy_kwargs': {'arg2': [1, 2]},
+        'position_sizer': position_size.MaxFirstEncountered(),
+        'init_capital': 10000,
+        'show_all': True,
+    }
+
+
+def test_optimize_strategy_parallel_same_as_serial(tmpdir):
+    serial = strategy.optimize_strategy(signal_gen_func=func_gen_test_signals, **optimization_inputs())
+    parallel_path = str(tmpdir.join('parallel.csv'))
+    parallel = strategy.optimize_strategy(
+        signal_gen_func=func_gen_test_signals, n_jobs=2, chunk_size=2, results_path=parallel_path,
+        **optimization_inputs()
+    )
+    assert(len(serial) == 3)
+    assert([(r[1], r[2]) for r in serial] == [(r[1], r[2]) for r in parallel])
+    with open(parallel_path) as fh:
+        # header + 3 successful combinations
+        assert(len(fh.readlines()) == 4)
+
+
+def test_optimize_strategy_resume(tmpdir):
+    results_path = str(tmpdir.join('results.csv'))
+    full = strategy.optimize_strategy(
+        signal_gen_func=func_gen_test_signals, results_path=results_path, **optimization_inputs()
+    )
+    # simulate run killed while writing 3rd row
+    with open(results_path) as fh:
+        lines = fh.readlines()
+    with open(results_path, 'w') as fh:
+        fh.writelines(lines[:2] + [lines[2][:15]])
+    CALLED_COMBINATIONS.clear()
+    resumed = strategy.optimize_strategy(
+        signal_gen_func=func_gen_test_signals_recorded, results_path=results_path, resume=True,
+        **optimization_inputs()
+    )
+    done_combination = strategy._parse_value(lines[1].split('",')[0].strip('"'))
+    assert(done_combination not in CALLED_COMBINATIONS)
+    assert(len(CALLED_COMBINATIONS) == 3)
+    assert(sorted(r[1] for r in full) == sorted(r[1] for r in resumed))
+    with open(results_path) as fh:
+        assert(len(fh.readlines()) == 4)
+
+
+@pytest.mark.parametrize('content', ['', '"[\'arg0\', \'ar'])
+def test_optimize_strategy_resume_without_results(tmpdir, content):
+    # run killed before (or while) writing header
+    results_path = str(tmpdir.join('results.csv'))
+    with open(results_path, 'w') as fh:
+        fh.write(content)
+    full = strategy.optimize_strategy(signal_gen_func=func_gen_test_signals, **optimization_inputs())
+    resumed = strategy.optimize_strategy(
+        signal_gen_func=func_gen_test_signals, results_path=results_path, resume=True, **optimization_inputs()
+    )
+    assert(sorted(r[1] for r in full) == sorted(r[1] for r in resumed))
+    done, _ = strategy._read_results(results_path, ['arg0', 'arg2'])
+    assert(sorted(done.keys()) == sorted(r[1] for r in full))
+
+
+def test_optimize_strategy_header_flushed(tmpdir):
+    results_path = str(tmpdir.join('results.csv'))
+    contents = []
+
+    def func_gen_recording_file(df, arg1, arg2=None):
+        with open(results_path) as fh:
+            contents.append(fh.read())
+        return func_gen_test_signals(df, arg1, arg2=arg2)
+
+    strategy.optimize_strategy(
+        signal_gen_func=func_gen_recording_file, results_path=results_path, **optimization_inputs()
+    )
+    # header is on disk before first combination is run
+    assert(contents[0] == '"[\'arg0\', \'arg2\']"\n')
+
+
+def test_parse_value():
+    assert(strategy._parse_value("(1, 'a', -2.5)") == (1, 'a', -2.5))
+    metrics = strategy._parse_value("{'sharpe': nan, 'max_dd': -inf, 'cagr': inf}")
+    assert(np.isnan(metrics['sharpe']))
+    assert(metrics['max_dd'] == -np.inf and metrics['cagr'] == np.inf)
+    # only literals
+    for text in ("__import__('os')", "(1).__class__", "open('x')", "x"):
+        with pytest.raises(ValueError):
+            strategy._parse_value(text)
+
+
+def test_optimize_strategy_resume_invalid_row(tmpdir):
+    results_path = str(tmpdir.join('results.csv'))
+    strategy.optimize_strategy(
+        signal_gen_func=func_gen_test_signals, results_path=results_path, **optimization_inputs()
+    )
+    with open(results_path) as fh:
+        lines = fh.readlines()
+    # row in the middle can't be parsed
+    content = ''.join([lines[0], 'not a result\n'] + lines[1:])
+    with open(results_path, 'w') as fh:
+        fh.write(content)
+    with pytest.raises(ValueError):
+        strategy.optimize_strategy(
+            signal_gen_func=func_gen_test_signals, results_path=results_path, resume=True, **optimization_inputs()
+        )
+    # and the file is left untouched
+    with open(results_path) as fh:
+        assert(fh.read() == content)
+
+
+def func_gen_test_signals_cached(df, arg1, arg2=None, rules_cache=None):
+    # each symbol uses the same "rule", so only first call for given arg1 should be computed
+    if rules_cache.get(arg1) is None:
+        rules_cache.put(arg1, [1, 0, -1])
+    return func_gen_test_signals(df, arg1, arg2=arg2)
+
+
+def momentum_rule(arr):
+    return 1 if arr[-1] > arr[0] else -1
+
+
+def func_gen_sg_signals(df, lookback, hold_x_days=None, rules_cache=None):
+    # the same rule is used by all combinations with given lookback
+    config = {
+        'rules': [{'id': 'momentum', 'type': 'simple', 'ts': 'close', 'lookback': lookback, 'params': {},
+                   'func': momentum_rule}],
+        'strategy': {'type': 'fixed', 'strategy_rules': ['momentum'], 'constraints': {'hold_x_days': hold_x_days}},
+    }
+    return SignalGenerator(df=df, config=config, rules_cache=rules_cache).generate()
+
+
+@pytest.mark.parametrize('n_jobs', [None, 2])
+def test_optimize_strategy_signal_generator_cache(n_jobs):
+    close = [120,140,135,120,110,156,145,178,198,191,188,184,180,175,174]
+    inputs = dict(optimization_inputs(), strategy_args=[[1, 2]], strategy_kwargs={'hold_x_days': [0, 2, 3]})
+    inputs['data'] = {
+        'A': pd.DataFrame({'close': close}, index=pd.date_range('2019-01-01', periods=len(close))),
+        'B': pd.DataFrame({'close': close[::-1]}, index=pd.date_range('2019-01-01', periods=len(close))),
+    }
+    expected = strategy.optimize_strategy(signal_gen_func=func_gen_sg_signals, **inputs)
+    cache = RulesCache()
+    res = strategy.optimize_strategy(signal_gen_func=func_gen_sg_signals, rules_cache=cache, n_jobs=n_jobs, **inputs)
+    assert(len(res) == 6)
+    assert(sorted((r[1], r[2]) for r in expected) == sorted((r[1], r[2]) for r in res))
+    if n_jobs is None:
+        # rule computed once for each lookback and symbol
+        assert(cache.misses == 2*2)
+        assert(cache.hits == 2*2*2)
+
+
+@pytest.mark.parametrize('n_jobs', [None, 2])
+def test_optimize_strategy_rules_cache(n_jobs):
+    expected = strategy.optimize_strategy(signal_gen_func=func_gen_test_signals, **optimization_inputs())
+    cache = RulesCache()
+    res = strategy.optimize_strategy(
+        signal_gen_func=func_gen_test_signals_cached, rules_cache=cache, n_jobs=n_jobs, **optimization_inputs()
+    )
+    assert([(r[1], r[2]) for r in expected] == [(r[1], r[2]) for r in res])
+    if n_jobs is None:
+        assert((cache.hits, cache.misses) == (2, 2))
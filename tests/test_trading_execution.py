@@ -0,0 +1,107 @@
+# built in
+import logging
+import os
+
+# 3rd party
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+import pytest
+
+pytest.importorskip('investpy')
+pytest.importorskip('dateparser')
+pytest.importorskip('ibapi')
+
+# custom
+from signal_generator import SignalGenerator, compile_config
+from trading_execution import TradingExecutor
+
+
+def momentum_rule(arr):
+    return 1 if arr[-1] > arr[0] else -1
+
+
+CONFIG = {
+    'rules': [
+        {
+            'id': 'momentum',
+            'type': 'simple',
+            'ts': 'close',
+            'lookback': 3,
+            'params': {},
+            'func': momentum_rule,
+        }
+    ],
+    'strategy': {
+        'type': 'fixed',
+        'strategy_rules': ['momentum'],
+        'constraints': {
+            'hold_x_days': 2,
+        }
+    }
+}
+
+
+@pytest.fixture()
+def pricing_df():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {'close': np.cumsum(rng.normal(size=60)) + 100, 'volume': rng.integers(100, 1000, size=60)},
+        index=pd.date_range('2020-01-01', periods=60, name='date'),
+    )
+
+
+@pytest.fixture()
+def executor(tmpdir):
+    # without IB connection, only signals part is used
+    executor = TradingExecutor.__new__(TradingExecutor)
+    executor.log = logging.getLogger('test_trading_execution')
+    executor.signal_config = CONFIG
+    executor.signals_state_path = str(tmpdir)
+    return executor
+
+
+def _update_signal(executor, df):
+    executor.universe = {'TEST': df}
+    return executor._update_signal('TEST', compile_config(CONFIG))
+
+
+def _expected_signal(df):
+    return SignalGenerator(df=df, config=CONFIG).generate()
+
+
+def test_update_signal_reprocesses_revised_session(executor, pricing_df):
+    # intraday bar of the last session
+    day_1 = pricing_df.iloc[:40].copy()
+    day_1.iloc[-1, 0] += 5
+    signal = _update_signal(executor, day_1)
+    assert_frame_equal(signal, _expected_signal(day_1), check_dtype=False, check_freq=False)
+    # last session replaced with final prices and new sessions
+    previous_end = 40
+    for end in (41, 45, 60):
+        day_df = pricing_df.iloc[:end]
+        signal = _update_signal(executor, day_df)
+        # starts with last session of the previous run
+        assert(signal.index[0] == pricing_df.index[previous_end-1])
+        assert_frame_equal(signal, _expected_signal(day_df).iloc[previous_end-1:], check_dtype=False, check_freq=False)
+        previous_end = end
+
+
+def test_update_signal_without_new_sessions(executor, pricing_df):
+    df = pricing_df.iloc[:40]
+    _update_signal(executor, df)
+    # e.g. rerun on the same day
+    for _ in range(2):
+        signal = _update_signal(executor, df)
+        assert_frame_equal(signal, _expected_signal(df).iloc[-1:], check_dtype=False, check_freq=False)
+
+
+def test_prepare_signals_has_all_symbols(executor, pricing_df):
+    executor.universe = {'A': pricing_df.iloc[:40], 'B': pricing_df.iloc[:30]}
+    executor._prepare_signals()
+    executor.universe = {'A': pricing_df.iloc[:40], 'B': pricing_df.iloc[:30]}
+    signals = executor._prepare_signals()
+    assert(sorted(signals.keys()) == ['A', 'B'])
+    assert(signals['A'].index[-1] == pricing_df.index[39])
+    assert(signals['B'].index[-1] == pricing_df.index[29])
+    assert(sorted(os.listdir(executor.signals_state_path)) == ['A.pickle', 'B.pickle'])
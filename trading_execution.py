@@ -1,17 +1,19 @@
 # built-in
 import datetime
+import os
 import sys
 import time
 
 sys.path.insert(0, '/Users/slaw/osobiste/trading')
 
 # 3rd party
+import pandas as pd
 import pytz
 
 # custom
 import commons
 from lse_data import LSEData
-from signal_generator import SignalGenerator
+from signal_generator import SignalGenerator, compile_config
 from strategies.strategy_4 import long_only_s4_config
 import strategies.helpers as helpers
 from ib_api import IBAPIApp
@@ -35,13 +37,21 @@ class TradingExecutor():
     """
     def __init__(self, pricing_data_path='./pricing_data', load_csv=False, logger=None, debug=False, 
                  signal_config=None, signal_lookback=None, ib_port=None, ib_client=666, stop_loss_perc=1.5,
-                 position_sizer=None):
+                 position_sizer=None, signals_state_path=None):
+        """
+        *signals_state_path* - directory with signal generators states (file per symbol). If given, signals are
+            not generated for full history each day, but only new sessions are processed (see SignalGenerator.update).
+            It can't be used with *signal_lookback* as signal depends on the first session then.
+        """
         self.today = str(self._now().date())
         self.log = commons.setup_logging(logger=logger, debug=debug)
         self.pricing_data_path = pricing_data_path
         self.load_csv = load_csv
         self.signal_config = signal_config
         self.signal_lookback = signal_lookback
+        if signals_state_path and signal_lookback is not None:
+            raise AttributeError('signals_state_path can not be used together with signal_lookback')
+        self.signals_state_path = signals_state_path
         self.stop_loss_perc = stop_loss_perc/100.0  # `stop_loss_perc` is in %, i.e. 1% -> 1
         self.position_sizer = position_sizer
         self._to_set_stop_loss = []
@@ -273,15 +283,51 @@ class TradingExecutor():
 
     def _prepare_signals(self):
         signals = {}
+        # same config for all symbols - compile it once
+        plan = compile_config(self.signal_config)
         for sym, df in self.universe.items():
             self.log.debug(f'Generating signal for: {sym}')
             self.universe[sym] = helpers.on_balance_volume_indicator(df)
+            if self.signals_state_path:
+                signals[sym] = self._update_signal(sym, plan)
+                continue
             signals[sym] = SignalGenerator(
                 df = self.universe[sym],
-                config = self.signal_config
+                plan = plan,
             ).generate()
         return signals
 
+    def _update_signal(self, sym, plan):
+        """
+        Continues signal of *sym* from its saved state. State is saved as of the session before the last one, as
+        the last session may be replaced by the next incremental download (e.g. with final prices), so it's always
+        processed again. Returns signal of all sessions after the saved state (at least the last session). Full
+        history is generated if there is no (valid) state.
+        """
+        df = self.universe[sym]
+        state_file = os.path.join(self.signals_state_path, f'{sym}.pickle')
+        sg = None
+        if os.path.exists(state_file):
+            # without plan, so config of the saved state can be compared with the current one
+            sg = SignalGenerator.load_state(state_file)
+            if (sg.config != plan.config) or (sg.last_date not in df.index[:-1]):
+                self.log.debug(f'Saved signal state of {sym} is not valid anymore. Generating full history')
+                sg = None
+        if sg is None:
+            if len(df.index) < 2:
+                return SignalGenerator(df=df, plan=plan).generate()
+            sg = SignalGenerator(df=df.iloc[:-1], plan=plan)
+            signal = sg.generate()
+        else:
+            signal = pd.DataFrame([
+                sg.update(session) for _, session in df.loc[df.index > sg.last_date].iloc[:-1].iterrows()
+            ])
+        sg.save_state(state_file)
+        last_session = pd.DataFrame([sg.update(df.iloc[-1])])
+        signal = pd.concat([signal, last_session]) if len(signal.index) else last_session
+        signal.index.name = df.index.name
+        return signal
+
     def _gather_buy_sell_signals(self, ds):
         to_sell = []
         buy_candidates = []